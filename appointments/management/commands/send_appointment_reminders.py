@@ -1,7 +1,11 @@
+from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from core.utils import get_upcoming_appointments, send_appointment_reminder_email
+from appointments.models import Appointment
+from core.utils import get_upcoming_appointments, appointment_reminder_email
+from core.mailer import create_email_only, email_payload, queue_emails, send_queued
 from core.models_communication import CommunicationNotification
+from core.models_notifications import Notification, NotificationType
+from core.notification_fanout import bulk_notify
 
 class Command(BaseCommand):
     help = 'Sends reminder emails and notifications for upcoming appointments'
@@ -18,38 +22,52 @@ class Command(BaseCommand):
         days = options['days']
         
         # Get upcoming appointments
-        appointments = get_upcoming_appointments(days=days)
+        appointments = list(get_upcoming_appointments(days=days).select_related('patient', 'doctor'))
         
         self.stdout.write(f"{len(appointments)} upcoming appointments found.")
         
-        # Send reminder for each appointment
+        appointment_type = ContentType.objects.get_for_model(Appointment)
+        notifications = []
+        emails = []
         for appointment in appointments:
-            # Send email
-            try:
-                send_appointment_reminder_email(appointment)
-                self.stdout.write(self.style.SUCCESS(
-                    f"Email sent: {appointment.patient.email} - {appointment.date}"
-                ))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f"Email could not be sent: {appointment.patient.email} - Error: {str(e)}"
-                ))
+            title = f"Appointment Reminder: {appointment.date.strftime('%d.%m.%Y')}"
+            message = f"You have an appointment tomorrow at {appointment.time.strftime('%H:%M')} with Dr. {appointment.doctor.get_full_name()}."
             
-            # Create notification
-            try:
-                CommunicationNotification.objects.create(
-                    user=appointment.patient,
-                    title=f"Appointment Reminder: {appointment.date.strftime('%d.%m.%Y')}",
-                    message=f"You have an appointment tomorrow at {appointment.time.strftime('%H:%M')} with Dr. {appointment.doctor.get_full_name()}.",
-                    related_url=f"/appointments/{appointment.id}/",
-                    notification_type="appointment"
-                )
-                self.stdout.write(self.style.SUCCESS(
-                    f"Notification created: {appointment.patient.get_full_name()}"
-                ))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f"Notification could not be created: {appointment.patient.get_full_name()} - Error: {str(e)}"
+            # Build the notification; all of them are inserted together below
+            notifications.append(CommunicationNotification(
+                user=appointment.patient,
+                title=title,
+                message=message,
+                related_url=f"/appointments/{appointment.id}/",
+                notification_type="appointment"
+            ))
+            
+            # Emails are queued on an email-only Notification so each outcome is logged
+            if appointment.patient.email:
+                emails.append(Notification(
+                    recipient=appointment.patient,
+                    notification_type=NotificationType.APPOINTMENT_REMINDER,
+                    title=title,
+                    message=message,
+                    content_type=appointment_type,
+                    object_id=appointment.id,
+                    extra_data=email_payload(*appointment_reminder_email(appointment)),
                 ))
         
-        self.stdout.write(self.style.SUCCESS(f"Total {len(appointments)} reminders sent.")) 
\ No newline at end of file
+        try:
+            created = bulk_notify(notifications)
+            self.stdout.write(self.style.SUCCESS(f"{len(created)} notifications created."))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Notifications could not be created - Error: {str(e)}"))
+        
+        # Send emails in batches over a shared connection (through Celery when available)
+        try:
+            log_ids = queue_emails(create_email_only(emails))
+            failed = send_queued(log_ids)
+            self.stdout.write(self.style.SUCCESS(f"{len(log_ids) - len(failed)} emails sent or queued."))
+            if failed:
+                self.stdout.write(self.style.ERROR(f"{len(failed)} emails could not be sent."))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Emails could not be sent - Error: {str(e)}"))
+        
+        self.stdout.write(self.style.SUCCESS(f"Total {len(appointments)} reminders sent."))
@@ -0,0 +1,134 @@
+"""
+Daily Active User Rollups for Laso Healthcare
+Maintains DailyActiveUsers bitmaps at login time and from LoginSession
+history, and answers active-user counts over any day range by OR-ing them
+"""
+from datetime import datetime, time, timedelta
+from typing import Dict, List
+
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models_sessions import DailyActiveUsers, LoginSession
+
+
+def bitmap_from_bytes(data) -> int:
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def bitmap_to_bytes(bitmap: int) -> bytes:
+    return bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+
+
+def bitmap_from_ids(user_ids) -> int:
+    bitmap = 0
+    for user_id in user_ids:
+        bitmap |= 1 << user_id
+    return bitmap
+
+
+def record_activity(user_id: int, day=None) -> bool:
+    """
+    Add a user to the day's active set; returns False if already counted
+    """
+    day = day or timezone.localdate()
+    bit = 1 << user_id
+
+    # Repeat logins on the same day are the common case: no write at all
+    current = DailyActiveUsers.objects.filter(date=day).values_list('user_bitmap', flat=True).first()
+    if current is not None and bitmap_from_bytes(current) & bit:
+        return False
+
+    with transaction.atomic():
+        row, _ = DailyActiveUsers.objects.select_for_update().get_or_create(date=day)
+        bitmap = bitmap_from_bytes(row.user_bitmap)
+        if bitmap & bit:
+            return False
+        bitmap |= bit
+        row.user_bitmap = bitmap_to_bytes(bitmap)
+        row.user_count = bitmap.bit_count()
+        row.save(update_fields=['user_bitmap', 'user_count', 'updated_at'])
+    return True
+
+
+def backfill(start, end) -> int:
+    """
+    Rebuild the rows for ``start``..``end`` (inclusive) from LoginSession;
+    returns the number of days written
+    """
+    lower = timezone.make_aware(datetime.combine(start, time.min))
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    sessions = LoginSession.objects.filter(
+        login_time__gte=lower, login_time__lt=upper
+    ).annotate(day=TruncDate('login_time')).values_list('day', 'user_id').distinct().order_by()
+
+    bitmaps: Dict = {}
+    for day, user_id in sessions.iterator(chunk_size=5000):
+        bitmaps[day] = bitmaps.get(day, 0) | (1 << user_id)
+
+    rows = []
+    day = start
+    while day <= end:
+        bitmap = bitmaps.get(day, 0)
+        rows.append(DailyActiveUsers(
+            date=day, user_bitmap=bitmap_to_bytes(bitmap), user_count=bitmap.bit_count()
+        ))
+        day += timedelta(days=1)
+
+    DailyActiveUsers.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=['user_bitmap', 'user_count', 'updated_at'],
+    )
+    return len(rows)
+
+
+def load_bitmaps(start, end) -> Dict:
+    """Day -> bitmap for the rows in ``start``..``end``"""
+    return {
+        day: bitmap_from_bytes(data)
+        for day, data in DailyActiveUsers.objects.filter(
+            date__gte=start, date__lte=end
+        ).values_list('date', 'user_bitmap')
+    }
+
+
+def active_user_count(start, end) -> int:
+    """Distinct users active on any day in ``start``..``end``"""
+    union = 0
+    for bitmap in load_bitmaps(start, end).values():
+        union |= bitmap
+    return union.bit_count()
+
+
+def daily_counts(start, end) -> List[dict]:
+    """Dense per-day active user counts, oldest first"""
+    counts = dict(DailyActiveUsers.objects.filter(
+        date__gte=start, date__lte=end
+    ).values_list('date', 'user_count'))
+    series = []
+    day = start
+    while day <= end:
+        series.append({'date': day, 'active_users': counts.get(day, 0)})
+        day += timedelta(days=1)
+    return series
+
+
+def rolling_active_counts(days: List, window: int) -> Dict:
+    """
+    Distinct users over the ``window`` days ending on each of ``days``,
+    from a single read of the daily rows
+    """
+    if not days:
+        return {}
+    bitmaps = load_bitmaps(min(days) - timedelta(days=window - 1), max(days))
+    counts = {}
+    for day in days:
+        union = 0
+        for offset in range(window):
+            union |= bitmaps.get(day - timedelta(days=offset), 0)
+        counts[day] = union.bit_count()
+    return counts
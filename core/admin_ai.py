@@ -27,6 +27,10 @@ class AIConfigurationAdmin(admin.ModelAdmin):
             'fields': ('max_tokens', 'temperature'),
             'description': 'Parameters that control AI model behavior'
         }),
+        ('Rate Limiting', {
+            'fields': ('requests_per_minute', 'max_concurrent_requests'),
+            'description': 'Limits shared by all workers to avoid provider 429 errors'
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
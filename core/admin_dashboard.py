@@ -1,16 +1,40 @@
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db.models import Q, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta
 from appointments.models import Appointment
 from treatments.models import Treatment
-from core.models_sessions import LoginSession
+from core.active_users import daily_counts
+from core.analytics_cache import get_or_build
+from core.db_router import use_replica
+from core.models_statistics import SystemStatistics
+from core.statistics import system_overview
+from core.time_buckets import time_series
 import json
 
 User = get_user_model()
 
+
+@use_replica()
+def _chart_data(today):
+    """Chart series of the admin dashboard, built from the rollup tables"""
+    return {
+        'user_trend_data': [
+            {'month': bucket['period'].strftime('%b %Y'), 'users': bucket['users']}
+            for bucket in time_series(
+                SystemStatistics.objects.all(), 'date', period='month', periods=12,
+                metrics={'users': Sum('new_users')}, end=today
+            )
+        ],
+        'daily_active_data': [
+            {'date': day['date'].strftime('%m/%d'), 'active_users': day['active_users']}
+            for day in daily_counts(today - timedelta(days=29), today)
+        ],
+    }
+
+
 @staff_member_required
 def admin_dashboard(request):
     """
@@ -23,19 +47,20 @@ def admin_dashboard(request):
     month_ago = today - timedelta(days=30)
     year_ago = today - timedelta(days=365)
     
+    # Figures come from the pre-aggregated statistics tables, cached across staff
+    stats = get_or_build('admin_dashboard', f'overview:{today.isoformat()}', lambda: system_overview(today))
+    charts = get_or_build('admin_dashboard', f'charts:{today.isoformat()}', lambda: _chart_data(today))
+    
     # User Statistics
-    total_users = User.objects.count()
-    total_patients = User.objects.filter(user_type='patient').count()
-    total_doctors = User.objects.filter(user_type='doctor').count()
-    total_receptionists = User.objects.filter(user_type='receptionist').count()
-    total_admins = User.objects.filter(user_type='admin').count()
+    total_users = stats['total_users']
+    total_patients = stats['users_by_type']['patient']
+    total_doctors = stats['users_by_type']['doctor']
+    total_receptionists = stats['users_by_type']['receptionist']
+    total_admins = stats['users_by_type']['admin']
     
     # New users this month
-    new_users_this_month = User.objects.filter(date_joined__gte=month_ago).count()
-    new_users_last_month = User.objects.filter(
-        date_joined__gte=month_ago - timedelta(days=30),
-        date_joined__lt=month_ago
-    ).count()
+    new_users_this_month = stats['new_users_this_month']
+    new_users_last_month = stats['new_users_last_month']
     
     # Calculate growth percentage
     if new_users_last_month > 0:
@@ -44,58 +69,31 @@ def admin_dashboard(request):
         user_growth_percentage = 100 if new_users_this_month > 0 else 0
     
     # Active users (logged in within last 30 days)
-    active_users = LoginSession.objects.filter(
-        login_time__gte=month_ago
-    ).values('user').distinct().count()
+    active_users = stats['active_users']
     
     # User engagement rate
     engagement_rate = (active_users / total_users * 100) if total_users > 0 else 0
     
     # Appointment Statistics
-    total_appointments = Appointment.objects.count()
-    appointments_today = Appointment.objects.filter(date=today).count()
-    appointments_this_week = Appointment.objects.filter(date__gte=week_ago).count()
-    appointments_this_month = Appointment.objects.filter(date__gte=month_ago).count()
+    total_appointments = stats['total_appointments']
+    appointments_today = stats['appointments_today']
+    appointments_this_week = stats['appointments_this_week']
+    appointments_this_month = stats['appointments_this_month']
     
     # Appointment status breakdown
-    appointment_status = Appointment.objects.values('status').annotate(count=Count('id'))
+    appointment_status = [
+        {'status': 'planned', 'count': stats['planned_appointments']},
+        {'status': 'completed', 'count': stats['completed_appointments']},
+        {'status': 'cancelled', 'count': stats['cancelled_appointments']},
+    ]
     
     # Treatment Statistics
-    total_treatments = Treatment.objects.count()
-    treatments_this_month = Treatment.objects.filter(created_at__gte=month_ago).count()
-    
-    # User registration trend (last 12 months)
-    user_trend_data = []
-    for i in range(12):
-        month_start = (now - timedelta(days=30*i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        month_users = User.objects.filter(
-            date_joined__gte=month_start,
-            date_joined__lte=month_end
-        ).count()
-        
-        user_trend_data.append({
-            'month': month_start.strftime('%b %Y'),
-            'users': month_users
-        })
+    total_treatments = stats['total_treatments']
+    treatments_this_month = stats['treatments_this_month']
     
-    user_trend_data.reverse()  # Show oldest to newest
-    
-    # Daily active users (last 30 days)
-    daily_active_data = []
-    for i in range(30):
-        day = today - timedelta(days=i)
-        active_count = LoginSession.objects.filter(
-            login_time__date=day
-        ).values('user').distinct().count()
-        
-        daily_active_data.append({
-            'date': day.strftime('%m/%d'),
-            'active_users': active_count
-        })
-    
-    daily_active_data.reverse()  # Show oldest to newest
+    # User registration trend (last 12 months) and daily active users (last 30 days)
+    user_trend_data = charts['user_trend_data']
+    daily_active_data = charts['daily_active_data']
     
     # User type distribution
     user_type_data = [
@@ -176,19 +174,19 @@ def admin_dashboard_callback(request, context):
     month_ago = today - timedelta(days=30)
     year_ago = today - timedelta(days=365)
     
+    # Figures come from the pre-aggregated statistics tables, cached across staff
+    stats = get_or_build('admin_dashboard', f'overview:{today.isoformat()}', lambda: system_overview(today))
+    
     # User Statistics
-    total_users = User.objects.count()
-    total_patients = User.objects.filter(user_type='patient').count()
-    total_doctors = User.objects.filter(user_type='doctor').count()
-    total_receptionists = User.objects.filter(user_type='receptionist').count()
-    total_admins = User.objects.filter(user_type='admin').count()
+    total_users = stats['total_users']
+    total_patients = stats['users_by_type']['patient']
+    total_doctors = stats['users_by_type']['doctor']
+    total_receptionists = stats['users_by_type']['receptionist']
+    total_admins = stats['users_by_type']['admin']
     
     # New users this month
-    new_users_this_month = User.objects.filter(date_joined__gte=month_ago).count()
-    new_users_last_month = User.objects.filter(
-        date_joined__gte=month_ago - timedelta(days=30),
-        date_joined__lt=month_ago
-    ).count()
+    new_users_this_month = stats['new_users_this_month']
+    new_users_last_month = stats['new_users_last_month']
     
     # Calculate growth percentage
     if new_users_last_month > 0:
@@ -197,25 +195,23 @@ def admin_dashboard_callback(request, context):
         user_growth_percentage = 100 if new_users_this_month > 0 else 0
     
     # Active users (logged in within last 30 days)
-    active_users = LoginSession.objects.filter(
-        login_time__gte=month_ago
-    ).values('user').distinct().count()
+    active_users = stats['active_users']
     
     # Appointment Statistics
-    total_appointments = Appointment.objects.count()
-    appointments_today = Appointment.objects.filter(date=today).count()
-    appointments_this_week = Appointment.objects.filter(date__gte=week_ago).count()
-    appointments_this_month = Appointment.objects.filter(date__gte=month_ago).count()
+    total_appointments = stats['total_appointments']
+    appointments_today = stats['appointments_today']
+    appointments_this_week = stats['appointments_this_week']
+    appointments_this_month = stats['appointments_this_month']
     
-    # Appointment status breakdown
-    pending_appointments = Appointment.objects.filter(status='pending').count()
-    confirmed_appointments = Appointment.objects.filter(status='confirmed').count()
-    completed_appointments = Appointment.objects.filter(status='completed').count()
-    cancelled_appointments = Appointment.objects.filter(status='cancelled').count()
+    # Appointment status breakdown ('planned' is the only open status)
+    pending_appointments = stats['planned_appointments']
+    confirmed_appointments = 0
+    completed_appointments = stats['completed_appointments']
+    cancelled_appointments = stats['cancelled_appointments']
     
     # Treatment Statistics
-    total_treatments = Treatment.objects.count()
-    treatments_this_month = Treatment.objects.filter(created_at__gte=month_ago).count()
+    total_treatments = stats['total_treatments']
+    treatments_this_month = stats['treatments_this_month']
     
     # Recent Activity
     recent_users = User.objects.filter(date_joined__gte=week_ago).order_by('-date_joined')[:5]
@@ -0,0 +1,148 @@
+"""
+AI Response Cache for Laso Healthcare
+Caches provider responses for repeated, non-personal questions
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+
+
+AI_CACHE_ALIAS = 'ai_responses'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalize a user message so trivially different phrasings share a key.
+
+    Folds Unicode compatibility forms (NFKC), case-folds, removes
+    punctuation and collapses whitespace.
+    """
+    text = unicodedata.normalize('NFKC', message or '').casefold()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def _age_band(age: Optional[int]) -> str:
+    if age is None:
+        return 'na'
+    return f"{(age // 10) * 10}s"
+
+
+class AIResponseCache:
+    """
+    Response cache in front of AIService.chat.
+
+    Entries are keyed on the normalized message, provider, model and a
+    coarse context fingerprint. Requests whose context carries patient
+    specific data (e.g. medical history) are partitioned per user so no
+    PHI can be served to another account. Size (LRU culling) and TTL
+    limits come from the ``ai_responses`` cache alias.
+    """
+
+    STATS_KEYS = ('hits', 'misses', 'bypassed', 'stores')
+
+    def __init__(self):
+        ai_settings = getattr(settings, 'AI_SETTINGS', {})
+        self.enabled = ai_settings.get('RESPONSE_CACHE_ENABLED', True)
+        self.timeout = ai_settings.get('RESPONSE_CACHE_TTL', 60 * 60 * 24)
+
+    @property
+    def cache(self):
+        try:
+            return caches[AI_CACHE_ALIAS]
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    @property
+    def stats_cache(self):
+        # Counters live in the default cache so LRU culling never drops them
+        return caches['default']
+
+    def context_fingerprint(self, user, context: Dict[str, Any]) -> str:
+        """
+        Build the coarse context fingerprint for a chat request.
+
+        Generic context (user type and age band) is shared between users;
+        anything patient specific partitions the entry to the requesting user.
+        """
+        if context.get('medical_history'):
+            return f"user:{user.pk}"
+        return f"shared:{context.get('user_type', '')}:{_age_band(context.get('age'))}"
+
+    def make_key(self, config, message: str, fingerprint: str) -> str:
+        raw = '|'.join([
+            config.provider,
+            config.model_name or '',
+            fingerprint,
+            normalize_message(message),
+        ])
+        digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+        return f"ai_response:{digest}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        cached = self.cache.get(key)
+        self._incr('hits' if cached is not None else 'misses')
+        return cached
+
+    def set(self, key: str, fingerprint: str, user, response: Dict[str, Any]) -> bool:
+        """
+        Store a provider response, unless it would leak personal data.
+
+        Shared entries are skipped when the response mentions the
+        requesting user's name, since it was generated from a prompt
+        containing it.
+        """
+        if not self.enabled or not response.get('content'):
+            return False
+        if fingerprint.startswith('shared:') and self._mentions_user(response['content'], user):
+            self._incr('bypassed')
+            return False
+        self.cache.set(key, {
+            'content': response['content'],
+            'tokens_used': response.get('tokens_used', 0),
+        }, timeout=self.timeout)
+        self._incr('stores')
+        return True
+
+    def _mentions_user(self, content: str, user) -> bool:
+        content_lower = content.casefold()
+        names = [user.first_name, user.last_name, user.username]
+        return any(name and len(name) > 2 and name.casefold() in content_lower for name in names)
+
+    def _incr(self, counter: str):
+        key = f"ai_response_stats:{counter}"
+        try:
+            self.stats_cache.incr(key)
+        except ValueError:
+            self.stats_cache.add(key, 0, timeout=None)
+            try:
+                self.stats_cache.incr(key)
+            except ValueError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and the resulting hit rate
+        """
+        values = self.stats_cache.get_many([f"ai_response_stats:{name}" for name in self.STATS_KEYS])
+        stats = {name: values.get(f"ai_response_stats:{name}", 0) for name in self.STATS_KEYS}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        self.stats_cache.delete_many([f"ai_response_stats:{name}" for name in self.STATS_KEYS])
+
+
+# Singleton instance
+response_cache = AIResponseCache()
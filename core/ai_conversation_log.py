@@ -0,0 +1,195 @@
+"""
+Write-behind AI Conversation Logger for Laso Healthcare
+Buffers AIConversation records in-process and writes them with bulk_create
+from a background thread, so chat latency does not include the insert
+"""
+
+import atexit
+import logging
+import threading
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models_ai_config import AIConversation
+
+logger = logging.getLogger(__name__)
+
+
+def _log_settings():
+    ai_settings = getattr(settings, 'AI_SETTINGS', {})
+    return (
+        ai_settings.get('CONVERSATION_LOG_BUFFERED', True),
+        max(1, ai_settings.get('CONVERSATION_LOG_BATCH_SIZE', 50)),
+        max(0.1, ai_settings.get('CONVERSATION_LOG_FLUSH_INTERVAL', 2.0)),
+        ai_settings.get('CONVERSATION_LOG_MAX_PENDING', 10000),
+    )
+
+
+class ConversationLogBuffer:
+    """
+    In-process queue of pending AIConversation rows.
+
+    Records are flushed when the batch size is reached, every flush
+    interval, and at interpreter shutdown. Rows being written stay visible
+    to ``pending_for`` until their transaction has committed, so history
+    reads never miss a message in transit. Rows keep the time they were
+    logged, not the time they were flushed.
+
+    A process killed with SIGKILL (or the OOM killer) loses what is still
+    queued: at most one batch or one flush interval of records. Deployments
+    that cannot accept that set CONVERSATION_LOG_BUFFERED to False.
+    """
+
+    def __init__(self):
+        self._pending: List[dict] = []
+        self._in_flight: List[dict] = []
+        self._flushes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def log(self, **fields) -> Optional[AIConversation]:
+        """
+        Queue a conversation record; written synchronously (and returned)
+        when buffering is disabled
+        """
+        buffered, batch_size, _interval, max_pending = _log_settings()
+        if not buffered or self._closed:
+            return AIConversation.objects.create(**fields)
+
+        fields.setdefault('created_at', timezone.now())
+        with self._lock:
+            if len(self._pending) >= max_pending:
+                logger.error("AI conversation log buffer full; dropping oldest record")
+                self._pending.pop(0)
+            self._pending.append(fields)
+            should_flush = len(self._pending) >= batch_size
+        self._ensure_thread()
+        if should_flush:
+            self._wakeup.set()
+        return None
+
+    def pending_for(self, user_id, session_id) -> List[dict]:
+        """
+        Unflushed records for a session, oldest first
+        """
+        with self._lock:
+            return [
+                record for record in self._in_flight + self._pending
+                if record['user'].pk == user_id and record['session_id'] == session_id
+            ]
+
+    @property
+    def flush_count(self) -> int:
+        return self._flushes
+
+    def flush(self) -> int:
+        """
+        Write every pending record; returns the number of rows written
+        """
+        _buffered, batch_size, _interval, _max_pending = _log_settings()
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    self._in_flight = self._pending[:batch_size]
+                    self._pending = self._pending[batch_size:]
+                    batch = self._in_flight
+                try:
+                    written += self._write(batch)
+                finally:
+                    with self._lock:
+                        self._in_flight = []
+                        self._flushes += 1
+        return written
+
+    def _write(self, batch: List[dict]) -> int:
+        objects = [self._build(record) for record in batch]
+        try:
+            AIConversation.objects.bulk_create(objects)
+        except DatabaseError:
+            logger.warning("Bulk insert of %d AI conversations failed; retrying row by row", len(objects))
+        else:
+            self._restamp(objects, batch)
+            return len(objects)
+
+        written = []
+        for obj, record in zip(objects, batch):
+            try:
+                obj.pk = None
+                obj.save(force_insert=True)
+                written.append((obj, record))
+            except DatabaseError:
+                logger.exception("Dropping AI conversation record for session %s", obj.session_id)
+        if written:
+            self._restamp(*zip(*written))
+        return len(written)
+
+    @staticmethod
+    def _build(record: dict) -> AIConversation:
+        return AIConversation(**{key: value for key, value in record.items() if key != 'created_at'})
+
+    @staticmethod
+    def _restamp(objects, records):
+        """
+        created_at is auto_now_add, so inserted rows carry the flush time;
+        put back the time each record was logged, in one UPDATE
+        """
+        whens = [
+            When(pk=obj.pk, then=Value(record['created_at']))
+            for obj, record in zip(objects, records) if obj.pk is not None
+        ]
+        if whens:
+            AIConversation.objects.filter(pk__in=[obj.pk for obj in objects]).update(
+                created_at=Case(*whens, output_field=DateTimeField())
+            )
+        for obj, record in zip(objects, records):
+            obj.created_at = record['created_at']
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='ai-conversation-log', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            _buffered, _batch_size, interval, _max_pending = _log_settings()
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("AI conversation log flush failed")
+            finally:
+                # This thread owns its own connection; don't hold it open idle
+                connection.close()
+
+    def close(self):
+        """
+        Stop buffering and write whatever is still queued (runs at exit)
+        """
+        self._closed = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("AI conversation log flush at shutdown failed")
+
+
+# Singleton instance
+conversation_log = ConversationLogBuffer()
+atexit.register(conversation_log.close)
@@ -3,7 +3,7 @@ AI-Powered Features for Laso Healthcare
 """
 import re
 from datetime import datetime, timedelta
-from django.db.models import Q, Count
+from django.db.models import Count
 from django.utils import timezone
 from collections import Counter
 import json
@@ -11,9 +11,13 @@ import json
 from treatments.models import Treatment, Prescription
 from treatments.models_lab import LabTest
 from treatments.models_medical_history import MedicalHistory
-from treatments.models_medications import Medication, MedicationInteraction
+from treatments.models_medications import Medication
+from treatments.search import search_treatments
 from appointments.models import Appointment
 from django.contrib.auth import get_user_model
+from .cohorts import age_on
+from .symptom_matcher import get_matcher
+from .interaction_index import get_interaction_index
 
 User = get_user_model()
 
@@ -42,6 +46,31 @@ class SymptomAnalyzer:
         'insomnia': ['anxiety', 'depression', 'stress', 'sleep apnea']
     }
     
+    # English/Turkish synonyms matched alongside the symptom names
+    SYMPTOM_SYNONYMS = {
+        'fever': ['high temperature', 'febrile', 'ateş', 'yüksek ateş'],
+        'cough': ['coughing', 'öksürük'],
+        'shortness of breath': ['breathlessness', 'dyspnea', 'dyspnoea', 'nefes darlığı'],
+        'chest pain': ['göğüs ağrısı'],
+        'headache': ['head ache', 'baş ağrısı'],
+        'abdominal pain': ['stomach ache', 'stomachache', 'stomach pain', 'karın ağrısı'],
+        'nausea': ['bulantı', 'mide bulantısı'],
+        'vomiting': ['throwing up', 'kusma'],
+        'diarrhea': ['diarrhoea', 'ishal'],
+        'fatigue': ['tiredness', 'exhaustion', 'yorgunluk', 'halsizlik'],
+        'weight loss': ['kilo kaybı'],
+        'weight gain': ['kilo alımı'],
+        'joint pain': ['eklem ağrısı'],
+        'skin rash': ['rash', 'döküntü', 'kızarıklık'],
+        'insomnia': ['sleeplessness', 'uykusuzluk'],
+    }
+    
+    def get_matcher(self):
+        """
+        Compiled matcher over the symptom map and its synonyms
+        """
+        return get_matcher('symptoms', self.SYMPTOM_DISEASE_MAP, self.SYMPTOM_SYNONYMS)
+    
     def analyze_symptoms(self, symptoms_text):
         """
         Analyzes symptom text to suggest possible diseases
@@ -49,15 +78,12 @@ class SymptomAnalyzer:
         if not symptoms_text:
             return []
         
-        symptoms_text = symptoms_text.lower()
-        found_symptoms = []
         possible_diseases = []
         
-        # Find symptoms
-        for symptom, diseases in self.SYMPTOM_DISEASE_MAP.items():
-            if symptom in symptoms_text:
-                found_symptoms.append(symptom)
-                possible_diseases.extend(diseases)
+        # Find symptoms in a single pass over the text
+        found_symptoms = self.get_matcher().find(symptoms_text)
+        for symptom in found_symptoms:
+            possible_diseases.extend(self.SYMPTOM_DISEASE_MAP[symptom])
         
         # Count the most common diseases
         disease_counts = Counter(possible_diseases)
@@ -69,6 +95,12 @@ class SymptomAnalyzer:
             'recommendations': self.get_general_recommendations(found_symptoms)
         }
     
+    def analyze_symptoms_batch(self, complaints):
+        """
+        Triage many free-text complaints at once with the same compiled matcher
+        """
+        return [self.analyze_symptoms(text) for text in complaints]
+    
     def get_general_recommendations(self, symptoms):
         """
         General recommendations based on symptoms
@@ -104,38 +136,21 @@ class DrugInteractionChecker:
         """
         Check for interactions between prescribed drugs
         """
-        interactions = []
-        
-        # Check for interactions for each pair of drugs
-        for i, med1 in enumerate(prescription_list):
-            for med2 in prescription_list[i+1:]:
-                interaction = self.check_drug_pair(med1, med2)
-                if interaction:
-                    interactions.append(interaction)
-        
-        return interactions
+        # Every pair is checked against the in-memory interaction index
+        return get_interaction_index().check(list(prescription_list))
     
     def check_drug_pair(self, medication1, medication2):
         """
         Check for interaction between two drugs
         """
-        try:
-            # Search for interaction in the database
-            interaction = MedicationInteraction.objects.filter(
-                Q(medication1__name__icontains=medication1) & Q(medication2__name__icontains=medication2) |
-                Q(medication1__name__icontains=medication2) & Q(medication2__name__icontains=medication1)
-            ).first()
-            
-            if interaction:
-                return {
-                    'medication1': medication1,
-                    'medication2': medication2,
-                    'severity': interaction.severity,
-                    'description': interaction.description,
-                    'recommendations': interaction.recommendations
-                }
-        except Exception:
-            pass
+        interaction = get_interaction_index().find(medication1, medication2)
+        
+        if interaction:
+            return {
+                'medication1': medication1,
+                'medication2': medication2,
+                **interaction
+            }
         
         return None
     
@@ -150,13 +165,7 @@ class DrugInteractionChecker:
             is_active=True
         ).values_list('condition_name', flat=True)
         
-        interactions = []
-        for current_med in current_medications:
-            interaction = self.check_drug_pair(current_med, new_medication)
-            if interaction:
-                interactions.append(interaction)
-        
-        return interactions
+        return get_interaction_index().check([new_medication], against=list(current_medications))
 
 
 class TreatmentRecommendationEngine:
@@ -175,12 +184,9 @@ class TreatmentRecommendationEngine:
         if not analysis['possible_diseases']:
             return []
         
-        # Find similar treatments based on the most likely disease
-        top_disease = analysis['possible_diseases'][0]['disease']
-        
-        similar_treatments = Treatment.objects.filter(
-            diagnosis__icontains=top_disease
-        ).select_related('appointment__patient').prefetch_related('prescriptions')[:limit]
+        # Ranked full-text search over every matched disease and symptom
+        terms = [item['disease'] for item in analysis['possible_diseases']] + analysis['found_symptoms']
+        similar_treatments = search_treatments(terms, limit=limit)
         
         recommendations = []
         for treatment in similar_treatments:
@@ -195,6 +201,7 @@ class TreatmentRecommendationEngine:
                     } for p in treatment.prescriptions.all()
                 ],
                 'notes': treatment.notes,
+                'relevance': round(treatment.search_rank, 6),
                 'success_rate': self.calculate_treatment_success_rate(treatment)
             })
         
@@ -202,55 +209,59 @@ class TreatmentRecommendationEngine:
     
     def calculate_age(self, birth_date):
         """Calculate age"""
-        if not birth_date:
-            return None
-        today = timezone.now().date()
-        return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+        return age_on(birth_date)
     
     def calculate_treatment_success_rate(self, treatment):
         """Calculate treatment success rate (placeholder)"""
         # This can be improved with real data
         return 85  # Default 85% success rate
     
+    # Keyword groups mapped to the lab tests they suggest
+    LAB_TEST_RULES = [
+        (['fever', 'infection', 'fatigue'], [
+            'Complete Blood Count (CBC)',
+            'C-Reactive Protein (CRP)',
+            'Sedimentation Rate (ESR)'
+        ]),
+        (['chest pain', 'shortness of breath'], [
+            'ECG',
+            'Chest X-Ray',
+            'Troponin T/I'
+        ]),
+        (['abdominal pain', 'nausea', 'vomiting'], [
+            'Liver Function Tests',
+            'Pancreatic Enzymes',
+            'Abdominal Ultrasound'
+        ]),
+        (['fatigue', 'weight', 'sweating'], [
+            'Thyroid Function Tests',
+            'HbA1c (Sugar)',
+            'Vitamin B12, D'
+        ]),
+    ]
+    
+    LAB_TEST_SYNONYMS = dict(SymptomAnalyzer.SYMPTOM_SYNONYMS, **{
+        'infection': ['enfeksiyon'],
+        'weight': ['kilo'],
+        'sweating': ['sweats', 'terleme'],
+    })
+    
     def recommend_lab_tests(self, symptoms, patient_history=None):
         """
         Recommend lab tests based on symptoms
         """
-        test_recommendations = []
-        
-        symptoms_lower = symptoms.lower()
+        labels = {keyword for keywords, _ in self.LAB_TEST_RULES for keyword in keywords}
+        synonyms = {label: terms for label, terms in self.LAB_TEST_SYNONYMS.items() if label in labels}
+        found = set(get_matcher('lab_tests', labels, synonyms).find(symptoms))
         
         # Symptom-test matching
-        if any(word in symptoms_lower for word in ['fever', 'infection', 'fatigue']):
-            test_recommendations.extend([
-                'Complete Blood Count (CBC)',
-                'C-Reactive Protein (CRP)',
-                'Sedimentation Rate (ESR)'
-            ])
-        
-        if any(word in symptoms_lower for word in ['chest pain', 'shortness of breath']):
-            test_recommendations.extend([
-                'ECG',
-                'Chest X-Ray',
-                'Troponin T/I'
-            ])
-        
-        if any(word in symptoms_lower for word in ['abdominal pain', 'nausea', 'vomiting']):
-            test_recommendations.extend([
-                'Liver Function Tests',
-                'Pancreatic Enzymes',
-                'Abdominal Ultrasound'
-            ])
-        
-        if any(word in symptoms_lower for word in ['fatigue', 'weight', 'sweating']):
-            test_recommendations.extend([
-                'Thyroid Function Tests',
-                'HbA1c (Sugar)',
-                'Vitamin B12, D'
-            ])
+        test_recommendations = []
+        for keywords, tests in self.LAB_TEST_RULES:
+            if found.intersection(keywords):
+                test_recommendations.extend(tests)
         
-        return list(set(test_recommendations))  # Remove duplicates
-
+        return list(dict.fromkeys(test_recommendations))  # Remove duplicates
+    
 
 class PatientRiskAssessment:
     """
@@ -274,26 +285,23 @@ class PatientRiskAssessment:
                 risk_factors.append('Age between 50-65')
                 risk_score += 2
         
-        # Chronic disease risk factors
-        chronic_conditions = MedicalHistory.objects.filter(
+        # Chronic disease and allergy history in one query
+        history = MedicalHistory.objects.filter(
             patient=patient,
-            condition_type='chronic',
+            condition_type__in=['chronic', 'allergy'],
             is_active=True
-        )
+        ).values_list('condition_type', 'condition_name')
         
         high_risk_conditions = ['diabetes', 'hypertension', 'heart disease', 'copd', 'asthma']
-        for condition in chronic_conditions:
-            condition_name = condition.condition_name.lower()
-            if any(hrc in condition_name for hrc in high_risk_conditions):
-                risk_factors.append(f'Chronic disease: {condition.condition_name}')
+        allergies = 0
+        for condition_type, condition_name in history:
+            if condition_type == 'allergy':
+                allergies += 1
+            elif any(hrc in condition_name.lower() for hrc in high_risk_conditions):
+                risk_factors.append(f'Chronic disease: {condition_name}')
                 risk_score += 2
         
         # Allergy risk factors
-        allergies = MedicalHistory.objects.filter(
-            patient=patient,
-            condition_type='allergy',
-            is_active=True
-        ).count()
         
         if allergies > 0:
             risk_factors.append(f'{allergies} active allergies')
@@ -320,10 +328,7 @@ class PatientRiskAssessment:
     
     def calculate_age(self, birth_date):
         """Calculate age"""
-        if not birth_date:
-            return None
-        today = timezone.now().date()
-        return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+        return age_on(birth_date)
     
     def get_risk_recommendations(self, risk_level, risk_factors):
         """
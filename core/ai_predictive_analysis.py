@@ -12,6 +12,7 @@ from django.conf import settings
 from treatments.models_vitals import VitalSign
 from treatments.models_medical_history import MedicalHistory
 from treatments.models_lab import LabTest
+from core.db_router import use_replica
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -131,6 +132,7 @@ class EndOrganDamagePredictor:
             self.logger.error(f"Error in end-organ damage prediction: {e}")
             return self.get_default_prediction(patient)
     
+    @use_replica()
     def collect_patient_data(self, patient):
         """
         Collect comprehensive patient data for risk assessment
@@ -13,6 +13,9 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from .models_ai_config import AIConfiguration, AIConversation, AIPromptTemplate
+from .ai_cache import response_cache
+from .ai_conversation_log import conversation_log
+from .ai_throttle import ProviderThrottle, ProviderBusyError
 from .ai_features import SymptomAnalyzer, DrugInteractionChecker, TreatmentRecommendationEngine
 
 User = get_user_model()
@@ -47,24 +50,26 @@ class AIService:
         
         try:
             # Enhance message with medical context if available
-            enhanced_message = self._enhance_message_with_context(user, message)
+            context = self._get_user_context(user)
+            enhanced_message = self._enhance_message_with_context(user, message, context)
             
-            # Route to appropriate provider
-            if self.config.provider == 'openai':
-                response = self._chat_openai(enhanced_message)
-            elif self.config.provider == 'openrouter':
-                response = self._chat_openrouter(enhanced_message)
-            elif self.config.provider == 'huggingface':
-                response = self._chat_huggingface(enhanced_message)
-            elif self.config.provider == 'anthropic':
-                response = self._chat_anthropic(enhanced_message)
+            # Serve repeated questions from the response cache
+            fingerprint = response_cache.context_fingerprint(user, context)
+            cache_key = response_cache.make_key(self.config, message, fingerprint)
+            response = response_cache.get(cache_key)
+            cached = response is not None
+            
+            if not cached:
+                response = self._call_provider(message, enhanced_message)
+                response_cache.set(cache_key, fingerprint, user, response)
             else:
-                response = self._fallback_response(message)
+                # No provider tokens were spent on a cache hit
+                response = {'content': response['content'], 'tokens_used': 0}
             
             response_time = time.time() - start_time
             
-            # Save conversation
-            conversation = AIConversation.objects.create(
+            # Queue the conversation record; written in the background
+            conversation = conversation_log.log(
                 user=user,
                 session_id=session_id,
                 message=message,
@@ -78,11 +83,20 @@ class AIService:
                 'success': True,
                 'response': response.get('content', ''),
                 'session_id': session_id,
-                'conversation_id': conversation.id,
+                'conversation_id': conversation.id if conversation else None,
                 'tokens_used': response.get('tokens_used', 0),
-                'response_time': response_time
+                'response_time': response_time,
+                'cached': cached
             }
             
+        except ProviderBusyError as e:
+            return {
+                'success': False,
+                'busy': True,
+                'retry_after': e.retry_after,
+                'error': str(e),
+                'response': 'The AI assistant is handling many requests right now. Please try again in a few seconds.'
+            }
         except Exception as e:
             return {
                 'success': False,
@@ -90,20 +104,39 @@ class AIService:
                 'response': 'I apologize, but I encountered an error processing your request. Please try again or contact support if the issue persists.'
             }
     
-    def _enhance_message_with_context(self, user: User, message: str) -> str:
+    def _call_provider(self, message: str, enhanced_message: str) -> Dict[str, Any]:
         """
-        Enhance user message with medical context
+        Route to the configured provider, throttled per configuration
         """
-        context_parts = [
-            f"Patient: {user.get_full_name()}",
-            f"User Type: {user.get_user_type_display()}",
-        ]
+        handlers = {
+            'openai': self._chat_openai,
+            'openrouter': self._chat_openrouter,
+            'huggingface': self._chat_huggingface,
+            'anthropic': self._chat_anthropic,
+        }
+        handler = handlers.get(self.config.provider)
+        if handler is None:
+            return self._fallback_response(message)
+        
+        with ProviderThrottle(self.config).acquire():
+            return handler(enhanced_message)
+    
+    def _get_user_context(self, user: User) -> Dict[str, Any]:
+        """
+        Collect the medical context used to enhance a user message
+        """
+        context = {
+            'full_name': user.get_full_name(),
+            'user_type': user.user_type,
+            'user_type_display': user.get_user_type_display(),
+            'age': None,
+            'medical_history': [],
+        }
         
         # Add age if available
         if hasattr(user, 'date_of_birth') and user.date_of_birth:
             from datetime import date
-            age = date.today().year - user.date_of_birth.year
-            context_parts.append(f"Age: {age}")
+            context['age'] = date.today().year - user.date_of_birth.year
         
         # Add medical context for patients
         if user.is_patient():
@@ -111,16 +144,33 @@ class AIService:
                 from treatments.models_medical_history import MedicalHistory
                 
                 # Get recent medical history
-                recent_conditions = MedicalHistory.objects.filter(
+                context['medical_history'] = list(MedicalHistory.objects.filter(
                     patient=user,
                     is_active=True
-                ).values_list('condition_name', flat=True)[:5]
-                
-                if recent_conditions:
-                    context_parts.append(f"Medical History: {', '.join(recent_conditions)}")
+                ).values_list('condition_name', flat=True)[:5])
             except:
                 pass
         
+        return context
+    
+    def _enhance_message_with_context(self, user: User, message: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Enhance user message with medical context
+        """
+        if context is None:
+            context = self._get_user_context(user)
+        
+        context_parts = [
+            f"Patient: {context['full_name']}",
+            f"User Type: {context['user_type_display']}",
+        ]
+        
+        if context['age'] is not None:
+            context_parts.append(f"Age: {context['age']}")
+        
+        if context['medical_history']:
+            context_parts.append(f"Medical History: {', '.join(context['medical_history'])}")
+        
         context = " | ".join(context_parts)
         
         enhanced_message = f"""
@@ -158,8 +208,10 @@ Please provide a helpful, accurate, and medically appropriate response. Always r
             'temperature': self.config.temperature
         }
         
+        api_url = self.config.api_url or 'https://api.openai.com/v1/chat/completions'
+        
         response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
+            api_url,
             headers=headers,
             json=data,
             timeout=30
@@ -284,8 +336,10 @@ Please provide a helpful, accurate, and medically appropriate response. Always r
             ]
         }
         
+        api_url = self.config.api_url or 'https://api.anthropic.com/v1/messages'
+        
         response = requests.post(
-            'https://api.anthropic.com/v1/messages',
+            api_url,
             headers=headers,
             json=data,
             timeout=30
@@ -377,12 +431,19 @@ Please provide a helpful, accurate, and medically appropriate response. Always r
         """
         Get conversation history for a session
         """
-        conversations = AIConversation.objects.filter(
-            user=user,
-            session_id=session_id
-        ).order_by('created_at')[:limit]
+        # Snapshot the unflushed buffer and read the table; retry if a flush
+        # committed in between, which would otherwise duplicate rows
+        for _attempt in range(3):
+            flushes = conversation_log.flush_count
+            pending = conversation_log.pending_for(user.pk, session_id)
+            conversations = list(AIConversation.objects.filter(
+                user=user,
+                session_id=session_id
+            ).order_by('created_at')[:limit])
+            if conversation_log.flush_count == flushes:
+                break
         
-        return [
+        history = [
             {
                 'id': conv.id,
                 'message': conv.message,
@@ -392,6 +453,17 @@ Please provide a helpful, accurate, and medically appropriate response. Always r
             }
             for conv in conversations
         ]
+        history.extend(
+            {
+                'id': None,
+                'message': record['message'],
+                'response': record['response'],
+                'timestamp': record['created_at'].isoformat(),
+                'tokens_used': record.get('tokens_used', 0)
+            }
+            for record in pending
+        )
+        return history[:limit]
 
 
 # Singleton instance
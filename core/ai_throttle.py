@@ -0,0 +1,169 @@
+"""
+AI Provider Throttling for Laso Healthcare
+Token-bucket rate limiting and a concurrency semaphore per AI configuration,
+shared across worker processes through the cache backend
+"""
+
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ProviderBusyError(Exception):
+    """
+    Raised when a provider slot could not be obtained within the queue timeout
+    """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ProviderThrottle:
+    """
+    Per-AIConfiguration throttle.
+
+    The token bucket limits the request rate (``requests_per_minute``) and the
+    semaphore limits in-flight provider calls (``max_concurrent_requests``).
+    Semaphore slots are leased cache keys, so a crashed worker releases its
+    slot when the lease expires. Callers queue for up to ``queue_timeout``
+    seconds before a ProviderBusyError is raised.
+    """
+
+    LOCK_TIMEOUT = 2  # seconds
+    POLL_INTERVAL = 0.1  # seconds
+
+    def __init__(self, config, queue_timeout: Optional[float] = None):
+        ai_settings = getattr(settings, 'AI_SETTINGS', {})
+        self.config = config
+        self.rate_per_minute = config.requests_per_minute
+        self.max_concurrent = config.max_concurrent_requests
+        self.queue_timeout = (
+            queue_timeout if queue_timeout is not None
+            else ai_settings.get('THROTTLE_QUEUE_TIMEOUT', 5)
+        )
+        # A slot lease must outlive the provider request timeout
+        self.slot_lease = ai_settings.get('THROTTLE_SLOT_LEASE', 45)
+        prefix = f"ai_throttle:{config.pk}"
+        self.bucket_key = f"{prefix}:bucket"
+        self.lock_key = f"{prefix}:lock"
+        self.slot_prefix = f"{prefix}:slot"
+
+    @contextmanager
+    def acquire(self):
+        """
+        Block until a rate token and a concurrency slot are available.
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        self._wait_for_token(deadline)
+        try:
+            slot_key, token = self._wait_for_slot(deadline)
+        except ProviderBusyError:
+            # No provider call was made, so the rate token goes back
+            self._return_token()
+            raise
+        try:
+            yield
+        finally:
+            self._release_slot(slot_key, token)
+
+    def _wait_for_token(self, deadline):
+        if not self.rate_per_minute:
+            return
+        while True:
+            wait = self._take_token()
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise ProviderBusyError(
+                    'AI provider rate limit reached',
+                    retry_after=max(1, int(wait + 0.5))
+                )
+            time.sleep(min(wait, self.POLL_INTERVAL * 5))
+
+    def _take_token(self) -> float:
+        """
+        Try to take one token. Returns 0 on success, otherwise the number of
+        seconds until the next token is due.
+        """
+        capacity = float(self.rate_per_minute)
+        refill_rate = capacity / 60.0  # tokens per second
+
+        lock = self._lock()
+        if lock is None:
+            return self.POLL_INTERVAL
+        try:
+            tokens, now = self._refilled(capacity, refill_rate)
+            if tokens >= 1:
+                cache.set(self.bucket_key, (tokens - 1, now), timeout=120)
+                return 0
+            cache.set(self.bucket_key, (tokens, now), timeout=120)
+            return (1 - tokens) / refill_rate
+        finally:
+            self._unlock(lock)
+
+    def _return_token(self):
+        """
+        Put back a token taken by a request that never reached the provider
+        """
+        if not self.rate_per_minute:
+            return
+        capacity = float(self.rate_per_minute)
+        lock = self._lock()
+        if lock is None:
+            return
+        try:
+            tokens, now = self._refilled(capacity, capacity / 60.0)
+            cache.set(self.bucket_key, (min(capacity, tokens + 1), now), timeout=120)
+        finally:
+            self._unlock(lock)
+
+    def _refilled(self, capacity, refill_rate):
+        now = time.time()
+        tokens, last = cache.get(self.bucket_key, (capacity, now))
+        return min(capacity, tokens + (now - last) * refill_rate), now
+
+    def _lock(self) -> Optional[str]:
+        """
+        Take the bucket lock; returns the owner token to unlock with, or None
+        """
+        # cache.add is atomic on shared backends, which makes it a usable mutex
+        owner = uuid.uuid4().hex
+        for _ in range(int(self.LOCK_TIMEOUT / self.POLL_INTERVAL)):
+            if cache.add(self.lock_key, owner, timeout=self.LOCK_TIMEOUT):
+                return owner
+            time.sleep(self.POLL_INTERVAL / 10)
+        return None
+
+    def _unlock(self, owner):
+        # The lock may have expired and been taken by another worker meanwhile
+        if cache.get(self.lock_key) == owner:
+            cache.delete(self.lock_key)
+
+    def _wait_for_slot(self, deadline):
+        token = uuid.uuid4().hex
+        if not self.max_concurrent:
+            return None, token
+        while True:
+            for index in range(self.max_concurrent):
+                slot_key = f"{self.slot_prefix}:{index}"
+                if cache.add(slot_key, token, timeout=self.slot_lease):
+                    return slot_key, token
+            if time.monotonic() + self.POLL_INTERVAL > deadline:
+                raise ProviderBusyError('All AI provider slots are in use')
+            time.sleep(self.POLL_INTERVAL)
+
+    def _release_slot(self, slot_key, token):
+        if slot_key and cache.get(slot_key) == token:
+            cache.delete(slot_key)
+
+    def in_flight(self) -> int:
+        """
+        Number of provider calls currently holding a slot
+        """
+        keys = [f"{self.slot_prefix}:{index}" for index in range(self.max_concurrent or 0)]
+        return len(cache.get_many(keys)) if keys else 0
@@ -4,14 +4,16 @@ Advanced Analytics and Dashboard Data Provider for Laso Healthcare
 from django.db.models import Count, Q, Avg, F
 from django.utils import timezone
 from datetime import datetime, timedelta
-from collections import defaultdict
-import calendar
 
 from appointments.models import Appointment
 from treatments.models import Treatment, Prescription
 from treatments.models_lab import LabTest
 from treatments.models_medical_history import MedicalHistory
 from django.contrib.auth import get_user_model
+from .analytics_cache import get_or_build
+from .db_router import use_replica
+from .models_statistics import SystemStatistics
+from .time_buckets import time_series
 
 User = get_user_model()
 
@@ -39,18 +41,22 @@ class DashboardAnalytics:
             elif self.user.is_patient():
                 queryset = queryset.filter(patient=self.user)
         
-        total_appointments = queryset.count()
-        completed = queryset.filter(status='completed').count()
-        cancelled = queryset.filter(status='cancelled').count()
-        planned = queryset.filter(status='planned').count()
+        # One grouped query: per-day counts with status breakdown, summed for totals
+        daily_rows = queryset.values('date').annotate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            planned=Count('id', filter=Q(status='planned')),
+        ).order_by('date')
         
-        # Daily appointment distribution
-        daily_appointments = defaultdict(int)
-        for appointment in queryset:
-            day_key = appointment.date.strftime('%Y-%m-%d')
-            daily_appointments[day_key] += 1
-        # Sort daily appointment counts
-        daily_appointments= sorted(daily_appointments.items())
+        total_appointments = completed = cancelled = planned = 0
+        daily_appointments = {}
+        for row in daily_rows:
+            total_appointments += row['total']
+            completed += row['completed']
+            cancelled += row['cancelled']
+            planned += row['planned']
+            daily_appointments[row['date'].strftime('%Y-%m-%d')] = row['total']
         
         return {
             'total': total_appointments,
@@ -58,7 +64,7 @@ class DashboardAnalytics:
             'cancelled': cancelled,
             'planned': planned,
             'completion_rate': (completed / total_appointments * 100) if total_appointments > 0 else 0,
-            'daily_distribution': dict(daily_appointments)
+            'daily_distribution': daily_appointments
         }
     
     def get_patient_stats(self):
@@ -66,12 +72,18 @@ class DashboardAnalytics:
         if not self.user or not (self.user.is_doctor() or self.user.is_admin_user()):
             return {}
         
-        patients = User.objects.filter(user_type='patient')
-        
-        # Recent appointment dates
-        recent_patients = patients.filter(
-            patient_appointments__date__gte=self.start_date
-        ).distinct().count()
+        # The appointment join repeats patients, hence distinct counts
+        patient_counts = User.objects.filter(user_type='patient').aggregate(
+            total_patients=Count('id', distinct=True),
+            recent_patients=Count(
+                'id', distinct=True,
+                filter=Q(patient_appointments__date__gte=self.start_date)
+            ),
+            new_patients=Count(
+                'id', distinct=True,
+                filter=Q(date_joined__date__range=[self.start_date, self.end_date])
+            ),
+        )
         
         # Active chronic disease count
         chronic_conditions = MedicalHistory.objects.filter(
@@ -79,16 +91,11 @@ class DashboardAnalytics:
             is_active=True
         ).count()
         
-        # New patient registrations
-        new_patients = patients.filter(
-            date_joined__date__range=[self.start_date, self.end_date]
-        ).count()
-        
         return {
-            'total_patients': patients.count(),
-            'recent_patients': recent_patients,
+            'total_patients': patient_counts['total_patients'],
+            'recent_patients': patient_counts['recent_patients'],
             'chronic_conditions': chronic_conditions,
-            'new_patients': new_patients
+            'new_patients': patient_counts['new_patients']
         }
     
     def get_treatment_stats(self):
@@ -100,18 +107,18 @@ class DashboardAnalytics:
         if self.user and self.user.is_doctor():
             queryset = queryset.filter(appointment__doctor=self.user)
         
-        total_treatments = queryset.count()
+        totals = queryset.aggregate(
+            total_treatments=Count('id', distinct=True),
+            prescriptions_count=Count('prescriptions'),
+        )
+        total_treatments = totals['total_treatments']
+        prescriptions_count = totals['prescriptions_count']
         
         # Most common diagnoses
         common_diagnoses = queryset.values('diagnosis').annotate(
             count=Count('diagnosis')
         ).order_by('-count')[:10]
         
-        # Prescription statistics
-        prescriptions_count = Prescription.objects.filter(
-            treatment__in=queryset
-        ).count()
-        
         avg_prescriptions_per_treatment = (
             prescriptions_count / total_treatments
         ) if total_treatments > 0 else 0
@@ -132,21 +139,28 @@ class DashboardAnalytics:
         if self.user and self.user.is_doctor():
             queryset = queryset.filter(doctor=self.user)
         
-        total_tests = queryset.count()
-        completed_tests = queryset.filter(status='completed').count()
-        pending_tests = queryset.filter(status__in=['requested', 'in_progress']).count()
+        # Per-test counts with status breakdown in one query; totals are their sums
+        test_rows = list(queryset.values('test_name').annotate(
+            count=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            pending=Count('id', filter=Q(status__in=['requested', 'in_progress'])),
+        ).order_by('-count', 'test_name'))
+        
+        total_tests = sum(row['count'] for row in test_rows)
+        completed_tests = sum(row['completed'] for row in test_rows)
+        pending_tests = sum(row['pending'] for row in test_rows)
         
         # Most frequently requested tests
-        popular_tests = queryset.values('test_name').annotate(
-            count=Count('test_name')
-        ).order_by('-count')[:10]
+        popular_tests = [
+            {'test_name': row['test_name'], 'count': row['count']} for row in test_rows[:10]
+        ]
         
         return {
             'total_tests': total_tests,
             'completed_tests': completed_tests,
             'pending_tests': pending_tests,
             'completion_rate': (completed_tests / total_tests * 100) if total_tests > 0 else 0,
-            'popular_tests': list(popular_tests)
+            'popular_tests': popular_tests
         }
     
     def get_doctor_performance(self):
@@ -154,19 +168,18 @@ class DashboardAnalytics:
         if not self.user or not self.user.is_doctor():
             return {}
         
-        appointments = Appointment.objects.filter(
-            doctor=self.user,
-            date__range=[self.start_date, self.end_date]
-        )
-        
-        total_appointments = appointments.count()
-        completed_appointments = appointments.filter(status='completed').count()
-        
-        # Average treatment duration (seconds)
-        treatments = Treatment.objects.filter(
-            appointment__doctor=self.user,
-            created_at__date__range=[self.start_date, self.end_date]
+        # Appointments and treatments (one per appointment) in a single pass
+        in_range = Q(date__range=[self.start_date, self.end_date])
+        counts = Appointment.objects.filter(doctor=self.user).aggregate(
+            total_appointments=Count('id', filter=in_range),
+            completed_appointments=Count('id', filter=in_range & Q(status='completed')),
+            total_treatments=Count(
+                'treatment',
+                filter=Q(treatment__created_at__date__range=[self.start_date, self.end_date])
+            ),
         )
+        total_appointments = counts['total_appointments']
+        completed_appointments = counts['completed_appointments']
         
         # Patient satisfaction score (can be added in future)
         # satisfaction_score = self.calculate_satisfaction_score()
@@ -175,37 +188,50 @@ class DashboardAnalytics:
             'total_appointments': total_appointments,
             'completed_appointments': completed_appointments,
             'completion_rate': (completed_appointments / total_appointments * 100) if total_appointments > 0 else 0,
-            'total_treatments': treatments.count(),
+            'total_treatments': counts['total_treatments'],
             'avg_daily_patients': round(total_appointments / self.date_range_days, 1)
         }
     
     def get_monthly_trends(self):
         """Monthly trend data"""
-        months_data = []
+        appointments = Appointment.objects.all()
+        if self.user and self.user.is_doctor():
+            appointments = appointments.filter(doctor=self.user)
         
-        for i in range(6):  # Last 6 months
-            month_start = (timezone.now().date().replace(day=1) - timedelta(days=i*30)).replace(day=1)
-            month_end = (month_start.replace(day=calendar.monthrange(month_start.year, month_start.month)[1]))
-            
-            appointments = Appointment.objects.filter(
-                date__range=[month_start, month_end]
-            )
-            
-            if self.user and self.user.is_doctor():
-                appointments = appointments.filter(doctor=self.user)
-            
-            months_data.append({
-                'month': month_start.strftime('%B %Y'),
-                'appointments': appointments.count(),
-                'treatments': Treatment.objects.filter(
-                    appointment__in=appointments
-                ).count()
-            })
+        # Last 6 calendar months; treatments are counted per appointment month
+        series = time_series(appointments, 'date', period='month', periods=6, metrics={
+            'appointments': Count('id'),
+            'treatments': Count('treatment'),
+        })
         
-        return list(reversed(months_data))
+        return [
+            {
+                'month': bucket['period'].strftime('%B %Y'),
+                'appointments': bucket['appointments'],
+                'treatments': bucket['treatments']
+            }
+            for bucket in series
+        ]
+    
+    def cache_scope(self):
+        """Users whose dashboards see the same data share one cache entry"""
+        if not self.user:
+            return 'anonymous'
+        if self.user.is_doctor() or self.user.is_patient():
+            return f'{self.user.user_type}:{self.user.pk}'
+        return self.user.user_type
     
     def get_comprehensive_dashboard_data(self):
-        """Collects all dashboard data"""
+        """Collects all dashboard data (cached, see core.analytics_cache)"""
+        return get_or_build(
+            'dashboard_analytics',
+            f'{self.cache_scope()}:{self.end_date.isoformat()}:{self.date_range_days}',
+            self.build_dashboard_data,
+        )
+    
+    @use_replica()
+    def build_dashboard_data(self):
+        """Collects all dashboard data from the database"""
         return {
             'appointment_stats': self.get_appointment_stats(),
             'patient_stats': self.get_patient_stats(),
@@ -227,6 +253,7 @@ class ReportGenerator:
     """
     
     @staticmethod
+    @use_replica()
     def generate_doctor_summary_report(doctor, start_date, end_date):
         """Doctor summary report"""
         appointments = Appointment.objects.filter(
@@ -287,3 +314,49 @@ class ReportGenerator:
                 status__in=['requested', 'in_progress']
             )
         }
+    
+    # Row sources for the background exports (core.reports). Each returns the
+    # column headers and a values_list queryset that is streamed with
+    # .iterator(), so no report is ever held in memory; core.reports evaluates
+    # them on the read replica.
+    
+    @staticmethod
+    def doctor_summary_rows(doctor, start_date, end_date):
+        """One row per appointment of the doctor in the period"""
+        columns = ['Date', 'Time', 'Patient first name', 'Patient last name',
+                   'Status', 'Diagnosis', 'Prescriptions']
+        rows = Appointment.objects.filter(
+            doctor=doctor,
+            date__range=[start_date, end_date]
+        ).annotate(
+            prescription_count=Count('treatment__prescriptions')
+        ).order_by('date', 'time').values_list(
+            'date', 'time', 'patient__first_name', 'patient__last_name',
+            'status', 'treatment__diagnosis', 'prescription_count'
+        )
+        return columns, rows
+    
+    @staticmethod
+    def patient_health_rows(patient):
+        """The patient's appointment history with diagnoses"""
+        columns = ['Date', 'Time', 'Doctor first name', 'Doctor last name',
+                   'Status', 'Diagnosis', 'Notes']
+        rows = Appointment.objects.filter(
+            patient=patient
+        ).order_by('-date', '-time').values_list(
+            'date', 'time', 'doctor__first_name', 'doctor__last_name',
+            'status', 'treatment__diagnosis', 'treatment__notes'
+        )
+        return columns, rows
+    
+    @staticmethod
+    def system_statistics_rows(start_date, end_date):
+        """Daily system statistics rollup rows in the period"""
+        fields = ['date', 'total_patients', 'total_doctors', 'total_appointments',
+                  'completed_appointments', 'cancelled_appointments', 'total_treatments',
+                  'new_users', 'new_appointments', 'daily_active_users', 'monthly_active_users']
+        columns = [SystemStatistics._meta.get_field(name).verbose_name for name in fields]
+        rows = SystemStatistics.objects.filter(
+            date__range=[start_date, end_date]
+        ).order_by('date').values_list(*fields)
+        return [str(column) for column in columns], rows
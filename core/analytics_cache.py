@@ -0,0 +1,146 @@
+"""
+Stampede-Protected Analytics Cache for Laso Healthcare
+Caches expensive aggregate results with stale-while-revalidate: when an
+entry expires, one worker takes the rebuild lock and recomputes it while the
+others keep serving the previous value. Entries are also refreshed slightly
+early at random (probabilistic early recomputation) so popular keys rarely
+expire at all.
+"""
+import logging
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'analytics_cache'
+
+COUNTERS = ('hits', 'misses', 'stale', 'rebuilds', 'waits')
+
+
+def _setting(name, default):
+    return getattr(settings, 'ANALYTICS_SETTINGS', {}).get(name, default)
+
+
+def _count(name, counter):
+    key = f'{KEY_PREFIX}:stats:{name}:{counter}'
+    # add() then incr() keeps the counter correct when several workers start at once
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def stats(name):
+    """Hit/miss/stale/rebuild/wait counters of one cache namespace"""
+    keys = {f'{KEY_PREFIX}:stats:{name}:{counter}': counter for counter in COUNTERS}
+    values = cache.get_many(list(keys))
+    return {counter: values.get(key, 0) for key, counter in keys.items()}
+
+
+def reset_stats(name):
+    cache.delete_many([f'{KEY_PREFIX}:stats:{name}:{counter}' for counter in COUNTERS])
+
+
+def _should_refresh_early(entry, now, beta):
+    """
+    XFetch: refresh before expiry with a probability that grows as expiry
+    nears and with how long the value took to compute
+    """
+    if beta <= 0:
+        return False
+    return now - entry['duration'] * beta * math.log(1.0 - random.random()) >= entry['expires_at']
+
+
+def _lock(lock_key, timeout):
+    """Take a rebuild lock; returns the owner token to unlock with, or None"""
+    owner = uuid.uuid4().hex
+    return owner if cache.add(lock_key, owner, timeout=timeout) else None
+
+
+def _unlock(lock_key, owner):
+    # A build that outlived CACHE_LOCK_TIMEOUT may find the lock taken by another worker
+    if cache.get(lock_key) == owner:
+        cache.delete(lock_key)
+
+
+def _rebuild(key, lock_key, owner, builder, timeout, grace):
+    started = time.monotonic()
+    try:
+        value = builder()
+        duration = time.monotonic() - started
+        entry = {'value': value, 'expires_at': time.time() + timeout, 'duration': duration}
+        # The entry outlives its freshness by the grace period so stale reads stay possible
+        cache.set(key, entry, timeout=timeout + grace)
+        return value
+    finally:
+        _unlock(lock_key, owner)
+
+
+def get_or_build(name, key_suffix, builder, timeout=None):
+    """
+    Return the cached result of ``builder()`` for ``name:key_suffix``.
+
+    - Fresh entry: served as-is (``hits``), unless picked for early refresh.
+    - Stale entry (past ``timeout`` but within the grace period): the worker
+      that wins the lock rebuilds it (``rebuilds``); the rest serve the stale
+      value (``stale``) instead of piling onto the database.
+    - Missing entry (``misses``): the lock holder builds it; other workers
+      wait up to CACHE_LOCK_WAIT seconds for that result (``waits``) and
+      only then compute it themselves.
+
+    Builders must return picklable values.
+    """
+    if not _setting('CACHE_ENABLED', True):
+        return builder()
+
+    timeout = timeout or _setting('CACHE_TIMEOUT', 300)
+    grace = _setting('CACHE_STALE_GRACE', 600)
+    lock_timeout = _setting('CACHE_LOCK_TIMEOUT', 60)
+    key = f'{KEY_PREFIX}:{name}:{key_suffix}'
+    lock_key = f'{key}:lock'
+
+    entry = cache.get(key)
+    now = time.time()
+
+    if entry is not None:
+        expired = now >= entry['expires_at']
+        if not expired and not _should_refresh_early(entry, now, _setting('CACHE_EARLY_RECOMPUTE_BETA', 1.0)):
+            _count(name, 'hits')
+            return entry['value']
+        owner = _lock(lock_key, lock_timeout)
+        if owner:
+            _count(name, 'rebuilds')
+            try:
+                return _rebuild(key, lock_key, owner, builder, timeout, grace)
+            except Exception:
+                # A failed refresh must not take the dashboard down while a value exists
+                logger.exception("Rebuilding analytics cache key %s failed; serving the previous value", key)
+                return entry['value']
+        _count(name, 'stale' if expired else 'hits')
+        return entry['value']
+
+    _count(name, 'misses')
+    owner = _lock(lock_key, lock_timeout)
+    if owner:
+        _count(name, 'rebuilds')
+        return _rebuild(key, lock_key, owner, builder, timeout, grace)
+
+    # Someone else is building it: wait briefly for their result
+    deadline = time.monotonic() + _setting('CACHE_LOCK_WAIT', 5)
+    _count(name, 'waits')
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+    return builder()
+
+
+def invalidate(name, key_suffix):
+    cache.delete(f'{KEY_PREFIX}:{name}:{key_suffix}')
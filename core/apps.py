@@ -7,3 +7,10 @@ class CoreConfig(AppConfig):
     
     def ready(self):
         import core.signals
+        # Register cache invalidation signals for the in-memory indexes
+        import core.interaction_index
+        import core.dashboard_cache
+        import core.notification_counters
+        import core.notification_push
+        import core.notification_dispatcher
+        import core.statistics
@@ -0,0 +1,154 @@
+"""
+Patient Cohort Breakdowns for Laso Healthcare
+Age bands, gender split and chronic condition prevalence of each doctor's
+patients, bucketed in SQL with Case/When and grouped by doctor
+"""
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from appointments.models import Appointment
+from treatments.models_medical_history import MedicalHistory
+
+from .db_router import use_replica
+
+# (label, youngest age, oldest age or None)
+AGE_BANDS = [
+    ('0-18', 0, 18),
+    ('19-30', 19, 30),
+    ('31-45', 31, 45),
+    ('46-60', 46, 60),
+    ('60+', 61, None),
+]
+
+GENDERS = ['M', 'F', 'O']
+
+UNKNOWN = 'unknown'
+
+
+def age_on(birth_date: Optional[date], today: Optional[date] = None) -> Optional[int]:
+    """Age in completed years on ``today``"""
+    if not birth_date:
+        return None
+    today = today or timezone.localdate()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def birth_date_cutoff(age: int, today: date) -> date:
+    """Latest date of birth of someone who is at least ``age`` on ``today``"""
+    try:
+        return today.replace(year=today.year - age)
+    except ValueError:
+        # 29 February in a non-leap year
+        return today.replace(year=today.year - age, day=28)
+
+
+def age_band(age: Optional[int]) -> str:
+    if age is None:
+        return UNKNOWN
+    for label, youngest, oldest in AGE_BANDS:
+        if oldest is None or age <= oldest:
+            return label
+    return UNKNOWN
+
+
+def age_band_case(field: str = 'date_of_birth', today: Optional[date] = None) -> Case:
+    """
+    Case/When expression labelling ``field`` with its age band; the cutoffs
+    are dates computed once, so the database only compares dates
+    """
+    today = today or timezone.localdate()
+    whens = [When(**{f'{field}__isnull': True}, then=Value(UNKNOWN))]
+    for label, _, oldest in AGE_BANDS:
+        if oldest is not None:
+            whens.append(When(**{f'{field}__gt': birth_date_cutoff(oldest + 1, today)}, then=Value(label)))
+    return Case(*whens, default=Value(AGE_BANDS[-1][0]), output_field=CharField())
+
+
+def gender_case(field: str = 'gender') -> Case:
+    return Case(
+        *[When(**{field: code}, then=Value(code)) for code in GENDERS],
+        default=Value(UNKNOWN),
+        output_field=CharField(),
+    )
+
+
+def _empty_cohort() -> Dict:
+    return {
+        'total_patients': 0,
+        'age_bands': {label: 0 for label, _, _ in AGE_BANDS + [(UNKNOWN, None, None)]},
+        'genders': {code: 0 for code in GENDERS + [UNKNOWN]},
+        'conditions': [],
+    }
+
+
+def demographics(doctor_ids: Iterable[int], today: Optional[date] = None) -> Dict[int, Dict]:
+    """
+    Age band and gender counts of each doctor's distinct patients, from a
+    single query grouped by (doctor, age band, gender)
+    """
+    doctor_ids = list(doctor_ids)
+    cohorts = {doctor_id: _empty_cohort() for doctor_id in doctor_ids}
+    if not doctor_ids:
+        return cohorts
+
+    rows = Appointment.objects.filter(doctor_id__in=doctor_ids).annotate(
+        age_band=age_band_case('patient__date_of_birth', today),
+        gender=gender_case('patient__gender'),
+    ).values('doctor_id', 'age_band', 'gender').annotate(
+        patients=Count('patient', distinct=True)
+    ).order_by()
+
+    # A patient falls in exactly one (band, gender) cell, so the cells add up
+    for row in rows:
+        cohort = cohorts[row['doctor_id']]
+        cohort['total_patients'] += row['patients']
+        cohort['age_bands'][row['age_band']] += row['patients']
+        cohort['genders'][row['gender']] += row['patients']
+    return cohorts
+
+
+def condition_prevalence(doctor_ids: Iterable[int], limit: int = 10) -> Dict[int, List[Dict]]:
+    """
+    Most common active chronic conditions among each doctor's patients, as
+    distinct-patient counts from a single query grouped by doctor and condition
+    """
+    doctor_ids = list(doctor_ids)
+    prevalence = {doctor_id: [] for doctor_id in doctor_ids}
+    if not doctor_ids:
+        return prevalence
+
+    rows = MedicalHistory.objects.filter(
+        condition_type='chronic',
+        is_active=True,
+        patient__patient_appointments__doctor_id__in=doctor_ids,
+    ).values(
+        doctor_id=F('patient__patient_appointments__doctor_id'),
+        condition=Lower('condition_name'),
+    ).annotate(
+        patients=Count('patient', distinct=True)
+    ).order_by('doctor_id', '-patients', 'condition')
+
+    for row in rows:
+        conditions = prevalence[row['doctor_id']]
+        if len(conditions) < limit:
+            conditions.append({'condition': row['condition'], 'patients': row['patients']})
+    return prevalence
+
+
+@use_replica()
+def doctor_cohorts(doctor_ids: Iterable[int], today: Optional[date] = None,
+                   condition_limit: int = 10) -> Dict[int, Dict]:
+    """Full cohort breakdown per doctor; two queries whatever the doctor count"""
+    doctor_ids = list(doctor_ids)
+    cohorts = demographics(doctor_ids, today)
+    for doctor_id, conditions in condition_prevalence(doctor_ids, condition_limit).items():
+        total = cohorts[doctor_id]['total_patients']
+        cohorts[doctor_id]['conditions'] = [
+            dict(item, share=round(item['patients'] / total * 100, 1) if total else 0.0)
+            for item in conditions
+        ]
+    return cohorts
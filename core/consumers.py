@@ -0,0 +1,121 @@
+"""
+WebSocket consumers for real-time notifications
+"""
+import json
+import logging
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from urllib.parse import parse_qs
+
+from .notification_counters import unread_counts
+from .notification_push import group_name, missed_notifications
+
+logger = logging.getLogger(__name__)
+
+
+def _as_id(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes new notifications and unread-count changes to the user.
+
+    Reconnecting clients resume with the last ids they have seen, either in
+    the query string (``?last_notification_id=..&last_communication_id=..``)
+    or with a ``{"type": "resume", ...}`` message, and receive what they
+    missed in one ``sync`` message instead of polling.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.room_group_name = group_name(self.user.id)
+
+        # Join before reading missed items so nothing falls in between;
+        # clients drop duplicates by (kind, id)
+        await self.channel_layer.group_add(
+            self.room_group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'last_notification_id' in query or 'last_communication_id' in query:
+            await self.send_sync(
+                query.get('last_notification_id', [0])[0],
+                query.get('last_communication_id', [0])[0],
+            )
+        logger.info(f"User {self.user.id} connected to notifications")
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+            message_type = data.get('type')
+
+            if message_type == 'resume':
+                await self.send_sync(data.get('last_notification_id'), data.get('last_communication_id'))
+            elif message_type == 'ping':
+                await self.send(text_data=json.dumps({'type': 'pong'}))
+            else:
+                logger.warning(f"Unknown message type: {message_type}")
+
+        except json.JSONDecodeError:
+            logger.error("Invalid JSON received")
+        except Exception as e:
+            logger.error(f"Error handling message: {str(e)}")
+
+    async def send_sync(self, last_notification_id, last_communication_id):
+        """Send everything created after the given ids, plus the current counts"""
+        notifications, counts = await self.get_missed(_as_id(last_notification_id), _as_id(last_communication_id))
+        await self.send(text_data=json.dumps({
+            'type': 'sync',
+            'notifications': notifications,
+            'unread_counts': counts,
+        }))
+
+    # Channel layer event handlers (sent to client)
+    async def notification_new(self, event):
+        """Send a new notification to the client"""
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event['notification'],
+        }))
+
+    async def notification_batch(self, event):
+        """Send the rows of a bulk insert, then the unread count change"""
+        for notification in event['notifications']:
+            await self.notification_new({'notification': notification})
+        if event['delta']:
+            await self.notification_unread(event)
+
+    async def notification_unread(self, event):
+        """Send an unread count change to the client"""
+        await self.send(text_data=json.dumps({
+            'type': 'unread_delta',
+            'field': event['field'],
+            'delta': event['delta'],
+        }))
+
+    # Database operations
+    @database_sync_to_async
+    def get_missed(self, last_notification_id, last_communication_id):
+        return (
+            missed_notifications(self.user.id, last_notification_id, last_communication_id),
+            unread_counts(self.user.id),
+        )
@@ -1,5 +1,5 @@
-from core.models_communication import CommunicationNotification
-from core.models_theme import UserThemePreference
+from core.notification_counters import recent_notifications, unread_counts
+from core.theme_preferences import get_preference
 
 def notifications_processor(request):
     """
@@ -8,18 +8,9 @@ def notifications_processor(request):
     context = {}
     
     if request.user.is_authenticated:
-        unread_notifications_count = CommunicationNotification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
-        
-        # Son 5 bildirimi al
-        recent_notifications = CommunicationNotification.objects.filter(
-            user=request.user
-        ).order_by('-created_at')[:5]
-        
-        context['unread_notifications_count'] = unread_notifications_count
-        context['recent_notifications'] = recent_notifications
+        # Both come from the cache; see core.notification_counters
+        context['unread_notifications_count'] = unread_counts(request.user.pk)['communication_notifications']
+        context['recent_notifications'] = recent_notifications(request.user.pk)
     
     return context
 
@@ -30,8 +21,8 @@ def theme_processor(request):
     context = {}
     
     if request.user.is_authenticated:
-        theme_preference, created = UserThemePreference.objects.get_or_create(user=request.user)
-        context['dark_mode'] = theme_preference.dark_mode
+        # Read from the session; see core.theme_preferences
+        context['dark_mode'] = get_preference(request)['dark_mode']
     
     return context
 
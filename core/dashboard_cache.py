@@ -0,0 +1,160 @@
+"""
+Dashboard Fragment Cache for Laso Healthcare
+Per-user, per-section caching of the role dashboards. Cache keys and the
+model -> section invalidation map are defined here and nowhere else.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from appointments.models import Appointment
+from treatments.models import Treatment
+from treatments.models_vitals import VitalSign, VitalSignAlert
+from telemedicine.models import MessageThread, DoctorPatientMessage, TeleMedicineConsultation
+
+logger = logging.getLogger(__name__)
+
+# Sections shared by every user of a role are cached once under this scope
+SHARED = 'all'
+
+SECTIONS = {
+    # Patient dashboard
+    'patient_appointments': 'user',
+    'patient_treatments': 'user',
+    'patient_vitals': 'user',
+    'patient_messages': 'user',
+    'patient_consultations': 'user',
+    # Doctor dashboard
+    'doctor_appointments': 'user',
+    'doctor_treatments': 'user',
+    'doctor_patients': 'user',
+    # Receptionist and admin dashboards
+    'receptionist_overview': SHARED,
+    'admin_totals': SHARED,
+}
+
+
+def _appointment_users(appointment):
+    return {'patient': [appointment.patient_id], 'doctor': [appointment.doctor_id]}
+
+
+def _treatment_users(treatment):
+    try:
+        return _appointment_users(treatment.appointment)
+    except ObjectDoesNotExist:
+        # Deleted together with its appointment, which invalidates the same sections
+        return {'patient': [], 'doctor': []}
+
+
+def _vital_alert_users(alert):
+    try:
+        return {'patient': [alert.vital_sign.patient_id]}
+    except ObjectDoesNotExist:
+        return {'patient': []}
+
+
+def _consultation_users(consultation):
+    try:
+        return {'patient': [consultation.appointment.patient_id]}
+    except ObjectDoesNotExist:
+        return {'patient': []}
+
+
+# model -> (function returning the affected users by role, {section: role or SHARED})
+INVALIDATION_MAP = {
+    Appointment: (_appointment_users, {
+        'patient_appointments': 'patient',
+        'doctor_appointments': 'doctor',
+        'doctor_patients': 'doctor',
+        'receptionist_overview': SHARED,
+        'admin_totals': SHARED,
+    }),
+    Treatment: (_treatment_users, {
+        'patient_treatments': 'patient',
+        'doctor_treatments': 'doctor',
+        'admin_totals': SHARED,
+    }),
+    VitalSign: (lambda vital: {'patient': [vital.patient_id]}, {
+        'patient_vitals': 'patient',
+    }),
+    VitalSignAlert: (_vital_alert_users, {
+        'patient_vitals': 'patient',
+    }),
+    MessageThread: (lambda thread: {'patient': [thread.patient_id]}, {
+        'patient_messages': 'patient',
+    }),
+    DoctorPatientMessage: (lambda message: {'patient': [message.patient_id]}, {
+        'patient_messages': 'patient',
+    }),
+    TeleMedicineConsultation: (_consultation_users, {
+        'patient_consultations': 'patient',
+    }),
+}
+
+
+def _settings():
+    return getattr(settings, 'DASHBOARD_CACHE_SETTINGS', {})
+
+
+def cache_key(section, user_id=None, day=None):
+    """
+    Key for a section; the date is part of the key because several sections
+    ("today's appointments", "this week") change at midnight
+    """
+    scope = SHARED if SECTIONS[section] == SHARED else user_id
+    day = day or timezone.localdate()
+    return f'dashboard:{scope}:{section}:{day.isoformat()}'
+
+
+def get_section(user, section, builder):
+    """
+    Return the cached context for ``section``, building it with ``builder()``
+    on a miss. Builders must return picklable values (lists, not querysets).
+    """
+    options = _settings()
+    if not options.get('ENABLED', True):
+        return builder()
+
+    key = cache_key(section, user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = builder()
+        # The timeout is the staleness bound for anything no signal covers
+        cache.set(key, data, timeout=options.get('MAX_STALENESS', 300))
+    return data
+
+
+def invalidate(section, user_ids=()):
+    """
+    Drop today's cached copy of ``section`` for the given users (or the
+    shared copy), once the current transaction commits
+    """
+    if SECTIONS[section] == SHARED:
+        keys = [cache_key(section)]
+    else:
+        keys = [cache_key(section, user_id) for user_id in user_ids if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _invalidate_for_instance(sender, instance, **kwargs):
+    resolve, sections = INVALIDATION_MAP[sender]
+    try:
+        users = resolve(instance)
+    except Exception:
+        logger.exception("Could not resolve dashboard cache owners for %s", sender.__name__)
+        return
+    for section, role in sections.items():
+        invalidate(section, () if role == SHARED else users.get(role, ()))
+
+
+for _model in INVALIDATION_MAP:
+    post_save.connect(_invalidate_for_instance, sender=_model,
+                      dispatch_uid=f'dashboard_cache_saved_{_model.__name__}')
+    post_delete.connect(_invalidate_for_instance, sender=_model,
+                        dispatch_uid=f'dashboard_cache_deleted_{_model.__name__}')
@@ -0,0 +1,187 @@
+"""
+Read-Replica Database Routing for Laso Healthcare
+Analytics, report and batch reads run inside ``use_replica()`` and go to the
+optional ``replica`` database while it is reachable and not lagging; every
+other query, and every read after a write in the same scope, stays on the
+primary.
+"""
+import logging
+import threading
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DB_ALIAS = 'replica'
+
+
+class _Scope:
+    """Routing state of one request or use_replica()/use_primary() block"""
+
+    def __init__(self, parent=None, replica=False, pinned=False):
+        self.parent = parent
+        self.replica = replica
+        self.pinned = pinned or bool(parent and parent.pinned)
+        self.wrote = False
+
+
+_scope = ContextVar('db_routing_scope', default=None)
+
+_lag_lock = threading.Lock()
+_lag_state = {'checked_at': 0.0, 'healthy': False}
+
+
+def _setting(name, default):
+    return getattr(settings, 'DATABASE_REPLICA_SETTINGS', {}).get(name, default)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def replication_lag():
+    """Seconds the replica is behind the primary (0 for non-PostgreSQL replicas)"""
+    with connections[REPLICA_DB_ALIAS].cursor() as cursor:
+        if connections[REPLICA_DB_ALIAS].vendor != 'postgresql':
+            cursor.execute('SELECT 1')
+            return 0.0
+        # An idle primary leaves the replay timestamp old although nothing is missing
+        cursor.execute(
+            "SELECT CASE"
+            " WHEN NOT pg_is_in_recovery() THEN 0"
+            " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+            " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+            " END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_healthy():
+    """
+    Whether the replica may serve reads; the lag check runs at most once per
+    LAG_CHECK_INTERVAL per process and any failure counts as unhealthy
+    """
+    if not replica_configured():
+        return False
+    now = time.monotonic()
+    if now - _lag_state['checked_at'] < _setting('LAG_CHECK_INTERVAL', 10):
+        return _lag_state['healthy']
+    with _lag_lock:
+        if now - _lag_state['checked_at'] < _setting('LAG_CHECK_INTERVAL', 10):
+            return _lag_state['healthy']
+        try:
+            lag = replication_lag()
+            healthy = lag <= _setting('MAX_LAG', 30)
+            if not healthy:
+                logger.warning("Replica is %.1fs behind; analytics reads fall back to the primary", lag)
+        except Exception:
+            logger.exception("Replica lag check failed; analytics reads fall back to the primary")
+            healthy = False
+        _lag_state.update(checked_at=time.monotonic(), healthy=healthy)
+    return healthy
+
+
+def pin_to_primary():
+    """
+    Send the remaining reads of the current scope, and of the scopes
+    around it (e.g. the request), to the primary
+    """
+    scope = _scope.get()
+    while scope is not None:
+        scope.pinned = scope.wrote = True
+        scope = scope.parent
+
+
+def is_pinned():
+    scope = _scope.get()
+    return bool(scope and scope.pinned)
+
+
+class _RoutingScope(ContextDecorator):
+    replica = False
+    pinned = False
+
+    def __enter__(self):
+        parent = _scope.get()
+        self.scope = _Scope(parent, replica=self.replica or bool(parent and parent.replica), pinned=self.pinned)
+        self._token = _scope.set(self.scope)
+        return self.scope
+
+    def __exit__(self, *exc):
+        _scope.reset(self._token)
+        return False
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call, so concurrent calls keep their own token
+        return type(self)()
+
+
+class use_replica(_RoutingScope):
+    """
+    Context manager / decorator marking read-only analytics work whose
+    reads may be served by the replica
+    """
+    replica = True
+
+
+class use_primary(_RoutingScope):
+    """
+    Context manager / decorator forcing every read inside it to the primary,
+    e.g. a view that must read what it has just written
+    """
+    pinned = True
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica only inside ``use_replica()`` when it is healthy
+    and nothing in the scope has written yet; writes and migrations always
+    use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        scope = _scope.get()
+        if scope and scope.replica and not scope.pinned and replica_healthy():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Reads after a write in the same scope must see it
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinMiddleware:
+    """
+    Pins a request to the primary when it writes (or is an unsafe method),
+    and keeps the same browser on the primary for PIN_SECONDS afterwards so
+    the redirect that follows a form post reads its own writes.
+    """
+    COOKIE_NAME = 'pin_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unsafe = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        scope = _Scope(pinned=unsafe or self.COOKIE_NAME in request.COOKIES)
+        token = _scope.set(scope)
+        try:
+            response = self.get_response(request)
+        finally:
+            _scope.reset(token)
+        if (scope.wrote or unsafe) and replica_configured():
+            response.set_cookie(self.COOKIE_NAME, '1', max_age=_setting('PIN_SECONDS', 5),
+                                httponly=True, samesite='Lax')
+        return response
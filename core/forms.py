@@ -9,6 +9,7 @@ from treatments.models import Treatment, Prescription
 from treatments.models_medications import Medication, MedicationInteraction
 from treatments.models_medical_history import MedicalHistory
 from .models_theme import UserThemePreference
+from .theme_preferences import get_preference, update_preference
 
 User = get_user_model()
 
@@ -314,13 +315,12 @@ class ProfileSettingsForm(forms.ModelForm):
             'profile_picture': forms.FileInput(attrs={'class': 'form-control', 'accept': 'image/*'}),
         }
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, request, **kwargs):
+        # The request carries the session copy of the theme preference, which
+        # is what the pages read (core.theme_preferences)
+        self.request = request
         super().__init__(*args, **kwargs)
-        # Set initial theme value if user has theme preference
-        if self.instance and hasattr(self.instance, 'theme_preference'):
-            self.fields['theme'].initial = self.instance.theme_preference.theme
-        else:
-            self.fields['theme'].initial = 'light'
+        self.fields['theme'].initial = get_preference(request)['theme']
     
     def save(self, commit=True):
         user = super().save(commit)
@@ -328,9 +328,6 @@ class ProfileSettingsForm(forms.ModelForm):
         # Save theme preference
         theme = self.cleaned_data.get('theme')
         if theme:
-            theme_preference, created = UserThemePreference.objects.get_or_create(user=user)
-            theme_preference.theme = theme
-            theme_preference.dark_mode = (theme == 'dark')
-            theme_preference.save()
+            update_preference(self.request, theme=theme, dark_mode=(theme == 'dark'))
         
-        return user 
\ No newline at end of file
+        return user
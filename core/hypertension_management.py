@@ -11,7 +11,8 @@ from django.core.mail import send_mail
 from django.conf import settings
 from treatments.models_vitals import VitalSign, VitalSignAlert
 from treatments.models_medical_history import MedicalHistory
-from core.models_notifications import Notification
+from core.models_notifications import Notification, NotificationPriority, NotificationType
+from core.notification_fanout import fan_out
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -370,11 +371,11 @@ class HypertensionManager:
         """
         # Create in-app notification
         Notification.objects.create(
-            user=alert.patient,
+            recipient=alert.patient,
             title=alert.title,
             message=alert.message,
-            notification_type='health_alert',
-            priority='high' if alert.priority == 'critical' else 'medium'
+            notification_type=NotificationType.EMERGENCY_ALERT,
+            priority=NotificationPriority.URGENT if alert.priority == 'critical' else NotificationPriority.HIGH
         )
         
         # Send email if configured
@@ -394,22 +395,19 @@ class HypertensionManager:
         """
         Send notification to relevant doctors
         """
-        # Find doctors who have treated this patient
-        from appointments.models import Appointment
-        
+        # Doctors who have treated this patient, notified in bulk
         doctors = User.objects.filter(
             user_type='doctor',
             doctor_appointments__patient=alert.patient
-        ).distinct()
+        )
         
-        for doctor in doctors:
-            Notification.objects.create(
-                user=doctor,
-                title=f"Patient Alert: {alert.patient.get_full_name()}",
-                message=f"Critical hypertension alert for patient {alert.patient.get_full_name()}: {alert.message}",
-                notification_type='patient_alert',
-                priority='high'
-            )
+        fan_out(doctors, {
+            'title': f"Patient Alert: {alert.patient.get_full_name()}",
+            'message': f"Critical hypertension alert for patient {alert.patient.get_full_name()}: {alert.message}",
+            'notification_type': NotificationType.EMERGENCY_ALERT,
+            'priority': NotificationPriority.HIGH,
+            'extra_data': {'patient_id': alert.patient_id, 'alert_type': alert.alert_type},
+        })
     
     def check_overdue_monitoring(self):
         """
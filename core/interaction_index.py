@@ -0,0 +1,152 @@
+"""
+In-memory drug interaction index for Laso Healthcare
+Loads every MedicationInteraction once into an adjacency map keyed by
+normalized medication name and active ingredient, shared process-wide and
+invalidated through a version key when medications or interactions change
+"""
+
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+
+from treatments.models_medications import Medication, MedicationInteraction
+
+INDEX_VERSION_KEY = 'drug_interaction_index:version'
+
+
+def normalize_drug_name(name: str) -> str:
+    return ' '.join((name or '').casefold().split())
+
+
+class InteractionIndex:
+    """
+    Adjacency map of medication interactions.
+
+    ``resolve`` turns a free-text drug name into medication ids (exact name
+    or active ingredient first, then a substring match on the name, which
+    mirrors the previous ``name__icontains`` lookup). ``check`` walks the
+    adjacency map for every pair in a list without touching the database.
+    """
+
+    def __init__(self, medications, interactions):
+        self.by_key: Dict[str, Set[int]] = {}
+        self.names: Dict[int, str] = {}
+        for med_id, name, active_ingredient in medications:
+            normalized = normalize_drug_name(name)
+            self.names[med_id] = normalized
+            self.by_key.setdefault(normalized, set()).add(med_id)
+            if active_ingredient:
+                self.by_key.setdefault(normalize_drug_name(active_ingredient), set()).add(med_id)
+
+        self.adjacency: Dict[int, Dict[int, dict]] = {}
+        for med1_id, med2_id, severity, description, recommendations in interactions:
+            details = {
+                'severity': severity,
+                'description': description,
+                'recommendations': recommendations,
+            }
+            self.adjacency.setdefault(med1_id, {})[med2_id] = details
+            self.adjacency.setdefault(med2_id, {})[med1_id] = details
+
+        self._resolved: Dict[str, frozenset] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name: str) -> frozenset:
+        key = normalize_drug_name(name)
+        if not key:
+            return frozenset()
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            ids = self.by_key.get(key)
+            if not ids:
+                ids = {med_id for med_id, med_name in self.names.items() if key in med_name}
+            resolved = frozenset(ids)
+            with self._lock:
+                self._resolved[key] = resolved
+        return resolved
+
+    def find(self, medication1: str, medication2: str) -> Optional[dict]:
+        return self._find_ids(self.resolve(medication1), self.resolve(medication2))
+
+    def _find_ids(self, ids1, ids2) -> Optional[dict]:
+        for med_id in ids1:
+            neighbours = self.adjacency.get(med_id)
+            if not neighbours:
+                continue
+            for other_id in ids2:
+                details = neighbours.get(other_id)
+                if details:
+                    return details
+        return None
+
+    def check(self, medications: List[str], against: Optional[List[str]] = None) -> List[dict]:
+        """
+        Return interactions between every pair in ``medications``, or between
+        each of ``medications`` and each of ``against`` when given.
+        """
+        resolved = [(name, self.resolve(name)) for name in medications]
+        if against is None:
+            pairs = [
+                (resolved[i], resolved[j])
+                for i in range(len(resolved))
+                for j in range(i + 1, len(resolved))
+            ]
+        else:
+            others = [(name, self.resolve(name)) for name in against]
+            pairs = [(other, current) for other in others for current in resolved]
+
+        interactions = []
+        for (name1, ids1), (name2, ids2) in pairs:
+            details = self._find_ids(ids1, ids2)
+            if details:
+                interactions.append({
+                    'medication1': name1,
+                    'medication2': name2,
+                    **details,
+                })
+        return interactions
+
+
+_index: Tuple[int, Optional[InteractionIndex]] = (-1, None)
+_index_lock = threading.Lock()
+
+
+def get_interaction_index() -> InteractionIndex:
+    """
+    Return the process-wide index, reloading it when the version has changed
+    """
+    global _index
+    version = cache.get(INDEX_VERSION_KEY, 0)
+    if _index[0] == version and _index[1] is not None:
+        return _index[1]
+
+    with _index_lock:
+        if _index[0] == version and _index[1] is not None:
+            return _index[1]
+        index = InteractionIndex(
+            Medication.objects.values_list('id', 'name', 'active_ingredient'),
+            MedicationInteraction.objects.values_list(
+                'medication1_id', 'medication2_id', 'severity', 'description', 'recommendations'
+            ),
+        )
+        _index = (version, index)
+        return index
+
+
+def invalidate_interaction_index(**kwargs):
+    """
+    Signal receiver: bump the shared version so every process reloads
+    """
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, 1, timeout=None)
+
+
+for _model in (Medication, MedicationInteraction):
+    post_save.connect(invalidate_interaction_index, sender=_model,
+                      dispatch_uid=f'interaction_index_saved_{_model.__name__}')
+    post_delete.connect(invalidate_interaction_index, sender=_model,
+                        dispatch_uid=f'interaction_index_deleted_{_model.__name__}')
@@ -0,0 +1,159 @@
+"""
+Batched Email Delivery for Laso Healthcare
+Emails are queued as pending 'email' NotificationLog rows of a Notification
+and delivered in batches, each batch over one SMTP connection. Every
+message's outcome is recorded on its log row; failed messages are retried
+by Celery with exponential backoff.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models_notifications import Notification, NotificationLog
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'NOTIFICATION_SETTINGS', {}).get(name, default)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def email_payload(subject, body):
+    """extra_data entries holding the email version of a notification"""
+    return {'email_subject': subject, 'email_body': body}
+
+
+def mark_email_only(notifications):
+    """
+    Turn notifications into email carriers (unsaved): read, and matched by
+    EMAIL_ONLY so in-app lists skip them
+    """
+    for notification in notifications:
+        notification.is_read = True
+        notification.extra_data = dict(notification.extra_data or {}, email_only=True)
+
+
+def create_email_only(notifications):
+    """
+    Insert unsaved Notification rows that exist only to carry an email and
+    its delivery logs, and return them. They bypass bulk_notify(), so no web
+    log, unread-counter change or push goes with them.
+    """
+    notifications = list(notifications)
+    mark_email_only(notifications)
+    return Notification.objects.bulk_create(notifications, batch_size=_setting('FANOUT_CHUNK_SIZE', 500))
+
+
+def queue_emails(notifications):
+    """
+    Create a pending email log for every saved notification whose recipient
+    has an address and return the log ids; nothing is sent yet
+    """
+    logs = NotificationLog.objects.bulk_create([
+        NotificationLog(notification=notification, delivery_method='email', status='pending')
+        for notification in notifications
+        if notification.recipient and notification.recipient.email
+    ])
+    return [log.pk for log in logs]
+
+
+def build_message(notification):
+    extra = notification.extra_data or {}
+    return EmailMessage(
+        subject=extra.get('email_subject') or notification.title,
+        body=extra.get('email_body') or notification.message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notification.recipient.email],
+    )
+
+
+def deliver(log_ids):
+    """
+    Send the emails of pending/failed logs over a single connection and
+    record each outcome. Returns the ids of the logs that failed.
+    """
+    logs = list(NotificationLog.objects.filter(
+        pk__in=log_ids, delivery_method='email', status__in=['pending', 'failed']
+    ).select_related('notification__recipient'))
+    if not logs:
+        return []
+
+    sent, failed = [], []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for log in logs:
+            try:
+                # send_messages() reports a count, not which message failed, so
+                # each message goes on its own over the shared connection
+                connection.send_messages([build_message(log.notification)])
+                sent.append(log)
+            except Exception as e:
+                log.error_message = str(e)
+                failed.append(log)
+    except Exception as e:
+        # The connection itself failed: everything not yet sent is retried
+        done = {log.pk for log in sent + failed}
+        for log in logs:
+            if log.pk not in done:
+                log.error_message = str(e)
+                failed.append(log)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    now = timezone.now()
+    with transaction.atomic():
+        if sent:
+            NotificationLog.objects.filter(pk__in=[log.pk for log in sent]).update(
+                status='sent', sent_at=now, error_message=''
+            )
+            Notification.objects.filter(
+                pk__in=[log.notification_id for log in sent]
+            ).update(is_sent_via_email=True)
+        for log in failed:
+            log.status = 'failed'
+        NotificationLog.objects.bulk_update(failed, ['status', 'error_message'])
+
+    if failed:
+        logger.warning("%d of %d emails failed", len(failed), len(logs))
+    return [log.pk for log in failed]
+
+
+def retry_countdown(retries):
+    """
+    Seconds before retry number ``retries + 1`` (EMAIL_RETRY_BACKOFF doubled
+    per attempt), or None once EMAIL_MAX_RETRIES is used up
+    """
+    if retries >= _setting('EMAIL_MAX_RETRIES', 5):
+        return None
+    return _setting('EMAIL_RETRY_BACKOFF', 60) * 2 ** retries
+
+
+def send_queued(log_ids):
+    """
+    Deliver queued emails in EMAIL_BATCH_SIZE batches: through Celery (with
+    retries) when a broker is configured, otherwise inline in this process.
+    Returns the ids that failed inline (always empty when queued to Celery).
+    """
+    failed = []
+    for batch in _chunks(list(log_ids), _setting('EMAIL_BATCH_SIZE', 100)):
+        if getattr(settings, 'CELERY_BROKER_URL', None):
+            from .tasks import deliver_email_batch_task
+            try:
+                deliver_email_batch_task.delay(batch)
+                continue
+            except Exception:
+                logger.exception("Could not enqueue %d emails; sending inline", len(batch))
+        failed += deliver(batch)
+    return failed
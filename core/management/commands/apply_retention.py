@@ -0,0 +1,28 @@
+"""
+Django management command to archive and delete rows past their retention period
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.retention import POLICIES, apply_retention, archive_dir
+
+
+class Command(BaseCommand):
+    help = 'Move expired rows of the retention policies into compressed archives and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', choices=sorted(POLICIES), dest='policies',
+                            help='Run only this policy (repeatable; default: all)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per archive file and DELETE (default: RETENTION_SETTINGS BATCH_SIZE)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the rows that would be archived')
+
+    def handle(self, *args, **options):
+        try:
+            results = apply_retention(options['policies'], options['batch_size'], options['dry_run'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        verb = 'would be archived' if options['dry_run'] else 'archived'
+        for name, count in results.items():
+            self.stdout.write(f'{name}: {count} row(s) {verb}')
+        self.stdout.write(self.style.SUCCESS(f'{sum(results.values())} row(s) {verb} under {archive_dir()}.'))
@@ -0,0 +1,30 @@
+"""
+Django management command to rebuild DailyActiveUsers rows from LoginSession history
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.active_users import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily active user rollups from the login session history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365,
+                            help='Number of days up to today to rebuild (default: 365)')
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help='First day to rebuild (YYYY-MM-DD); overrides --days')
+        parser.add_argument('--end', type=date.fromisoformat, default=None,
+                            help='Last day to rebuild (YYYY-MM-DD, default: today)')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - timedelta(days=max(options['days'], 1) - 1)
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        days = backfill(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt daily active users for {days} day(s) ({start} to {end}).'))
@@ -0,0 +1,168 @@
+"""
+Django management command to load-test the AI chat path against the mock provider
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from core.ai_conversation_log import conversation_log
+from core.mock_llm import MockLLMSettings, start_mock_server_thread
+from core.models_ai_config import AIConfiguration
+
+User = get_user_model()
+
+PROVIDER_PATHS = {
+    'openai': '/v1/chat/completions',
+    'openrouter': '/v1/chat/completions',
+    'anthropic': '/v1/messages',
+    'huggingface': '/models/mock',
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Command(BaseCommand):
+    help = 'Drive concurrent chats through the ai_chat view and report latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Total chat requests (default: 100)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent clients (default: 10)')
+        parser.add_argument('--provider', choices=sorted(PROVIDER_PATHS), default='openai',
+                            help='Wire format to exercise (default: openai)')
+        parser.add_argument('--api-url', default=None,
+                            help='Use an already running provider endpoint instead of an in-process mock')
+        parser.add_argument('--latency', type=float, default=0.2, help='Mock latency in seconds (default: 0.2)')
+        parser.add_argument('--tokens-per-second', type=float, default=50.0,
+                            help='Mock generation speed (default: 50)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Mock error rate (default: 0)')
+        parser.add_argument('--requests-per-minute', type=int, default=0,
+                            help='Throttle limit for the benchmark configuration (default: unlimited)')
+        parser.add_argument('--max-concurrent-requests', type=int, default=0,
+                            help='Concurrency limit for the benchmark configuration (default: unlimited)')
+        parser.add_argument('--repeat-messages', action='store_true',
+                            help='Send identical messages so the response cache is exercised')
+        parser.add_argument('--max-p95', type=float, default=None,
+                            help='Fail if p95 latency (seconds) exceeds this value, for CI')
+
+    def handle(self, *args, **options):
+        from core.ai_service import ai_service
+
+        total = options['requests']
+        concurrency = max(1, options['concurrency'])
+
+        server = None
+        api_url = options['api_url']
+        if not api_url:
+            server = start_mock_server_thread(mock_settings=MockLLMSettings(
+                latency=options['latency'],
+                tokens_per_second=options['tokens_per_second'],
+                error_rate=options['error_rate'],
+            ))
+            api_url = f"http://127.0.0.1:{server.server_address[1]}{PROVIDER_PATHS[options['provider']]}"
+
+        user, _ = User.objects.get_or_create(
+            username='ai_benchmark',
+            defaults={'user_type': 'patient', 'first_name': 'Benchmark', 'last_name': 'Client'},
+        )
+        config = AIConfiguration.objects.create(
+            name='AI Benchmark (mock)',
+            provider=options['provider'],
+            api_key='mock-key',
+            api_url=api_url,
+            model_name='mock-model',
+            is_active=False,
+            requests_per_minute=options['requests_per_minute'],
+            max_concurrent_requests=options['max_concurrent_requests'],
+        )
+
+        original_config = ai_service.config
+        ai_service.config = config
+        url = reverse('core:ai_chat')
+
+        latencies = []
+        outcomes = {'success': 0, 'cached': 0, 'busy': 0, 'error': 0}
+        results_lock = threading.Lock()
+        local = threading.local()
+
+        def run_chat(index):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            message = 'What is normal blood pressure?'
+            if not options['repeat_messages']:
+                message = f'{message} (benchmark #{index})'
+
+            started = time.perf_counter()
+            response = local.client.post(url, {'message': message})
+            elapsed = time.perf_counter() - started
+
+            data = response.json()
+            if response.status_code == 429:
+                outcome = 'busy'
+            elif data.get('success'):
+                outcome = 'cached' if data.get('cached') else 'success'
+            else:
+                outcome = 'error'
+            with results_lock:
+                latencies.append(elapsed)
+                outcomes[outcome] += 1
+
+        def worker(indices):
+            try:
+                for index in indices:
+                    run_chat(index)
+            finally:
+                connection.close()
+
+        self.stdout.write(f'Running {total} chats with {concurrency} concurrent clients against {api_url}')
+        wall_started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                batches = [range(i, total, concurrency) for i in range(concurrency)]
+                list(executor.map(worker, batches))
+        finally:
+            wall = time.perf_counter() - wall_started
+            ai_service.config = original_config
+            conversation_log.flush()
+            config.delete()
+            # Removes the benchmark's conversations with it
+            user.delete()
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        latencies.sort()
+        utilization = sum(latencies) / (wall * concurrency) if wall else 0.0
+        p95 = percentile(latencies, 95)
+
+        self.stdout.write(f"Completed: {len(latencies)} in {wall:.2f}s ({len(latencies) / wall:.1f} req/s)")
+        self.stdout.write(
+            f"Outcomes: {outcomes['success']} ok, {outcomes['cached']} cached, "
+            f"{outcomes['busy']} busy, {outcomes['error']} errors"
+        )
+        if latencies:
+            self.stdout.write(
+                f"Latency: mean {statistics.mean(latencies) * 1000:.0f}ms, "
+                f"p50 {percentile(latencies, 50) * 1000:.0f}ms, "
+                f"p95 {p95 * 1000:.0f}ms, "
+                f"p99 {percentile(latencies, 99) * 1000:.0f}ms, "
+                f"max {latencies[-1] * 1000:.0f}ms"
+            )
+        self.stdout.write(f"Worker utilization: {utilization:.0%}")
+
+        if options['max_p95'] is not None and p95 > options['max_p95']:
+            raise CommandError(f"p95 latency {p95:.3f}s exceeds the {options['max_p95']:.3f}s budget")
+        self.stdout.write(self.style.SUCCESS('Benchmark finished.'))
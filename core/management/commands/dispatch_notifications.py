@@ -0,0 +1,29 @@
+"""
+Django management command to deliver due scheduled notifications
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.notification_dispatcher import dispatch_due
+
+
+class Command(BaseCommand):
+    help = 'Deliver scheduled notifications that are due; several workers may run at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Notifications claimed per transaction (default: DISPATCH_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running as a worker, polling for due notifications')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between polls with --loop (default: 5)')
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = dispatch_due(batch_size=options['batch_size'])
+            if delivered or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'{delivered} notification(s) dispatched.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+"""
+Django management command to write requested report exports
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.reports import generate_pending_reports
+
+
+class Command(BaseCommand):
+    help = 'Generate pending report exports; needed where no Celery broker is configured'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Reports generated per run (default: all pending)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running as a worker, polling for pending reports')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between polls with --loop (default: 5)')
+
+    def handle(self, *args, **options):
+        while True:
+            generated = generate_pending_reports(limit=options['limit'])
+            if generated or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'{generated} report(s) processed.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
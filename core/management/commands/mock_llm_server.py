@@ -0,0 +1,47 @@
+"""
+Django management command to run the local mock LLM provider
+"""
+from django.core.management.base import BaseCommand
+
+from core.mock_llm import MockLLMSettings, create_mock_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local mock LLM provider speaking the OpenAI/Anthropic wire formats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Seconds before the first token (default: 0.2)')
+        parser.add_argument('--tokens-per-second', type=float, default=50.0,
+                            help='Simulated generation speed (default: 50)')
+        parser.add_argument('--output-tokens', type=int, default=40,
+                            help='Tokens generated per response (default: 40)')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of requests answered with 429/500 (default: 0)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for error simulation')
+
+    def handle(self, *args, **options):
+        mock_settings = MockLLMSettings(
+            latency=options['latency'],
+            tokens_per_second=options['tokens_per_second'],
+            error_rate=options['error_rate'],
+            output_tokens=options['output_tokens'],
+            seed=options['seed'],
+        )
+        server = create_mock_server(options['host'], options['port'], mock_settings)
+        base_url = f"http://{options['host']}:{server.server_address[1]}"
+
+        self.stdout.write(self.style.SUCCESS(f'Mock LLM provider listening on {base_url}'))
+        self.stdout.write(f'  OpenAI/OpenRouter: {base_url}/v1/chat/completions')
+        self.stdout.write(f'  Anthropic:         {base_url}/v1/messages')
+        self.stdout.write(f'  Hugging Face:      {base_url}/models/<model>')
+        self.stdout.write('Set one of these as AIConfiguration.api_url. Press Ctrl+C to stop.')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,31 @@
+"""
+Django management command to load archived rows back into their tables
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.retention import archive_files, restore_archive
+
+
+class Command(BaseCommand):
+    help = 'Restore rows from retention archives; rows that already exist are left untouched'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+',
+                            help='Archive files (.jsonl.gz) or directories containing them')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows inserted per transaction (default: RETENTION_SETTINGS BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        files = []
+        for path in options['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist')
+            files.extend(archive_files(path))
+        total = 0
+        for path in files:
+            restored = restore_archive(path, options['batch_size'])
+            total += restored
+            self.stdout.write(f'{path}: {restored} row(s)')
+        self.stdout.write(self.style.SUCCESS(f'{total} row(s) restored from {len(files)} archive(s).'))
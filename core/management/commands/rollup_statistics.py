@@ -0,0 +1,21 @@
+"""
+Django management command to refresh the pre-aggregated statistics tables
+"""
+from django.core.management.base import BaseCommand
+
+from core.statistics import rollup_statistics
+
+
+class Command(BaseCommand):
+    help = 'Fill SystemStatistics, DoctorStatistics and DoctorPerformanceMetric for days changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Ignore the high-water mark and rebuild every day')
+
+    def handle(self, *args, **options):
+        days = rollup_statistics(full=options['full'])
+        if days is None:
+            self.stdout.write(self.style.WARNING('Another statistics rollup is running; nothing done.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Statistics rolled up for {days} day(s).'))
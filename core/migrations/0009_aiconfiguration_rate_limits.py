@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_aiconfiguration_aiprompttemplate_aiconversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiconfiguration',
+            name='max_concurrent_requests',
+            field=models.PositiveIntegerField(default=5, help_text='Maximum simultaneous provider requests across all workers (0 = unlimited)', verbose_name='Max Concurrent Requests'),
+        ),
+        migrations.AddField(
+            model_name='aiconfiguration',
+            name='requests_per_minute',
+            field=models.PositiveIntegerField(default=60, help_text='Maximum provider requests per minute across all workers (0 = unlimited)', verbose_name='Requests per Minute'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_aiconfiguration_rate_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50, unique=True, verbose_name='Job')),
+                ('high_water_mark', models.DateTimeField(help_text='Start time of the last successful run.', verbose_name='High-Water Mark')),
+                ('days_processed', models.IntegerField(default=0, verbose_name='Days Processed (last run)')),
+                ('duration', models.FloatField(default=0.0, verbose_name='Duration (seconds, last run)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Statistics Rollup',
+                'verbose_name_plural': 'Statistics Rollups',
+            },
+        ),
+        migrations.AddField(
+            model_name='systemstatistics',
+            name='monthly_active_users',
+            field=models.IntegerField(default=0, help_text='Distinct users who logged in during the 30 days ending on this date.', verbose_name='Monthly Active Users'),
+        ),
+        migrations.AddField(
+            model_name='systemstatistics',
+            name='new_appointments',
+            field=models.IntegerField(default=0, help_text='Appointments booked on this date, whatever date they are scheduled for.', verbose_name='New Appointments'),
+        ),
+        migrations.AddField(
+            model_name='systemstatistics',
+            name='new_users',
+            field=models.IntegerField(default=0, verbose_name='New Users'),
+        ),
+    ]
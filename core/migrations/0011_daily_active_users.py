@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_statistics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActiveUsers',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Date')),
+                ('user_count', models.PositiveIntegerField(default=0, verbose_name='Active Users')),
+                ('user_bitmap', models.BinaryField(default=bytes, verbose_name='Active User Bitmap')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Daily Active Users',
+                'verbose_name_plural': 'Daily Active Users',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
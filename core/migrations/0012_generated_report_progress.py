@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_daily_active_users'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedreport',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Completion Date'),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='error_message',
+            field=models.TextField(blank=True, verbose_name='Error Message'),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='file_format',
+            field=models.CharField(choices=[('xlsx', 'Excel'), ('csv', 'CSV')], default='xlsx', max_length=10, verbose_name='File Format'),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Progress (%)'),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='report_type',
+            field=models.CharField(blank=True, help_text='Built-in report generated when no template is set.', max_length=30, verbose_name='Report Type'),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='row_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Rows Written'),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status'),
+        ),
+        migrations.AlterField(
+            model_name='generatedreport',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='generated_reports', to='core.reporttemplate', verbose_name='Report Template'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_generated_report_progress'),
+        ('users', '0005_user_add_gender'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_notification_counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+                ('notifications', models.IntegerField(default=0, verbose_name='Unread Notifications')),
+                ('communication_notifications', models.IntegerField(default=0, verbose_name='Unread Communication Notifications')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Unread Notification Counter',
+                'verbose_name_plural': 'Unread Notification Counters',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:45
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_dispatched(apps, schema_editor):
+    # Scheduled notifications created before the dispatcher were shown right away
+    Notification = apps.get_model('core', 'Notification')
+    Notification.objects.filter(scheduled_for__isnull=False).update(dispatched_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_unread_notification_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, help_text='When a scheduled notification was delivered by the dispatcher', null=True, verbose_name='Dispatched At'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('dispatched_at__isnull', True)), fields=['scheduled_for'], name='notification_due_idx'),
+        ),
+        migrations.RunPython(mark_existing_dispatched, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:49
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_notification_dispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communicationnotification',
+            name='last_occurred_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Last Occurred At'),
+        ),
+        migrations.AddField(
+            model_name='communicationnotification',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1, verbose_name='Occurrences'),
+        ),
+        migrations.AddField(
+            model_name='communicationnotification',
+            name='source_key',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Source'),
+        ),
+        migrations.AddField(
+            model_name='notificationpreference',
+            name='daily_digest',
+            field=models.BooleanField(default=False, help_text='Collect routine updates such as schedule changes into one notification a day', verbose_name='Daily digest'),
+        ),
+        migrations.AddField(
+            model_name='notificationpreference',
+            name='digest_time',
+            field=models.TimeField(default=datetime.time(8, 0), verbose_name='Digest time'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('appointment_reminder', 'Appointment Reminder'), ('appointment_cancelled', 'Appointment Cancelled'), ('appointment_confirmed', 'Appointment Confirmed'), ('lab_result_ready', 'Lab Result Ready'), ('prescription_ready', 'Prescription Ready'), ('treatment_completed', 'Treatment Completed'), ('medication_reminder', 'Medication Reminder'), ('system_maintenance', 'System Maintenance'), ('doctor_schedule_change', 'Doctor Schedule Change'), ('emergency_alert', 'Emergency Alert'), ('daily_digest', 'Daily Digest')], max_length=30, verbose_name='Notification Type'),
+        ),
+        migrations.AlterField(
+            model_name='notificationtemplate',
+            name='notification_type',
+            field=models.CharField(choices=[('appointment_reminder', 'Appointment Reminder'), ('appointment_cancelled', 'Appointment Cancelled'), ('appointment_confirmed', 'Appointment Confirmed'), ('lab_result_ready', 'Lab Result Ready'), ('prescription_ready', 'Prescription Ready'), ('treatment_completed', 'Treatment Completed'), ('medication_reminder', 'Medication Reminder'), ('system_maintenance', 'System Maintenance'), ('doctor_schedule_change', 'Doctor Schedule Change'), ('emergency_alert', 'Emergency Alert'), ('daily_digest', 'Daily Digest')], max_length=30, unique=True, verbose_name='Notification Type'),
+        ),
+        migrations.AddIndex(
+            model_name='communicationnotification',
+            index=models.Index(fields=['user', 'notification_type', 'source_key'], name='comm_notification_source_idx'),
+        ),
+    ]
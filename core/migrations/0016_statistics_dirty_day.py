@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Date')),
+                ('marked_at', models.DateTimeField(auto_now=True, verbose_name='Marked At')),
+            ],
+            options={
+                'verbose_name': 'Statistics Dirty Day',
+                'verbose_name_plural': 'Statistics Dirty Days',
+            },
+        ),
+    ]
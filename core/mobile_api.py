@@ -16,7 +16,8 @@ from appointments.models import Appointment
 from treatments.models import Treatment, Prescription
 from treatments.models_lab import LabTest
 from treatments.models_medical_history import MedicalHistory
-from core.models_notifications import Notification
+from core.models_notifications import AWAITING_DISPATCH, EMAIL_ONLY, Notification
+from core.notification_counters import unread_counts
 from core.ai_features import AIHealthInsights
 from django.contrib.auth import get_user_model
 
@@ -106,10 +107,7 @@ def mobile_dashboard(request):
                 status__in=['requested', 'in_progress']
             ).count()
             
-            unread_notifications = Notification.objects.filter(
-                recipient=user,
-                is_read=False
-            ).count()
+            unread_notifications = unread_counts(user.pk)['notifications']
             
             dashboard_data = {
                 'next_appointment': {
@@ -222,7 +220,7 @@ def mobile_notifications(request):
         user = request.user
         unread_only = request.GET.get('unread_only', 'false').lower() == 'true'
         
-        notifications = Notification.objects.filter(recipient=user)
+        notifications = Notification.objects.filter(recipient=user).exclude(AWAITING_DISPATCH | EMAIL_ONLY)
         
         if unread_only:
             notifications = notifications.filter(is_read=False)
@@ -245,7 +243,7 @@ def mobile_notifications(request):
         
         return MobileAPIResponse.success({
             'notifications': notifications_data,
-            'unread_count': Notification.objects.filter(recipient=user, is_read=False).count()
+            'unread_count': unread_counts(user.pk)['notifications']
         })
     
     except Exception as e:
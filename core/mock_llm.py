@@ -0,0 +1,143 @@
+"""
+Local Mock LLM Provider for Laso Healthcare
+Speaks the OpenAI (and OpenRouter) chat-completions, Anthropic messages and
+Hugging Face inference wire formats so AIService can be exercised without
+calling paid APIs. Point AIConfiguration.api_url at the matching endpoint,
+e.g. http://127.0.0.1:8765/v1/chat/completions
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+MOCK_REPLY = (
+    "This is a simulated response from the local mock provider. "
+    "Normal adult blood pressure is below 120/80 mmHg. Please consult a "
+    "healthcare professional for personalised medical advice."
+)
+
+
+class MockLLMSettings:
+    """
+    Behaviour of the mock provider
+    """
+
+    def __init__(self, latency=0.2, tokens_per_second=50.0, error_rate=0.0,
+                 output_tokens=40, seed=None):
+        self.latency = latency  # seconds before the first token
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate  # fraction of requests answered with 429/500
+        self.output_tokens = output_tokens
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def response_delay(self):
+        if not self.tokens_per_second:
+            return self.latency
+        return self.latency + self.output_tokens / self.tokens_per_second
+
+    def failure_status(self):
+        """
+        Return an HTTP error status for a simulated failure, or None
+        """
+        with self.lock:
+            if self.random.random() < self.error_rate:
+                return self.random.choice([429, 500])
+        return None
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """
+    Request handler dispatching on the provider endpoint path
+    """
+
+    server_version = 'LasoMockLLM/1.0'
+
+    def do_POST(self):
+        settings = self.server.mock_settings
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': {'message': 'Invalid JSON body'}})
+
+        time.sleep(settings.response_delay())
+
+        status = settings.failure_status()
+        if status:
+            return self._send_json(status, {'error': {'message': f'Simulated provider error {status}'}})
+
+        prompt_tokens = len(json.dumps(payload).split())
+        completion = ' '.join(MOCK_REPLY.split()[:settings.output_tokens]) or MOCK_REPLY
+
+        if self.path.rstrip('/').endswith('/chat/completions'):
+            body = {
+                'id': f'chatcmpl-{uuid.uuid4().hex}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload.get('model', 'mock'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': completion},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': settings.output_tokens,
+                    'total_tokens': prompt_tokens + settings.output_tokens,
+                },
+            }
+        elif self.path.rstrip('/').endswith('/messages'):
+            body = {
+                'id': f'msg_{uuid.uuid4().hex}',
+                'type': 'message',
+                'role': 'assistant',
+                'model': payload.get('model', 'mock'),
+                'content': [{'type': 'text', 'text': completion}],
+                'stop_reason': 'end_turn',
+                'usage': {
+                    'input_tokens': prompt_tokens,
+                    'output_tokens': settings.output_tokens,
+                },
+            }
+        else:
+            # Hugging Face inference API format
+            body = [{'generated_text': completion}]
+
+        self._send_json(200, body)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+
+def create_mock_server(host='127.0.0.1', port=8765, mock_settings=None):
+    """
+    Create a threaded mock provider server. Pass port=0 for a free port.
+    """
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    server.mock_settings = mock_settings or MockLLMSettings()
+    return server
+
+
+def start_mock_server_thread(host='127.0.0.1', port=0, mock_settings=None):
+    """
+    Start the mock provider in a background thread and return the server
+    """
+    server = create_mock_server(host, port, mock_settings)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
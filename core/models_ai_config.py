@@ -64,6 +64,18 @@ class AIConfiguration(models.Model):
         help_text=_('Controls randomness in responses (0.0 to 1.0)')
     )
     
+    requests_per_minute = models.PositiveIntegerField(
+        default=60,
+        verbose_name=_('Requests per Minute'),
+        help_text=_('Maximum provider requests per minute across all workers (0 = unlimited)')
+    )
+    
+    max_concurrent_requests = models.PositiveIntegerField(
+        default=5,
+        verbose_name=_('Max Concurrent Requests'),
+        help_text=_('Maximum simultaneous provider requests across all workers (0 = unlimited)')
+    )
+    
     is_active = models.BooleanField(
         default=True,
         verbose_name=_('Is Active'),
@@ -46,11 +46,30 @@ class CommunicationNotification(models.Model):
         auto_now_add=True,
         verbose_name=_('Created Date')
     )
+    # Coalescing: repeats from the same source within the window update this row
+    source_key = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name=_('Source')
+    )
+    occurrences = models.PositiveIntegerField(
+        default=1,
+        verbose_name=_('Occurrences')
+    )
+    last_occurred_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Last Occurred At')
+    )
     
     class Meta:
         verbose_name = _('Communication Notification')
         verbose_name_plural = _('Communication Notifications')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'notification_type', 'source_key'], name='comm_notification_source_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.title}"
@@ -7,7 +7,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
@@ -24,6 +24,14 @@ class NotificationType(models.TextChoices):
     SYSTEM_MAINTENANCE = 'system_maintenance', _('System Maintenance')
     DOCTOR_SCHEDULE_CHANGE = 'doctor_schedule_change', _('Doctor Schedule Change')
     EMERGENCY_ALERT = 'emergency_alert', _('Emergency Alert')
+    DAILY_DIGEST = 'daily_digest', _('Daily Digest')
+
+
+# Notifications the dispatcher has not delivered yet
+AWAITING_DISPATCH = models.Q(scheduled_for__isnull=False, dispatched_at__isnull=True)
+
+# Rows that only carry an email and its delivery logs (core.mailer); never shown in-app
+EMAIL_ONLY = models.Q(extra_data__has_key='email_only')
 
 
 class NotificationPriority(models.TextChoices):
@@ -124,6 +132,13 @@ class Notification(models.Model):
         verbose_name=_('Scheduled For')
     )
     
+    dispatched_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Dispatched At'),
+        help_text=_('When a scheduled notification was delivered by the dispatcher')
+    )
+    
     # Extra data (in JSON format)
     extra_data = models.JSONField(
         default=dict,
@@ -139,11 +154,18 @@ class Notification(models.Model):
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['notification_type']),
             models.Index(fields=['scheduled_for']),
+            models.Index(fields=['scheduled_for'], condition=models.Q(dispatched_at__isnull=True),
+                         name='notification_due_idx'),
         ]
     
     def __str__(self):
         return f"{self.recipient} - {self.title}"
     
+    @property
+    def awaiting_dispatch(self):
+        """Scheduled and not delivered yet, so not shown to the recipient"""
+        return self.scheduled_for is not None and self.dispatched_at is None
+    
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
@@ -173,7 +195,8 @@ class Notification(models.Model):
             'medication_reminder': 'clock',
             'system_maintenance': 'tools',
             'doctor_schedule_change': 'user-md',
-            'emergency_alert': 'exclamation-triangle'
+            'emergency_alert': 'exclamation-triangle',
+            'daily_digest': 'inbox'
         }
         return icons.get(self.notification_type, 'bell')
 
@@ -244,6 +267,18 @@ class NotificationPreference(models.Model):
         help_text=_('In format: ["08:00", "12:00", "18:00"]')
     )
     
+    # Digest
+    daily_digest = models.BooleanField(
+        default=False,
+        verbose_name=_('Daily digest'),
+        help_text=_('Collect routine updates such as schedule changes into one notification a day')
+    )
+    
+    digest_time = models.TimeField(
+        default=time(8, 0),
+        verbose_name=_('Digest time')
+    )
+    
     class Meta:
         verbose_name = _('Notification Preference')
         verbose_name_plural = _('Notification Preferences')
@@ -252,6 +287,42 @@ class NotificationPreference(models.Model):
         return f"{self.user} - Notification Preferences"
 
 
+class UnreadNotificationCounter(models.Model):
+    """
+    Denormalized per-user unread counts, kept in step with Notification and
+    CommunicationNotification by core.notification_counters
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='unread_notification_counter',
+        verbose_name=_('User')
+    )
+    
+    notifications = models.IntegerField(
+        default=0,
+        verbose_name=_('Unread Notifications')
+    )
+    
+    communication_notifications = models.IntegerField(
+        default=0,
+        verbose_name=_('Unread Communication Notifications')
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Updated At')
+    )
+    
+    class Meta:
+        verbose_name = _('Unread Notification Counter')
+        verbose_name_plural = _('Unread Notification Counters')
+    
+    def __str__(self):
+        return f"{self.user} - {self.notifications}/{self.communication_notifications}"
+
+
 class NotificationTemplate(models.Model):
     """
     Notification templates
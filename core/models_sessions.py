@@ -108,4 +108,38 @@ class LoginSession(models.Model):
         """Mark session as ended"""
         self.logout_time = timezone.now()
         self.is_active = False
-        self.save(update_fields=['logout_time', 'is_active', 'updated_at'])
\ No newline at end of file
+        self.save(update_fields=['logout_time', 'is_active', 'updated_at'])
+
+class DailyActiveUsers(models.Model):
+    """
+    One row per day with the set of users who logged in, stored as a
+    bitmap (bit n set when user id n was active). Unions over week and
+    month windows are a bitwise OR of the daily rows.
+    """
+    date = models.DateField(
+        unique=True,
+        verbose_name=_('Date')
+    )
+    
+    user_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Active Users')
+    )
+    
+    user_bitmap = models.BinaryField(
+        default=bytes,
+        verbose_name=_('Active User Bitmap')
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Updated At')
+    )
+    
+    class Meta:
+        verbose_name = _('Daily Active Users')
+        verbose_name_plural = _('Daily Active Users')
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.date}: {self.user_count}"
@@ -39,6 +39,20 @@ class SystemStatistics(models.Model):
         default=0,
         verbose_name=_('Daily Active Users')
     )
+    monthly_active_users = models.IntegerField(
+        default=0,
+        verbose_name=_('Monthly Active Users'),
+        help_text=_('Distinct users who logged in during the 30 days ending on this date.')
+    )
+    new_users = models.IntegerField(
+        default=0,
+        verbose_name=_('New Users')
+    )
+    new_appointments = models.IntegerField(
+        default=0,
+        verbose_name=_('New Appointments'),
+        help_text=_('Appointments booked on this date, whatever date they are scheduled for.')
+    )
     data_json = models.JSONField(
         default=dict,
         verbose_name=_('Extra Data (JSON)'),
@@ -175,6 +189,62 @@ class DoctorPerformanceMetric(models.Model):
     def __str__(self):
         return f"{self.doctor} - {self.date}"
 
+class StatisticsRollup(models.Model):
+    """
+    High-water mark of a statistics rollup job. Each run only processes
+    days touched since the previous successful run.
+    """
+    job = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name=_('Job')
+    )
+    high_water_mark = models.DateTimeField(
+        verbose_name=_('High-Water Mark'),
+        help_text=_('Start time of the last successful run.')
+    )
+    days_processed = models.IntegerField(
+        default=0,
+        verbose_name=_('Days Processed (last run)')
+    )
+    duration = models.FloatField(
+        default=0.0,
+        verbose_name=_('Duration (seconds, last run)')
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Updated At')
+    )
+    
+    class Meta:
+        verbose_name = _('Statistics Rollup')
+        verbose_name_plural = _('Statistics Rollups')
+    
+    def __str__(self):
+        return f"{self.job} @ {self.high_water_mark}"
+
+class StatisticsDirtyDay(models.Model):
+    """
+    A day whose rollup rows must be recomputed although no row dated that
+    day changed since the last run: an appointment moved away from it, or
+    activity on it was deleted.
+    """
+    date = models.DateField(
+        unique=True,
+        verbose_name=_('Date')
+    )
+    marked_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Marked At')
+    )
+    
+    class Meta:
+        verbose_name = _('Statistics Dirty Day')
+        verbose_name_plural = _('Statistics Dirty Days')
+    
+    def __str__(self):
+        return str(self.date)
+
 class ReportTemplate(models.Model):
     """
     Report template model. Used to create custom reports.
@@ -233,14 +303,64 @@ class ReportTemplate(models.Model):
 
 class GeneratedReport(models.Model):
     """
-    Generated report model. Represents reports generated using ReportTemplate.
+    Generated report model. Represents reports generated using ReportTemplate
+    or one of the built-in exports of core.reports, written in the background.
     """
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('running', _('Running')),
+        ('completed', _('Completed')),
+        ('failed', _('Failed')),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('xlsx', _('Excel')),
+        ('csv', _('CSV')),
+    ]
+    
     template = models.ForeignKey(
         ReportTemplate,
         on_delete=models.CASCADE,
+        null=True,
+        blank=True,
         related_name='generated_reports',
         verbose_name=_('Report Template')
     )
+    report_type = models.CharField(
+        max_length=30,
+        blank=True,
+        verbose_name=_('Report Type'),
+        help_text=_('Built-in report generated when no template is set.')
+    )
+    file_format = models.CharField(
+        max_length=10,
+        choices=FORMAT_CHOICES,
+        default='xlsx',
+        verbose_name=_('File Format')
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name=_('Status')
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Progress (%)')
+    )
+    row_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Rows Written')
+    )
+    error_message = models.TextField(
+        blank=True,
+        verbose_name=_('Error Message')
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Completion Date')
+    )
     name = models.CharField(
         max_length=100,
         verbose_name=_('Report Name')
@@ -0,0 +1,152 @@
+"""
+Notification Coalescing for Laso Healthcare
+Repeated notifications from one source, such as a doctor editing several
+availability slots in a row, update the recipient's existing unread row
+(with an occurrence count) instead of adding a row per change. Users who
+chose the daily digest get such updates collected into one scheduled
+notification a day, delivered by the notification dispatcher.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import notification_counters, notification_push
+from .mailer import mark_email_only
+from .models_communication import CommunicationNotification
+from .models_notifications import (
+    AWAITING_DISPATCH, Notification, NotificationPreference, NotificationType,
+)
+from .notification_dispatcher import next_occurrence
+from .notification_fanout import bulk_notify, render_template
+
+
+DIGEST_SOURCE = 'daily_digest'
+
+
+def _setting(name, default):
+    return getattr(settings, 'NOTIFICATION_SETTINGS', {}).get(name, default)
+
+
+def render_digest(items):
+    """Digest message: one line per source, with its number of updates"""
+    lines = []
+    for item in items:
+        suffix = f" ({item['count']} updates)" if item['count'] > 1 else ''
+        lines.append(f"- {item['title']}{suffix}: {item['message']}")
+    return '\n'.join(lines)
+
+
+def add_to_digest(digest_times, values, source_key, now=None):
+    """
+    Record an update in the pending daily digest of each user in
+    ``digest_times`` ({user_id: digest time}), creating digests as needed
+    """
+    if not digest_times:
+        return
+    now = now or timezone.now()
+    with transaction.atomic():
+        pending = {
+            digest.recipient_id: digest
+            for digest in Notification.objects.select_for_update().filter(
+                AWAITING_DISPATCH,
+                recipient_id__in=list(digest_times),
+                notification_type=NotificationType.DAILY_DIGEST,
+            )
+        }
+        created = []
+        for user_id, digest_time in digest_times.items():
+            digest = pending.get(user_id)
+            if digest is None:
+                digest = Notification(
+                    recipient_id=user_id,
+                    notification_type=NotificationType.DAILY_DIGEST,
+                    title='Your daily digest',
+                    scheduled_for=next_occurrence(digest_time, now),
+                    extra_data={'items': [], 'channels': ['web', 'email']},
+                )
+                created.append(digest)
+            items = digest.extra_data.setdefault('items', [])
+            item = next((item for item in items if item['source'] == source_key), None)
+            if item is None:
+                items.append({'source': source_key, 'title': values['title'], 'message': values['message'],
+                              'url': values.get('related_url') or '', 'count': 1})
+            else:
+                item.update(title=values['title'], message=values['message'],
+                            url=values.get('related_url') or '', count=item['count'] + 1)
+            digest.message = render_digest(items)
+        Notification.objects.bulk_update(list(pending.values()), ['message', 'extra_data'])
+        bulk_notify(created)
+
+
+def publish_digests(digests):
+    """
+    Deliver due digests (called by the dispatcher): the web notification
+    list shows CommunicationNotification rows, so each digest is copied into
+    one, and the digest row itself is kept only to carry the email
+    """
+    if not digests:
+        return
+    mark_email_only(digests)
+    Notification.objects.bulk_update(digests, ['is_read', 'extra_data'])
+    bulk_notify(
+        CommunicationNotification(user_id=digest.recipient_id, notification_type='system',
+                                  source_key=DIGEST_SOURCE, title=digest.title, message=digest.message)
+        for digest in digests
+    )
+
+
+def notify_coalesced(recipients, template, source_key, context=None, window=None, **fields):
+    """
+    fan_out() for CommunicationNotification that merges repeats.
+
+    A recipient with an unread notification of the same type and
+    ``source_key`` updated within ``window`` seconds (COALESCE_WINDOW) gets
+    that row updated and its ``occurrences`` incremented; digest users get
+    the update added to their pending daily digest; everyone else gets a
+    new row. Returns (created, merged, digested) counts.
+    """
+    now = timezone.now()
+    values = dict(render_template(template, context), **fields)
+    window = _setting('COALESCE_WINDOW', 900) if window is None else window
+
+    recipient_ids = set(recipients.order_by().values_list('pk', flat=True).distinct())
+    if not recipient_ids:
+        return 0, 0, 0
+    digest_times = dict(NotificationPreference.objects.filter(
+        user_id__in=recipient_ids, daily_digest=True
+    ).values_list('user_id', 'digest_time'))
+    immediate = recipient_ids - set(digest_times)
+
+    with transaction.atomic():
+        merged_users = set()
+        if window and immediate:
+            # Lock the rows so one read in between cannot lose the update
+            rows = list(CommunicationNotification.objects.select_for_update().filter(
+                user_id__in=immediate,
+                notification_type=values['notification_type'],
+                source_key=source_key,
+                is_read=False,
+                last_occurred_at__gte=now - timedelta(seconds=window),
+            ).values_list('pk', 'user_id'))
+            if rows:
+                CommunicationNotification.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+                    occurrences=F('occurrences') + 1,
+                    last_occurred_at=now,
+                    **{field: values[field] for field in ('title', 'message', 'related_url') if field in values}
+                )
+                merged_users = {user_id for _, user_id in rows}
+                notification_counters.forget_many(merged_users, recent=True)
+                # Clients replace the pushed row by its id
+                notification_push.push_batch(
+                    CommunicationNotification.objects.filter(pk__in=[pk for pk, _ in rows])
+                )
+
+        created = bulk_notify(
+            CommunicationNotification(user_id=user_id, source_key=source_key, last_occurred_at=now, **values)
+            for user_id in immediate - merged_users
+        )
+        add_to_digest(digest_times, values, source_key, now)
+    return len(created), len(merged_users), len(digest_times)
@@ -0,0 +1,166 @@
+"""
+Unread Notification Counters for Laso Healthcare
+Per-user unread counts kept in UnreadNotificationCounter with F() updates
+when notifications are created, read or deleted, plus a cached list of each
+user's five most recent communication notifications. Both are read from the
+cache on every page render.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_init, post_save
+
+from . import notification_push
+from .models_communication import CommunicationNotification
+from .models_notifications import AWAITING_DISPATCH, Notification, UnreadNotificationCounter
+
+# model -> (counter field, recipient field)
+COUNTED_MODELS = {
+    Notification: ('notifications', 'recipient_id'),
+    CommunicationNotification: ('communication_notifications', 'user_id'),
+}
+
+RECENT_LIMIT = 5
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATION_SETTINGS', {}).get('COUNTER_CACHE_TIMEOUT', 3600)
+
+
+def _counts_key(user_id):
+    return f'notification_counts:{user_id}'
+
+
+def _recent_key(user_id):
+    return f'notification_recent:{user_id}'
+
+
+def forget(user_id, recent=False):
+    """Drop the cached counts (and optionally the recent list) after commit"""
+    keys = [_counts_key(user_id)] + ([_recent_key(user_id)] if recent else [])
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget_many(user_ids, recent=False):
+    """forget() for many users with a single cache call"""
+    keys = [_counts_key(user_id) for user_id in user_ids]
+    if recent:
+        keys += [_recent_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def recount(user_id):
+    """Rebuild a user's counters from the notification tables"""
+    counts = {}
+    for model, (field, recipient) in COUNTED_MODELS.items():
+        unread = model.objects.filter(**{recipient: user_id, 'is_read': False})
+        if model is Notification:
+            unread = unread.exclude(AWAITING_DISPATCH)
+        counts[field] = unread.count()
+    UnreadNotificationCounter.objects.update_or_create(user_id=user_id, defaults=counts)
+    forget(user_id)
+    return counts
+
+
+def unread_counts(user_id):
+    """{'notifications': n, 'communication_notifications': n} for a user"""
+    counts = cache.get(_counts_key(user_id))
+    if counts is None:
+        counts = UnreadNotificationCounter.objects.filter(user_id=user_id).values(
+            'notifications', 'communication_notifications'
+        ).first()
+        if counts is None:
+            # First use: seed the row from the tables
+            counts = recount(user_id)
+        cache.set(_counts_key(user_id), counts, timeout=_timeout())
+    return counts
+
+
+def adjust(user_id, field, delta):
+    """
+    Atomically add ``delta`` to a counter. Users without a row yet are
+    skipped: their first read counts the tables, this change included.
+    Call this after queryset.update()/bulk_create(), which send no signals.
+    """
+    if not user_id or not delta:
+        return
+    UnreadNotificationCounter.objects.filter(user_id=user_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+    forget(user_id, recent=field == 'communication_notifications')
+    notification_push.push_unread_delta(user_id, field, delta)
+
+
+def adjust_many(deltas, field):
+    """
+    adjust() for many users at once, e.g. after a bulk fan-out: one UPDATE
+    per distinct delta instead of one per user. Nothing is pushed; the
+    caller sends the deltas along with the rows (notification_push.push_batch).
+    """
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        if user_id and delta:
+            by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        UnreadNotificationCounter.objects.filter(user_id__in=user_ids).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+    forget_many([user_id for user_ids in by_delta.values() for user_id in user_ids],
+                recent=field == 'communication_notifications')
+
+
+def recent_notifications(user_id):
+    """The user's five most recent communication notifications"""
+    recent = cache.get(_recent_key(user_id))
+    if recent is None:
+        recent = list(CommunicationNotification.objects.filter(
+            user_id=user_id
+        ).order_by('-created_at')[:RECENT_LIMIT])
+        cache.set(_recent_key(user_id), recent, timeout=_timeout())
+    return recent
+
+
+def _remember_read_state(sender, instance, **kwargs):
+    # __dict__ rather than the attribute: a deferred field must not cost a query
+    instance._loaded_is_read = instance.__dict__.get('is_read')
+
+
+def _notification_saved(sender, instance, created, update_fields=None, **kwargs):
+    field, recipient = COUNTED_MODELS[sender]
+    user_id = getattr(instance, recipient)
+    if created:
+        # Scheduled notifications are counted when the dispatcher delivers them
+        delta = 0 if instance.is_read or getattr(instance, 'awaiting_dispatch', False) else 1
+    elif update_fields is not None and 'is_read' not in update_fields:
+        delta = 0
+    elif instance._loaded_is_read is None:
+        # Loaded without is_read: the previous state is unknown, recount on next read
+        UnreadNotificationCounter.objects.filter(user_id=user_id).delete()
+        forget(user_id)
+        delta = 0
+    else:
+        delta = int(instance._loaded_is_read) - int(instance.is_read)
+    instance._loaded_is_read = instance.is_read
+    adjust(user_id, field, delta)
+    if sender is CommunicationNotification and not delta:
+        forget(user_id, recent=True)
+
+
+def _notification_deleted(sender, instance, **kwargs):
+    field, recipient = COUNTED_MODELS[sender]
+    user_id = getattr(instance, recipient)
+    adjust(user_id, field, 0 if instance.is_read or getattr(instance, 'awaiting_dispatch', False) else -1)
+    if sender is CommunicationNotification:
+        forget(user_id, recent=True)
+
+
+for _model in COUNTED_MODELS:
+    post_init.connect(_remember_read_state, sender=_model,
+                      dispatch_uid=f'notification_counters_init_{_model.__name__}')
+    post_save.connect(_notification_saved, sender=_model,
+                      dispatch_uid=f'notification_counters_saved_{_model.__name__}')
+    post_delete.connect(_notification_deleted, sender=_model,
+                        dispatch_uid=f'notification_counters_deleted_{_model.__name__}')
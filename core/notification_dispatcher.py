@@ -0,0 +1,180 @@
+"""
+Scheduled Notification Dispatcher for Laso Healthcare
+Notifications with ``scheduled_for`` stay hidden until they are due. The
+dispatcher claims due rows in batches with SELECT ... FOR UPDATE SKIP
+LOCKED, so any number of workers can run side by side without delivering a
+row twice, marks them dispatched and delivers them through their channels.
+Recurring medication reminders are scheduled from NotificationPreference
+and each delivery schedules the next day's occurrence.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .mailer import queue_emails, send_queued
+from .models_notifications import (
+    AWAITING_DISPATCH, Notification, NotificationPreference, NotificationPriority, NotificationType,
+)
+from .notification_fanout import bulk_notify, record_delivery
+
+logger = logging.getLogger(__name__)
+
+MEDICATION_SCHEDULE = 'medication'
+
+
+def _setting(name, default):
+    return getattr(settings, 'NOTIFICATION_SETTINGS', {}).get(name, default)
+
+
+def delivery_channels(notification):
+    """
+    Channels a notification goes out on: extra_data['channels'] or just the
+    web, limited to the channels enabled in NOTIFICATION_SETTINGS
+    """
+    channels = set((notification.extra_data or {}).get('channels') or ['web'])
+    channels.add('web')
+    if not _setting('EMAIL_NOTIFICATIONS', True):
+        channels.discard('email')
+    # SMS has no delivery service yet; such notifications still reach the web
+    channels.discard('sms')
+    return channels
+
+
+def claim_due(batch_size=None, now=None):
+    """
+    Claim, mark and deliver one batch of due notifications; returns the
+    delivered rows. Rows locked by another worker are skipped, not waited on.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            Notification.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('recipient')
+            .filter(AWAITING_DISPATCH, scheduled_for__lte=now)
+            .order_by('scheduled_for')[:batch_size or _setting('DISPATCH_BATCH_SIZE', 200)]
+        )
+        if not due:
+            return []
+        Notification.objects.filter(pk__in=[notification.pk for notification in due]).update(dispatched_at=now)
+        for notification in due:
+            notification.dispatched_at = now
+
+        # Digests reach the web as CommunicationNotification rows
+        from .notification_coalescing import publish_digests
+        digests = [n for n in due if n.notification_type == NotificationType.DAILY_DIGEST]
+        publish_digests(digests)
+        record_delivery([n for n in due if n.notification_type != NotificationType.DAILY_DIGEST])
+        email_log_ids = queue_emails([n for n in due if 'email' in delivery_channels(n)])
+        schedule_next_medication_reminders(due, now)
+
+    if email_log_ids:
+        send_queued(email_log_ids)
+    return due
+
+
+def dispatch_due(batch_size=None, max_batches=None):
+    """Deliver everything that is due, batch by batch; returns the count"""
+    delivered = batches = 0
+    while max_batches is None or batches < max_batches:
+        claimed = claim_due(batch_size)
+        if not claimed:
+            break
+        delivered += len(claimed)
+        batches += 1
+    if delivered:
+        logger.info("Dispatched %d scheduled notifications", delivered)
+    return delivered
+
+
+def _parse_time(value):
+    try:
+        return datetime.strptime(value.strip(), '%H:%M').time()
+    except (AttributeError, ValueError):
+        return None
+
+
+def next_occurrence(at, after):
+    """First moment at local time ``at`` strictly after ``after``"""
+    local = timezone.localtime(after)
+    candidate = timezone.make_aware(datetime.combine(local.date(), at))
+    if candidate <= after:
+        candidate = timezone.make_aware(datetime.combine(local.date() + timedelta(days=1), at))
+    return candidate
+
+
+def _medication_reminder(user_id, reminder_time, scheduled_for):
+    return Notification(
+        recipient_id=user_id,
+        notification_type=NotificationType.MEDICATION_REMINDER,
+        priority=NotificationPriority.NORMAL,
+        title='Medication Reminder',
+        message=f"It's {reminder_time}: time to take your medication.",
+        scheduled_for=scheduled_for,
+        extra_data={'schedule': MEDICATION_SCHEDULE, 'reminder_time': reminder_time},
+    )
+
+
+def _reminder_times(preference):
+    if not preference.medication_reminder_enabled:
+        return []
+    times = []
+    for value in preference.medication_reminder_times or []:
+        parsed = _parse_time(value)
+        if parsed is not None:
+            times.append((parsed.strftime('%H:%M'), parsed))
+    return sorted(set(times))
+
+
+def schedule_medication_reminders(preference, now=None):
+    """Replace a user's pending medication reminders with the next occurrence of each time"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        Notification.objects.filter(
+            AWAITING_DISPATCH,
+            recipient_id=preference.user_id,
+            notification_type=NotificationType.MEDICATION_REMINDER,
+            extra_data__schedule=MEDICATION_SCHEDULE,
+        ).delete()
+        bulk_notify([
+            _medication_reminder(preference.user_id, label, next_occurrence(at, now))
+            for label, at in _reminder_times(preference)
+        ])
+
+
+def schedule_next_medication_reminders(delivered, now):
+    """Schedule tomorrow's occurrence of each delivered medication reminder still configured"""
+    recurring = [
+        n for n in delivered
+        if n.notification_type == NotificationType.MEDICATION_REMINDER
+        and (n.extra_data or {}).get('schedule') == MEDICATION_SCHEDULE
+    ]
+    if not recurring:
+        return
+    preferences = {
+        preference.user_id: preference
+        for preference in NotificationPreference.objects.filter(
+            user_id__in={n.recipient_id for n in recurring}
+        )
+    }
+    upcoming = []
+    for notification in recurring:
+        preference = preferences.get(notification.recipient_id)
+        configured = dict(_reminder_times(preference)) if preference else {}
+        label = notification.extra_data.get('reminder_time')
+        if label in configured:
+            # The next slot after now: a late dispatch does not replay missed days
+            upcoming.append(_medication_reminder(notification.recipient_id, label,
+                                                 next_occurrence(configured[label], now)))
+    bulk_notify(upcoming)
+
+
+def _preference_saved(sender, instance, **kwargs):
+    schedule_medication_reminders(instance)
+
+
+post_save.connect(_preference_saved, sender=NotificationPreference,
+                  dispatch_uid='notification_dispatcher_preference_saved')
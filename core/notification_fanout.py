@@ -0,0 +1,110 @@
+"""
+Notification Fan-Out for Laso Healthcare
+Sends one notification to many recipients without a query per recipient:
+the recipient ids come from a single values_list, the rows are built in
+memory and inserted with bulk_create in chunks, together with their web
+NotificationLog rows and one unread-counter update per chunk.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.template import Context, Template
+from django.utils import timezone
+
+from . import notification_counters, notification_push
+from .models_communication import CommunicationNotification
+from .models_notifications import Notification, NotificationLog, NotificationTemplate
+
+
+def _chunk_size():
+    return getattr(settings, 'NOTIFICATION_SETTINGS', {}).get('FANOUT_CHUNK_SIZE', 500)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def render_template(template, context=None):
+    """
+    Field values of a fan-out template: a dict is used as-is, a
+    NotificationTemplate is rendered once against ``context``
+    """
+    if isinstance(template, NotificationTemplate):
+        context = Context(context or {})
+        return {
+            'notification_type': template.notification_type,
+            'title': Template(template.title_template).render(context).strip(),
+            'message': Template(template.message_template).render(context).strip(),
+        }
+    return dict(template)
+
+
+def record_delivery(notifications, delivery_method='web'):
+    """
+    Delivery bookkeeping for saved notifications of one model that bypassed
+    save() signals: a sent NotificationLog per Notification, unread counters
+    bumped in bulk, and one real-time push per recipient after commit
+    """
+    notifications = [n for n in notifications if not getattr(n, 'awaiting_dispatch', False)]
+    if not notifications:
+        return
+    model = type(notifications[0])
+    counter_field, recipient_field = notification_counters.COUNTED_MODELS[model]
+    if model is Notification:
+        now = timezone.now()
+        NotificationLog.objects.bulk_create([
+            NotificationLog(notification=notification, delivery_method=delivery_method,
+                            status='sent', sent_at=now)
+            for notification in notifications
+        ])
+    unread = {}
+    for notification in notifications:
+        if not notification.is_read:
+            user_id = getattr(notification, recipient_field)
+            unread[user_id] = unread.get(user_id, 0) + 1
+    notification_counters.adjust_many(unread, counter_field)
+    notification_push.push_batch(notifications, counter_field, unread)
+
+
+def bulk_notify(notifications, chunk_size=None, delivery_method='web'):
+    """
+    Insert unsaved Notification or CommunicationNotification instances of one
+    model in chunks, then record their delivery (see record_delivery()).
+    Scheduled notifications are left to the dispatcher until they are due.
+    Returns the created instances.
+    """
+    notifications = list(notifications)
+    if not notifications:
+        return []
+    model = type(notifications[0])
+    chunk_size = chunk_size or _chunk_size()
+
+    with transaction.atomic():
+        for chunk in _chunks(notifications, chunk_size):
+            record_delivery(model.objects.bulk_create(chunk), delivery_method)
+    return notifications
+
+
+def fan_out(recipients, template, context=None, model=Notification, chunk_size=None,
+            delivery_method='web', **fields):
+    """
+    Send the same notification to every user of the ``recipients`` queryset.
+
+    ``template`` is a dict of field values (title, message, notification_type,
+    ...) or a NotificationTemplate; extra keyword arguments are set on every
+    row. Returns the number of notifications created.
+    """
+    values = dict(render_template(template, context), **fields)
+    recipient_field = notification_counters.COUNTED_MODELS[model][1]
+    recipient_ids = list(recipients.order_by().values_list('pk', flat=True).distinct())
+    return len(bulk_notify(
+        (model(**{recipient_field: recipient_id}, **values) for recipient_id in recipient_ids),
+        chunk_size=chunk_size,
+        delivery_method=delivery_method,
+    ))
+
+
+def fan_out_communication(recipients, template, context=None, chunk_size=None, **fields):
+    """fan_out() for CommunicationNotification rows"""
+    return fan_out(recipients, template, context=context, model=CommunicationNotification,
+                   chunk_size=chunk_size, **fields)
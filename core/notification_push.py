@@ -0,0 +1,179 @@
+"""
+Real-Time Notification Push for Laso Healthcare
+New Notification and CommunicationNotification rows, and every change to a
+user's unread counts, are pushed after commit to the user's
+``notifications_<user_id>`` channel group, where NotificationConsumer
+forwards them to the open browser tabs and mobile clients. Rows inserted in
+bulk go out as one event per recipient per chunk.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, F, IntegerField, Value
+from django.db.models.signals import post_save
+
+from .models_communication import CommunicationNotification
+from .models_notifications import AWAITING_DISPATCH, EMAIL_ONLY, Notification
+
+logger = logging.getLogger(__name__)
+
+# Kind of each pushed model, as sent to clients and used in resume ids
+KINDS = {
+    Notification: 'notification',
+    CommunicationNotification: 'communication',
+}
+
+RESUME_FIELDS = ('id', 'kind', 'title', 'message', 'type', 'priority', 'url', 'occurrences', 'is_read', 'created_at')
+
+
+def _setting(name, default):
+    return getattr(settings, 'NOTIFICATION_SETTINGS', {}).get(name, default)
+
+
+def group_name(user_id):
+    return f'notifications_{user_id}'
+
+
+def serialize(notification):
+    """Client payload of one Notification or CommunicationNotification"""
+    is_notification = isinstance(notification, Notification)
+    return {
+        'id': notification.id,
+        'kind': KINDS[type(notification)],
+        'title': notification.title,
+        'message': notification.message,
+        'type': notification.notification_type,
+        'priority': notification.priority if is_notification else '',
+        'url': '' if is_notification else (notification.related_url or ''),
+        'occurrences': 1 if is_notification else notification.occurrences,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def _recipient_id(notification):
+    return notification.recipient_id if type(notification) is Notification else notification.user_id
+
+
+def _send_many(events):
+    """
+    group_send each (user_id, event) pair from one event-loop pass, so a
+    bulk insert costs a single async_to_sync hop instead of one per recipient
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    async def send_all():
+        for user_id, event in events:
+            try:
+                await channel_layer.group_send(group_name(user_id), event)
+            except Exception as e:
+                # Clients catch up through the resume handshake; a push must never fail a write
+                logger.warning("Could not push %s to user %s: %s", event['type'], user_id, e)
+
+    async_to_sync(send_all)()
+
+
+def _send(user_id, event):
+    _send_many([(user_id, event)])
+
+
+def _send_on_commit(user_id, event):
+    if not user_id or not _setting('REAL_TIME_NOTIFICATIONS', True):
+        return
+    transaction.on_commit(lambda: _send(user_id, event))
+
+
+def push_notifications(notifications):
+    """Push newly created notifications to their recipients after commit"""
+    for notification in notifications:
+        if getattr(notification, 'awaiting_dispatch', False):
+            # Pushed by the dispatcher once it is due
+            continue
+        _send_on_commit(_recipient_id(notification), {'type': 'notification.new', 'notification': serialize(notification)})
+
+
+def push_batch(notifications, field=None, deltas=None):
+    """
+    Push notifications created or updated in bulk after commit: one
+    'notification.batch' event per recipient, carrying all of their rows and
+    the change of their ``field`` unread counter (``deltas``: {user_id: delta})
+    """
+    if not _setting('REAL_TIME_NOTIFICATIONS', True):
+        return
+    deltas = {user_id: delta for user_id, delta in (deltas or {}).items() if delta}
+    rows = {}
+    for notification in notifications:
+        if not getattr(notification, 'awaiting_dispatch', False):
+            rows.setdefault(_recipient_id(notification), []).append(serialize(notification))
+    events = [
+        (user_id, {'type': 'notification.batch', 'notifications': rows.get(user_id, []),
+                   'field': field, 'delta': deltas.get(user_id, 0)})
+        for user_id in set(rows) | set(deltas) if user_id
+    ]
+    if events:
+        transaction.on_commit(lambda: _send_many(events))
+
+
+def push_unread_delta(user_id, field, delta):
+    """Push a change of one unread counter ('notifications' or 'communication_notifications')"""
+    if delta:
+        _send_on_commit(user_id, {'type': 'notification.unread', 'field': field, 'delta': delta})
+
+
+def _resume_values(model, user_id, after_id):
+    """values() of one model in the shared column order, for the UNION"""
+    is_notification = model is Notification
+    blank = Value('', output_field=CharField())
+    recipient = 'recipient_id' if is_notification else 'user_id'
+    queryset = model.objects.filter(**{recipient: user_id, 'id__gt': after_id})
+    if is_notification:
+        queryset = queryset.exclude(AWAITING_DISPATCH | EMAIL_ONLY)
+    return queryset.values(
+        # Only annotations, so both sides of the UNION select the same columns in the same order
+        n_id=F('id'),
+        n_kind=Value(KINDS[model], output_field=CharField()),
+        n_title=F('title'),
+        n_message=F('message'),
+        n_type=F('notification_type'),
+        n_priority=F('priority') if is_notification else blank,
+        n_url=blank if is_notification else F('related_url'),
+        n_occurrences=Value(1, output_field=IntegerField()) if is_notification else F('occurrences'),
+        n_is_read=F('is_read'),
+        n_created_at=F('created_at'),
+    ).order_by()
+
+
+def missed_notifications(user_id, last_notification_id=0, last_communication_id=0, limit=None):
+    """
+    Notifications of both kinds created after the given ids, oldest first,
+    fetched with a single UNION query
+    """
+    limit = limit or _setting('RESUME_LIMIT', 100)
+    query = _resume_values(Notification, user_id, last_notification_id or 0).union(
+        _resume_values(CommunicationNotification, user_id, last_communication_id or 0),
+        all=True,
+    ).order_by('-n_created_at')[:limit]
+    rows = []
+    for row in query:
+        item = {field: row[f'n_{field}'] for field in RESUME_FIELDS}
+        item['created_at'] = item['created_at'].isoformat() if item['created_at'] else None
+        item['url'] = item['url'] or ''
+        rows.append(item)
+    # Newest were kept when over the limit; deliver them in creation order
+    rows.reverse()
+    return rows
+
+
+def _notification_created(sender, instance, created, **kwargs):
+    if created:
+        push_notifications([instance])
+
+
+for _model in KINDS:
+    post_save.connect(_notification_created, sender=_model,
+                      dispatch_uid=f'notification_push_created_{_model.__name__}')
@@ -0,0 +1,207 @@
+"""
+Background Report Exports for Laso Healthcare
+Reports are requested from the web tier and written by a Celery worker (or
+``manage.py generate_reports`` where there is no broker) row by row
+(openpyxl write-only workbooks or CSV) into GeneratedReport files
+"""
+import csv
+import io
+import logging
+import tempfile
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .analytics import ReportGenerator
+from .db_router import use_replica
+from .models_statistics import GeneratedReport
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _setting(name, default):
+    return getattr(settings, 'ANALYTICS_SETTINGS', {}).get(name, default)
+
+
+def _period(parameters):
+    end = date.fromisoformat(parameters['end']) if parameters.get('end') else timezone.localdate()
+    start = date.fromisoformat(parameters['start']) if parameters.get('start') else end - timedelta(days=30)
+    return start, end
+
+
+def _doctor_summary(parameters):
+    doctor = User.objects.get(pk=parameters['doctor_id'], user_type='doctor')
+    return ReportGenerator.doctor_summary_rows(doctor, *_period(parameters))
+
+
+def _patient_health_summary(parameters):
+    patient = User.objects.get(pk=parameters['patient_id'], user_type='patient')
+    return ReportGenerator.patient_health_rows(patient)
+
+
+def _system_statistics(parameters):
+    return ReportGenerator.system_statistics_rows(*_period(parameters))
+
+
+# report_type -> (sheet title, function(parameters) -> (columns, values_list queryset))
+REPORT_TYPES = {
+    'doctor_summary': ('Doctor Summary', _doctor_summary),
+    'patient_health_summary': ('Patient Health Summary', _patient_health_summary),
+    'system_statistics': ('System Statistics', _system_statistics),
+}
+
+
+def _write_xlsx(handle, title, columns, rows):
+    # Write-only workbooks stream rows to disk instead of building a sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(handle)
+
+
+def _write_csv(handle, title, columns, rows):
+    text = io.TextIOWrapper(handle, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+WRITERS = {
+    'xlsx': _write_xlsx,
+    'csv': _write_csv,
+}
+
+
+class _ProgressTracker:
+    """Yields rows while recording row_count/progress every REPORT_PROGRESS_INTERVAL rows"""
+
+    def __init__(self, report_id, rows, total):
+        self.report_id = report_id
+        self.rows = rows
+        self.total = total
+        self.count = 0
+        self.interval = _setting('REPORT_PROGRESS_INTERVAL', 1000)
+
+    def __iter__(self):
+        for row in self.rows:
+            yield row
+            self.count += 1
+            if self.count % self.interval == 0:
+                # Capped below 100 until the file is actually stored
+                progress = min(99, self.count * 100 // self.total) if self.total else 99
+                GeneratedReport.objects.filter(pk=self.report_id).update(
+                    row_count=self.count, progress=progress
+                )
+
+
+def request_report(user, report_type, parameters=None, file_format='xlsx', name=None):
+    """
+    Create a pending GeneratedReport and enqueue its generation once the
+    current transaction commits. Raises ValueError for unknown types/formats.
+    """
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type: {report_type}")
+    if file_format not in WRITERS:
+        raise ValueError(f"Unsupported report format: {file_format}")
+
+    report = GeneratedReport.objects.create(
+        report_type=report_type,
+        name=name or REPORT_TYPES[report_type][0],
+        parameters=parameters or {},
+        file_format=file_format,
+        created_by=user,
+    )
+    transaction.on_commit(lambda: _enqueue(report.pk))
+    return report
+
+
+def uses_broker():
+    """Whether reports go to Celery; otherwise generate_reports picks them up"""
+    return bool(getattr(settings, 'CELERY_BROKER_URL', None))
+
+
+def _enqueue(report_id):
+    """
+    Hand the report to a Celery worker. Without a broker (or when enqueueing
+    fails) it stays pending for ``manage.py generate_reports``; it is never
+    written in the request that asked for it.
+    """
+    if not uses_broker():
+        return
+    from .tasks import generate_report_task
+    try:
+        generate_report_task.delay(report_id)
+    except Exception:
+        logger.exception("Could not enqueue report %s; left pending for generate_reports", report_id)
+
+
+def generate_pending_reports(limit=None):
+    """
+    Generate pending reports, oldest first; returns how many were attempted.
+    Each report is claimed by moving it to 'running', so several workers may
+    run at once without writing the same file twice.
+    """
+    pending = GeneratedReport.objects.filter(status='pending').order_by('created_at')
+    attempted = 0
+    for report_id in pending.values_list('pk', flat=True)[:limit]:
+        if not GeneratedReport.objects.filter(pk=report_id, status='pending').update(status='running'):
+            continue
+        attempted += 1
+        try:
+            generate_report(report_id)
+        except Exception:
+            # Already logged and recorded on the report
+            pass
+    return attempted
+
+
+def generate_report(report_id):
+    """
+    Write the report file; safe to call again for a report that failed or
+    whose worker died part-way through
+    """
+    report = GeneratedReport.objects.get(pk=report_id)
+    if report.status == 'completed':
+        return report
+
+    GeneratedReport.objects.filter(pk=report_id).update(
+        status='running', progress=0, row_count=0, error_message=''
+    )
+    title, build = REPORT_TYPES[report.report_type]
+    try:
+        with use_replica(), tempfile.TemporaryFile() as handle:
+            columns, rows = build(report.parameters)
+            tracker = _ProgressTracker(report_id, rows.iterator(chunk_size=_setting('REPORT_CHUNK_SIZE', 2000)),
+                                       rows.count())
+            WRITERS[report.file_format](handle, title, columns, tracker)
+            handle.seek(0)
+            filename = f"{report.report_type}_{report.pk}_{timezone.localdate():%Y%m%d}.{report.file_format}"
+            report.report_file.save(filename, File(handle), save=False)
+    except Exception as exc:
+        logger.exception("Report %s failed", report_id)
+        GeneratedReport.objects.filter(pk=report_id).update(status='failed', error_message=str(exc))
+        raise
+
+    report.status = 'completed'
+    report.progress = 100
+    report.row_count = tracker.count
+    report.error_message = ''
+    report.completed_at = timezone.now()
+    report.save(update_fields=['report_file', 'status', 'progress', 'row_count',
+                               'error_message', 'completed_at'])
+    return report
+
+
+def can_access(user, report):
+    return user.is_admin_user() or report.created_by_id == user.pk
@@ -0,0 +1,207 @@
+"""
+Data Retention and Archival for Laso Healthcare
+Rows older than their table's retention period are moved out of the hot
+tables in batches: each batch is written to a gzip-compressed JSONL file
+under RETENTION_SETTINGS['ARCHIVE_DIR'] and only then deleted, so a crash
+never loses rows (at worst a batch is archived twice, which restore skips).
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'RETENTION_SETTINGS', {}).get(name, default)
+
+
+class RetentionPolicy:
+    """
+    Expiry rule of one model: rows whose ``date_field`` is older than the
+    retention period (RETENTION_SETTINGS['POLICIES'][name] days, falling
+    back to ``default_days``) and that match ``keep_unless`` are archived.
+    ``keep`` may return a Q of expired rows that must stay anyway.
+    """
+
+    def __init__(self, name, model, date_field, default_days, keep_unless=None, keep=None):
+        self.name = name
+        self.model_label = model
+        self.date_field = date_field
+        self.default_days = default_days
+        self.keep_unless = keep_unless
+        self.keep = keep
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def days(self):
+        return _setting('POLICIES', {}).get(self.name, self.default_days)
+
+    def cutoff(self, now=None):
+        return (now or timezone.now()) - timedelta(days=self.days)
+
+    def expired(self, now=None):
+        queryset = self.model._default_manager.filter(**{f'{self.date_field}__lt': self.cutoff(now)})
+        if self.keep_unless is not None:
+            queryset = queryset.filter(self.keep_unless)
+        if self.keep is not None:
+            queryset = queryset.exclude(self.keep(now))
+        return queryset.order_by('pk')
+
+
+def _keep_notifications(now):
+    from .models_notifications import AWAITING_DISPATCH
+    # Deleting a notification would cascade to its logs unarchived; the logs
+    # policy runs first, so a notification that still has logs waits for them
+    return AWAITING_DISPATCH | Q(logs__isnull=False)
+
+
+# In run order: logs go before the notifications they belong to
+POLICIES = {policy.name: policy for policy in [
+    RetentionPolicy('notification_logs', 'core.NotificationLog', 'created_at', 30),
+    RetentionPolicy('notifications', 'core.Notification', 'created_at', 30,
+                    keep_unless=Q(is_read=True), keep=_keep_notifications),
+    RetentionPolicy('communication_notifications', 'core.CommunicationNotification', 'created_at', 30,
+                    keep_unless=Q(is_read=True)),
+    RetentionPolicy('security_audit_logs', 'core.SecurityAuditLog', 'timestamp', 365),
+    RetentionPolicy('login_sessions', 'core.LoginSession', 'login_time', 180,
+                    keep_unless=Q(is_active=False)),
+    RetentionPolicy('ai_conversations', 'core.AIConversation', 'created_at', 365),
+]}
+
+
+def archive_dir(policy_name=None):
+    root = _setting('ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives'))
+    return os.path.join(root, policy_name) if policy_name else root
+
+
+def _write_archive(path, objects):
+    """Write serialized rows to ``path`` atomically (temp file, fsync, rename)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as handle:
+            for row in serializers.serialize('python', objects):
+                handle.write(json.dumps(row, cls=DjangoJSONEncoder).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+
+
+def _installed_model(policy):
+    """The policy's model, or None when it is not installed or has no table yet"""
+    try:
+        model = policy.model
+    except LookupError:
+        logger.warning("Retention policy %s skipped: model %s is not installed", policy.name, policy.model_label)
+        return None
+    if model._meta.db_table not in connection.introspection.table_names():
+        logger.warning("Retention policy %s skipped: table %s does not exist", policy.name, model._meta.db_table)
+        return None
+    return model
+
+
+def apply_policy(policy, batch_size=None, dry_run=False, now=None, max_batches=None):
+    """
+    Archive and delete one policy's expired rows batch by batch; returns the
+    number of rows archived (or that would be, with ``dry_run``)
+    """
+    if not policy.days:
+        return 0
+    model = _installed_model(policy)
+    if model is None:
+        return 0
+    now = now or timezone.now()
+    if dry_run:
+        return policy.expired(now).count()
+
+    batch_size = batch_size or _setting('BATCH_SIZE', 1000)
+    stamp = now.strftime('%Y%m%d-%H%M%S')
+    archived = batches = 0
+    last_pk = 0
+    while max_batches is None or batches < max_batches:
+        batch = list(policy.expired(now).filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        batches += 1
+        last_pk = batch[-1].pk
+        _write_archive(os.path.join(archive_dir(policy.name), f'{policy.name}-{stamp}-{batches:05d}.jsonl.gz'), batch)
+        with transaction.atomic():
+            model._default_manager.filter(pk__in=[obj.pk for obj in batch]).delete()
+        archived += len(batch)
+    if archived:
+        logger.info("Retention policy %s archived %d rows in %d batches", policy.name, archived, batches)
+    return archived
+
+
+def apply_retention(names=None, batch_size=None, dry_run=False):
+    """Run the given policies (all by default); returns {policy name: rows}"""
+    names = names or list(POLICIES)
+    unknown = set(names) - set(POLICIES)
+    if unknown:
+        raise ValueError(f"Unknown retention policies: {', '.join(sorted(unknown))}")
+    now = timezone.now()
+    return {name: apply_policy(POLICIES[name], batch_size, dry_run, now) for name in names}
+
+
+def archive_files(path):
+    """
+    Archive files at ``path`` (a file, or a directory searched recursively)
+    in restore order: policies in reverse run order, so notifications come
+    back before their logs, then by name
+    """
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for directory, _, files in os.walk(path):
+        found.extend(os.path.join(directory, name) for name in files if name.endswith('.jsonl.gz'))
+    order = {name: position for position, name in enumerate(reversed(list(POLICIES)))}
+
+    def key(file_path):
+        policy = os.path.basename(file_path).rsplit('-', 3)[0]
+        return order.get(policy, len(order)), file_path
+    return sorted(found, key=key)
+
+
+def restore_archive(path, batch_size=None):
+    """
+    Load archived rows back into their tables; rows whose primary key
+    already exists are skipped. Returns the number of rows read.
+    """
+    batch_size = batch_size or _setting('BATCH_SIZE', 1000)
+    restored = 0
+
+    def flush(pending):
+        by_model = {}
+        for obj in serializers.deserialize('python', pending):
+            by_model.setdefault(type(obj.object), []).append(obj.object)
+        with transaction.atomic():
+            for model, objects in by_model.items():
+                model._default_manager.bulk_create(objects, ignore_conflicts=True)
+
+    with gzip.open(path, 'rt', encoding='utf-8') as handle:
+        pending = []
+        for line in handle:
+            if line.strip():
+                pending.append(json.loads(line))
+            if len(pending) >= batch_size:
+                flush(pending)
+                restored += len(pending)
+                pending = []
+        if pending:
+            flush(pending)
+            restored += len(pending)
+    return restored
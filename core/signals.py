@@ -5,6 +5,8 @@ from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
 from django.utils import timezone
 from .models_sessions import LoginSession
+from .active_users import record_activity
+from .theme_preferences import load_preference, remember
 
 
 def get_client_ip(request):
@@ -39,6 +41,12 @@ def track_user_login(sender, request, user, **kwargs):
             session_key=request.session.session_key,
             is_active=True
         )
+        
+        # Count the user in today's active-user rollup
+        record_activity(user.pk)
+        
+        # Page renders read the theme from the session from now on
+        remember(request, load_preference(user))
     except Exception as e:
         # Log error but don't break login process
         print(f"Error tracking login session: {e}")
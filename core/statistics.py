@@ -0,0 +1,488 @@
+"""
+Statistics Rollups for Laso Healthcare
+Incrementally fills SystemStatistics, DoctorStatistics and DoctorPerformanceMetric
+from the raw tables and serves dashboard figures from those rows
+"""
+import logging
+import time as clock
+import uuid
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.signals import post_delete, post_init, post_save
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from appointments.models import Appointment
+from treatments.models import Treatment, Prescription
+from treatments.models_lab import LabTest
+from . import active_users
+from .models_sessions import DailyActiveUsers
+from .models_statistics import (
+    SystemStatistics, DoctorStatistics, DoctorPerformanceMetric, StatisticsRollup, StatisticsDirtyDay
+)
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+ROLLUP_JOB = 'daily_statistics'
+ROLLUP_LOCK_KEY = 'statistics_rollup:lock'
+ROLLUP_LOCK_TIMEOUT = 30 * 60
+ROLLUP_ENQUEUED_KEY = 'statistics_rollup:enqueued'
+TODAY_REFRESHED_KEY = 'statistics_rollup:today_refreshed'
+USER_TYPES = ('patient', 'doctor', 'receptionist', 'admin')
+
+
+def _setting(name, default):
+    return getattr(settings, 'ANALYTICS_SETTINGS', {}).get(name, default)
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _spans(days: List) -> List[tuple]:
+    """Collapse sorted days into contiguous [first, last] spans"""
+    spans = []
+    for day in days:
+        if spans and day == spans[-1][1] + timedelta(days=1):
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return [tuple(span) for span in spans]
+
+
+def _in_spans(field: str, spans: Iterable[tuple]) -> Q:
+    condition = Q()
+    for first, last in spans:
+        condition |= Q(**{f'{field}__gte': _start_of(first),
+                          f'{field}__lt': _start_of(last + timedelta(days=1))})
+    return condition
+
+
+def _daily(queryset, field: str, spans, keys=(), **metrics) -> List[dict]:
+    """One grouped query: metrics per local day of a datetime field (and keys)"""
+    return list(
+        queryset.filter(_in_spans(field, spans))
+        .annotate(day=TruncDate(field))
+        .values('day', *keys)
+        .annotate(**metrics)
+        .order_by()
+    )
+
+
+def dirty_days(since, today) -> List:
+    """
+    Days whose rollup rows must be (re)computed.
+
+    Every day from the previous run up to today, plus the scheduled date of
+    any appointment created or changed since then (status changes land on
+    past days, bookings on future ones) and the days marked dirty by moved
+    or deleted rows. Without a previous run, all history is processed,
+    optionally capped by ROLLUP_BACKFILL_DAYS.
+    """
+    if since is None:
+        first_appointment = Appointment.objects.aggregate(first=Min('date'))['first']
+        first_user = User.objects.aggregate(first=Min('date_joined'))['first']
+        start = min(
+            today,
+            first_appointment or today,
+            timezone.localtime(first_user).date() if first_user else today,
+        )
+        backfill_days = _setting('ROLLUP_BACKFILL_DAYS', None)
+        if backfill_days:
+            start = max(start, today - timedelta(days=backfill_days))
+        touched = Appointment.objects.filter(date__gt=today).dates('date', 'day')
+    else:
+        start = min(timezone.localtime(since).date(), today)
+        touched = Appointment.objects.filter(updated_at__gte=since).dates('date', 'day')
+
+    days = {start + timedelta(days=offset) for offset in range((today - start).days + 1)}
+    days.update(touched)
+    days.update(StatisticsDirtyDay.objects.values_list('date', flat=True))
+    return sorted(days)
+
+
+def mark_dirty(*days):
+    """Have the next rollup run recompute these days"""
+    days = {day for day in days if day is not None}
+    if days:
+        StatisticsDirtyDay.objects.bulk_create(
+            [StatisticsDirtyDay(date=day) for day in days],
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=['marked_at'],
+        )
+
+
+def _local_day(value):
+    return timezone.localtime(value).date() if value else None
+
+
+def _rollup_system(days: List, today):
+    spans = _spans(days)
+    # dirty_days always starts on or before today
+    past_days = [day for day in days if day <= today]
+
+    appointments = {
+        row['date']: row for row in Appointment.objects.filter(date__in=days).values('date').annotate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+        ).order_by()
+    }
+    new_appointments = {row['day']: row['count'] for row in _daily(
+        Appointment.objects.all(), 'created_at', spans, count=Count('id'))}
+    treatments = {row['day']: row['count'] for row in _daily(
+        Treatment.objects.all(), 'created_at', spans, count=Count('id'))}
+
+    # Running user totals: everyone who joined before the first day, then
+    # each day's sign-ups from there up to today
+    first = past_days[0]
+    running = {user_type: 0 for user_type in USER_TYPES}
+    for row in User.objects.filter(date_joined__lt=_start_of(first)).values('user_type').annotate(
+            count=Count('id')).order_by():
+        running[row['user_type']] = running.get(row['user_type'], 0) + row['count']
+    new_users: Dict = {}
+    for row in _daily(User.objects.all(), 'date_joined', [(first, today)], keys=('user_type',),
+                      count=Count('id')):
+        new_users.setdefault(row['day'], {})[row['user_type']] = row['count']
+
+    # Active users come from the DailyActiveUsers bitmaps, not LoginSession
+    daily_active = dict(DailyActiveUsers.objects.filter(date__in=past_days).values_list('date', 'user_count'))
+    monthly_active = active_users.rolling_active_counts(
+        past_days, _setting('ROLLUP_ACTIVE_USER_WINDOW', 30)
+    )
+
+    rows = []
+    day = first
+    dirty = set(days)
+    while day <= max(days):
+        if day <= today:
+            for user_type, count in new_users.get(day, {}).items():
+                running[user_type] = running.get(user_type, 0) + count
+        if day in dirty:
+            counts = appointments.get(day, {})
+            rows.append(SystemStatistics(
+                date=day,
+                total_patients=running.get('patient', 0),
+                total_doctors=running.get('doctor', 0),
+                total_appointments=counts.get('total', 0),
+                completed_appointments=counts.get('completed', 0),
+                cancelled_appointments=counts.get('cancelled', 0),
+                total_treatments=treatments.get(day, 0),
+                daily_active_users=daily_active.get(day, 0),
+                monthly_active_users=monthly_active.get(day, 0),
+                new_users=sum(new_users.get(day, {}).values()),
+                new_appointments=new_appointments.get(day, 0),
+                data_json={'users_by_type': dict(running)},
+            ))
+        day += timedelta(days=1)
+
+    SystemStatistics.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=[
+            'total_patients', 'total_doctors', 'total_appointments', 'completed_appointments',
+            'cancelled_appointments', 'total_treatments', 'daily_active_users',
+            'monthly_active_users', 'new_users', 'new_appointments', 'data_json', 'updated_at',
+        ],
+    )
+
+
+def _rollup_doctors(days: List):
+    spans = _spans(days)
+    dirty = set(days)
+    counts: Dict[tuple, dict] = {}
+
+    def add(doctor_id, day, **values):
+        if doctor_id is None or day not in dirty:
+            return
+        entry = counts.setdefault((doctor_id, day), {
+            'appointments': 0, 'completed': 0, 'treatments': 0, 'prescriptions': 0, 'lab_tests': 0,
+        })
+        entry.update(values)
+
+    for row in Appointment.objects.filter(date__in=days).values('doctor', 'date').annotate(
+            total=Count('id'), completed=Count('id', filter=Q(status='completed'))).order_by():
+        add(row['doctor'], row['date'], appointments=row['total'], completed=row['completed'])
+    for row in _daily(Treatment.objects.all(), 'created_at', spans,
+                      keys=('appointment__doctor',), count=Count('id')):
+        add(row['appointment__doctor'], row['day'], treatments=row['count'])
+    for row in _daily(Prescription.objects.all(), 'created_at', spans,
+                      keys=('treatment__appointment__doctor',), count=Count('id')):
+        add(row['treatment__appointment__doctor'], row['day'], prescriptions=row['count'])
+    for row in _daily(LabTest.objects.all(), 'requested_date', spans,
+                      keys=('doctor',), count=Count('id')):
+        add(row['doctor'], row['day'], lab_tests=row['count'])
+
+    # Days being recomputed start from zero so deleted activity disappears;
+    # manually entered rating fields on performance metrics are left alone
+    DoctorStatistics.objects.filter(date__in=days).update(
+        appointment_count=0, completed_appointment_count=0, treatment_count=0,
+        prescription_count=0, lab_test_count=0,
+    )
+    DoctorPerformanceMetric.objects.filter(date__in=days).update(
+        appointments_count=0, treatments_count=0, efficiency_score=0.0,
+    )
+
+    statistics, metrics = [], []
+    for (doctor_id, day), entry in counts.items():
+        statistics.append(DoctorStatistics(
+            doctor_id=doctor_id,
+            date=day,
+            appointment_count=entry['appointments'],
+            completed_appointment_count=entry['completed'],
+            treatment_count=entry['treatments'],
+            prescription_count=entry['prescriptions'],
+            lab_test_count=entry['lab_tests'],
+        ))
+        efficiency = (entry['completed'] / entry['appointments'] * 100) if entry['appointments'] else 0.0
+        metrics.append(DoctorPerformanceMetric(
+            doctor_id=doctor_id,
+            date=day,
+            appointments_count=entry['appointments'],
+            treatments_count=entry['treatments'],
+            efficiency_score=round(efficiency, 1),
+        ))
+
+    DoctorStatistics.objects.bulk_create(
+        statistics,
+        update_conflicts=True,
+        unique_fields=['doctor', 'date'],
+        update_fields=['appointment_count', 'completed_appointment_count', 'treatment_count',
+                       'prescription_count', 'lab_test_count'],
+    )
+    DoctorPerformanceMetric.objects.bulk_create(
+        metrics,
+        update_conflicts=True,
+        unique_fields=['doctor', 'date'],
+        update_fields=['appointments_count', 'treatments_count', 'efficiency_score', 'updated_at'],
+    )
+
+
+def _lock() -> Optional[str]:
+    """Take the rollup lock; returns the owner token to unlock with, or None"""
+    owner = uuid.uuid4().hex
+    return owner if cache.add(ROLLUP_LOCK_KEY, owner, timeout=ROLLUP_LOCK_TIMEOUT) else None
+
+
+def _unlock(owner):
+    # A run that outlived ROLLUP_LOCK_TIMEOUT may find the lock taken by another run
+    if cache.get(ROLLUP_LOCK_KEY) == owner:
+        cache.delete(ROLLUP_LOCK_KEY)
+
+
+def rollup_statistics(full=False) -> Optional[int]:
+    """
+    Bring the statistics tables up to date and return the number of days
+    processed, or None if another run holds the lock
+    """
+    owner = _lock()
+    if not owner:
+        logger.info("Statistics rollup already running; skipping")
+        return None
+    try:
+        started = timezone.now()
+        timer = clock.monotonic()
+        today = timezone.localdate()
+        state = StatisticsRollup.objects.filter(job=ROLLUP_JOB).first()
+        since = None if full or state is None else state.high_water_mark
+        days = dirty_days(since, today)
+
+        with transaction.atomic():
+            if since is None:
+                # Logins keep DailyActiveUsers current; rebuild it from the
+                # session history when starting over
+                active_users.backfill(days[0], today)
+            _rollup_system(days, today)
+            _rollup_doctors(days)
+            # Days marked during the run stay dirty for the next one
+            StatisticsDirtyDay.objects.filter(date__in=days, marked_at__lt=started).delete()
+            # The mark is the run's start, so rows changed during the run are
+            # picked up again next time
+            StatisticsRollup.objects.update_or_create(job=ROLLUP_JOB, defaults={
+                'high_water_mark': started,
+                'days_processed': len(days),
+                'duration': clock.monotonic() - timer,
+            })
+        return len(days)
+    finally:
+        _unlock(owner)
+
+
+def refresh_today() -> bool:
+    """
+    Recompute today's rollup rows only. The cost follows today's activity,
+    not table size, and the high-water mark is left for the full job.
+    """
+    owner = _lock()
+    if not owner:
+        return False
+    try:
+        today = timezone.localdate()
+        with transaction.atomic():
+            _rollup_system([today], today)
+            _rollup_doctors([today])
+        return True
+    finally:
+        _unlock(owner)
+
+
+def ensure_statistics():
+    """
+    Keep the rollups current without making page loads depend on table size.
+
+    Pages serve whatever rollup rows exist. When they are older than
+    ROLLUP_REFRESH_INTERVAL, a page load enqueues the rollup job if a broker
+    is configured; without one it refreshes only today's rows inline, and
+    history is left to Celery beat or the rollup_statistics command.
+    """
+    state = StatisticsRollup.objects.filter(job=ROLLUP_JOB).first()
+    interval = _setting('ROLLUP_REFRESH_INTERVAL', 3600)
+    if state and (timezone.now() - state.high_water_mark).total_seconds() < interval:
+        return
+    if getattr(settings, 'CELERY_BROKER_URL', None):
+        if cache.add(ROLLUP_ENQUEUED_KEY, 1, timeout=interval):
+            from .tasks import rollup_statistics_task
+            try:
+                rollup_statistics_task.delay()
+            except Exception:
+                logger.exception("Could not enqueue the statistics rollup")
+        return
+    if cache.add(TODAY_REFRESHED_KEY, 1, timeout=interval):
+        if state is None:
+            logger.warning("Statistics rollups have never run; run the rollup_statistics command to fill history")
+        refresh_today()
+
+
+def system_overview(today=None) -> dict:
+    """
+    Headline figures for the admin dashboards, read from SystemStatistics
+    """
+    ensure_statistics()
+    today = today or timezone.localdate()
+    week_ago = today - timedelta(days=7)
+    month_ago = today - timedelta(days=30)
+
+    latest = SystemStatistics.objects.filter(date__lte=today).order_by('-date').first()
+    users_by_type = dict(latest.data_json.get('users_by_type', {})) if latest else {}
+    for user_type in USER_TYPES:
+        users_by_type.setdefault(user_type, 0)
+
+    past = Q(date__lte=today)
+    # Aggregate aliases must not shadow the model's own field names
+    totals = SystemStatistics.objects.aggregate(
+        sum_appointments=Sum('total_appointments'),
+        sum_completed=Sum('completed_appointments'),
+        sum_cancelled=Sum('cancelled_appointments'),
+        appointments_today=Sum('total_appointments', filter=Q(date=today)),
+        appointments_this_week=Sum('total_appointments', filter=Q(date__gte=week_ago)),
+        appointments_this_month=Sum('total_appointments', filter=Q(date__gte=month_ago)),
+        sum_treatments=Sum('total_treatments', filter=past),
+        treatments_this_month=Sum('total_treatments', filter=past & Q(date__gte=month_ago)),
+        new_users_this_month=Sum('new_users', filter=past & Q(date__gte=month_ago)),
+        new_users_last_month=Sum(
+            'new_users', filter=Q(date__gte=month_ago - timedelta(days=30), date__lt=month_ago)
+        ),
+    )
+    overview = {name: value or 0 for name, value in totals.items()}
+    for alias, name in (('sum_appointments', 'total_appointments'), ('sum_completed', 'completed_appointments'),
+                        ('sum_cancelled', 'cancelled_appointments'), ('sum_treatments', 'total_treatments')):
+        overview[name] = overview.pop(alias)
+    overview['planned_appointments'] = (
+        overview['total_appointments'] - overview['completed_appointments'] - overview['cancelled_appointments']
+    )
+    overview.update({
+        'users_by_type': users_by_type,
+        'total_users': sum(users_by_type.values()),
+        'active_users': active_users.active_user_count(
+            today - timedelta(days=_setting('ROLLUP_ACTIVE_USER_WINDOW', 30) - 1), today
+        ),
+        'total_lab_tests': DoctorStatistics.objects.aggregate(total=Sum('lab_test_count'))['total'] or 0,
+        'as_of': latest.updated_at if latest else None,
+    })
+    return overview
+
+
+def top_doctors(limit=10) -> List:
+    """
+    Doctors with the most appointments, annotated with ``appointment_count``
+    """
+    ensure_statistics()
+    rows = list(DoctorStatistics.objects.values('doctor').annotate(
+        appointment_count=Sum('appointment_count')
+    ).order_by('-appointment_count')[:limit])
+    doctors = User.objects.in_bulk([row['doctor'] for row in rows])
+    result = []
+    for row in rows:
+        doctor = doctors.get(row['doctor'])
+        if doctor is not None:
+            doctor.appointment_count = row['appointment_count']
+            result.append(doctor)
+    return result
+
+
+def doctor_performance_summary(doctor, periods, today=None) -> Dict[str, dict]:
+    """
+    Per-period figures in the shape of DashboardAnalytics.get_doctor_performance,
+    for every (name, days) in ``periods``, from one query over DoctorStatistics
+    """
+    ensure_statistics()
+    today = today or timezone.localdate()
+    aggregates = {}
+    for index, (_name, days) in enumerate(periods):
+        window = Q(date__gte=today - timedelta(days=days), date__lte=today)
+        aggregates[f'appointments_{index}'] = Sum('appointment_count', filter=window)
+        aggregates[f'completed_{index}'] = Sum('completed_appointment_count', filter=window)
+        aggregates[f'treatments_{index}'] = Sum('treatment_count', filter=window)
+    totals = DoctorStatistics.objects.filter(doctor=doctor).aggregate(**aggregates)
+
+    summary = {}
+    for index, (name, days) in enumerate(periods):
+        total = totals[f'appointments_{index}'] or 0
+        completed = totals[f'completed_{index}'] or 0
+        summary[name] = {
+            'total_appointments': total,
+            'completed_appointments': completed,
+            'completion_rate': (completed / total * 100) if total > 0 else 0,
+            'total_treatments': totals[f'treatments_{index}'] or 0,
+            'avg_daily_patients': round(total / days, 1),
+        }
+    return summary
+
+
+def _remember_date(sender, instance, **kwargs):
+    # __dict__ so a deferred date field is not loaded just for this
+    instance._statistics_date = instance.__dict__.get('date')
+
+
+def _appointment_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_statistics_date', None)
+    if not created and previous and previous != instance.date:
+        # The appointment left that day; its rows no longer count it
+        mark_dirty(previous)
+    instance._statistics_date = instance.date
+
+
+def _appointment_deleted(sender, instance, **kwargs):
+    mark_dirty(instance.date, _local_day(instance.created_at))
+
+
+def _activity_deleted(sender, instance, **kwargs):
+    mark_dirty(_local_day(getattr(instance, 'created_at', None)),
+               _local_day(getattr(instance, 'requested_date', None)))
+
+
+post_init.connect(_remember_date, sender=Appointment, dispatch_uid='statistics_appointment_init')
+post_save.connect(_appointment_saved, sender=Appointment, dispatch_uid='statistics_appointment_saved')
+post_delete.connect(_appointment_deleted, sender=Appointment, dispatch_uid='statistics_appointment_deleted')
+for _model in (Treatment, Prescription, LabTest):
+    post_delete.connect(_activity_deleted, sender=_model,
+                        dispatch_uid=f'statistics_{_model.__name__}_deleted')
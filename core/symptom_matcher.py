@@ -0,0 +1,140 @@
+"""
+Compiled multi-pattern symptom matcher for Laso Healthcare
+Aho-Corasick automaton built from the symptom map and its built-in English
+and Turkish synonyms
+"""
+
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for matching in English and Turkish.
+
+    Case-folds, drops the combining dot produced by folding 'İ' and maps the
+    dotless 'ı' to 'i', so 'İshal', 'ishal' and 'ISHAL' all compare equal.
+    Patterns and input always go through the same function.
+    """
+    text = unicodedata.normalize('NFC', text or '').casefold()
+    return text.replace('\u0307', '').replace('\u0131', 'i')
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton: finds every occurrence of every pattern in a
+    single pass over the input, independent of vocabulary size.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        # Node 0 is the root; goto[node] maps a character to the next node
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Tuple[int, str]]] = [[]]
+        for pattern, label in patterns.items():
+            self._add(pattern, label)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, label: str):
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = next_node
+        self.output[node].append((len(pattern), label))
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def iter_matches(self, text: str):
+        """
+        Yield (start, end, label) for every pattern occurrence in text
+        """
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, label in self.output[node]:
+                yield index - length + 1, index + 1, label
+
+    def __len__(self):
+        return len(self.goto)
+
+
+class SymptomMatcher:
+    """
+    Maps free text to canonical labels (symptom-map keys and lab-test
+    keywords) through an Aho-Corasick automaton.
+
+    Matches must start on a word boundary but may end mid-word, so English
+    plurals and Turkish suffixes ('ateşim', 'öksürükler') still match while
+    'ache' does not match inside 'headache'.
+    """
+
+    def __init__(self, labels: Iterable[str], synonyms: Dict[str, Iterable[str]]):
+        self.labels: Set[str] = set(labels)
+        patterns: Dict[str, str] = {}
+        for label in self.labels:
+            patterns[normalize_text(label)] = label
+        for label, terms in synonyms.items():
+            for term in terms:
+                normalized = normalize_text(term).strip()
+                if normalized:
+                    patterns.setdefault(normalized, label)
+        self.pattern_count = len(patterns)
+        self.automaton = AhoCorasick(patterns)
+
+    def find(self, text: str) -> List[str]:
+        """
+        Return matched labels in order of first appearance
+        """
+        normalized = normalize_text(text)
+        found = []
+        seen = set()
+        for start, _end, label in self.automaton.iter_matches(normalized):
+            if label in seen:
+                continue
+            if start > 0 and normalized[start - 1].isalnum():
+                continue
+            seen.add(label)
+            found.append(label)
+        return found
+
+
+_matchers: Dict[str, SymptomMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(name: str, labels: Iterable[str], synonyms: Dict[str, Iterable[str]]) -> SymptomMatcher:
+    """
+    Return the compiled matcher for ``name``, building it on first use
+    """
+    matcher = _matchers.get(name)
+    if matcher is not None:
+        return matcher
+
+    with _matchers_lock:
+        matcher = _matchers.get(name)
+        if matcher is None:
+            matcher = SymptomMatcher(labels, synonyms)
+            _matchers[name] = matcher
+        return matcher
@@ -0,0 +1,58 @@
+"""
+Celery tasks for Laso Healthcare core
+"""
+from celery import shared_task
+
+from .mailer import deliver, retry_countdown
+from .notification_dispatcher import dispatch_due
+from .reports import generate_report
+from .retention import apply_retention
+from .statistics import rollup_statistics
+
+
+@shared_task(name='core.tasks.rollup_statistics_task')
+def rollup_statistics_task(full=False):
+    """
+    Refresh the pre-aggregated statistics tables (scheduled by Celery beat)
+    """
+    return rollup_statistics(full=full)
+
+
+@shared_task(name='core.tasks.generate_report_task')
+def generate_report_task(report_id):
+    """
+    Write a requested GeneratedReport file (see core.reports.request_report)
+    """
+    report = generate_report(report_id)
+    return {'report_id': report.pk, 'rows': report.row_count}
+
+
+@shared_task(name='core.tasks.deliver_email_batch_task', bind=True)
+def deliver_email_batch_task(self, log_ids):
+    """
+    Send one batch of queued emails (see core.mailer.send_queued); the
+    messages that failed are retried alone, with exponential backoff
+    """
+    failed = deliver(log_ids)
+    countdown = retry_countdown(self.request.retries)
+    if failed and countdown is not None:
+        raise self.retry(args=[failed], countdown=countdown)
+    return {'sent': len(log_ids) - len(failed), 'failed': len(failed)}
+
+
+@shared_task(name='core.tasks.dispatch_notifications_task')
+def dispatch_notifications_task():
+    """
+    Deliver due scheduled notifications (scheduled by Celery beat); parallel
+    runs claim disjoint rows
+    """
+    return dispatch_due()
+
+
+@shared_task(name='core.tasks.apply_retention_task')
+def apply_retention_task(policies=None):
+    """
+    Archive and delete rows past their retention period (scheduled daily by
+    Celery beat); returns rows archived per policy
+    """
+    return apply_retention(policies)
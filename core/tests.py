@@ -1,3 +1,1274 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import shutil
+import tempfile
+from datetime import date, time, timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.contrib.sessions.backends.db import SessionStore
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from types import SimpleNamespace
+from unittest import mock
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from openpyxl import load_workbook
+
+from appointments.models import Appointment
+from appointments.models_availability import DoctorAvailability
+from treatments.models import Treatment, Prescription
+from treatments.models_lab import LabTest
+from treatments.models_medical_history import MedicalHistory
+from treatments.models_medications import Medication, MedicationInteraction
+from treatments.views_medications import prescription_interaction_check_api
+from .active_users import active_user_count, record_activity
+from .ai_cache import AIResponseCache
+from .ai_conversation_log import ConversationLogBuffer
+from .ai_throttle import ProviderBusyError, ProviderThrottle
+from .analytics import DashboardAnalytics
+from .analytics_cache import get_or_build, stats as cache_stats
+from .cohorts import age_band, age_on, doctor_cohorts
+from .consumers import NotificationConsumer
+from .dashboard_cache import get_section
+from .mailer import deliver, retry_countdown
+from .db_router import ReplicaRouter, use_primary, use_replica
+from .forms import PrescriptionFormSet
+from .interaction_index import get_interaction_index
+from .context_processors import notifications_processor, theme_processor
+from .models_communication import CommunicationNotification
+from .models_notifications import Notification, NotificationLog, NotificationPreference, NotificationTemplate
+from .models_sessions import DailyActiveUsers, LoginSession
+from .models_theme import UserThemePreference
+from .notification_counters import unread_counts
+from .notification_coalescing import notify_coalesced
+from .notification_dispatcher import claim_due, dispatch_due
+from .notification_fanout import fan_out, fan_out_communication
+from .notification_push import group_name, missed_notifications
+from .reports import generate_pending_reports, generate_report, request_report
+from .retention import apply_retention, archive_files
+from .models_ai_config import AIConversation
+from .models_statistics import (
+    DoctorPerformanceMetric, DoctorStatistics, GeneratedReport, StatisticsRollup, SystemStatistics,
+)
+from .signals import track_user_login
+from . import statistics
+from .statistics import (
+    doctor_performance_summary, ensure_statistics, refresh_today, rollup_statistics, system_overview,
+)
+from .theme_preferences import update_preference
+from .views import ProfileSettingsView, ai_symptom_triage, dashboard
+from .views_dashboard import report_status_api
+from .time_buckets import bucket_starts, time_series
+
+User = get_user_model()
+
+
+class DashboardAnalyticsQueryTest(TestCase):
+    """
+    Each analytics section must stay a fixed number of queries regardless
+    of how many appointments, treatments and lab tests exist
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(username='analytics_doctor', password='x', user_type='doctor')
+        patients = [
+            User.objects.create_user(username=f'analytics_patient{i}', password='x', user_type='patient')
+            for i in range(3)
+        ]
+        today = timezone.now().date()
+        statuses = ['completed', 'completed', 'cancelled', 'planned']
+        for i, status in enumerate(statuses * 3):
+            appointment = Appointment.objects.create(
+                doctor=cls.doctor,
+                patient=patients[i % 3],
+                date=today - timedelta(days=i % 4),
+                time=time(9 + i % 8),
+                description='Checkup',
+                status=status,
+            )
+            if status == 'completed':
+                treatment = Treatment.objects.create(appointment=appointment, diagnosis='Flu')
+                Prescription.objects.create(treatment=treatment, name='Paracetamol', dosage='500mg', instructions='x')
+                LabTest.objects.create(
+                    treatment=treatment, patient=appointment.patient, doctor=cls.doctor,
+                    test_name='CBC' if i % 2 else 'Lipid Panel', status='completed' if i < 6 else 'requested',
+                )
+
+    def setUp(self):
+        self.analytics = DashboardAnalytics(user=self.doctor)
+
+    def test_appointment_stats_single_query(self):
+        with self.assertNumQueries(1):
+            stats = self.analytics.get_appointment_stats()
+        self.assertEqual(stats['total'], 12)
+        self.assertEqual(stats['completed'], 6)
+        self.assertEqual(stats['cancelled'], 3)
+        self.assertEqual(stats['planned'], 3)
+        self.assertEqual(sum(stats['daily_distribution'].values()), 12)
+        self.assertEqual(len(stats['daily_distribution']), 4)
+
+    def test_lab_test_stats_single_query(self):
+        with self.assertNumQueries(1):
+            stats = self.analytics.get_lab_test_stats()
+        self.assertEqual(stats['total_tests'], 6)
+        self.assertEqual(stats['completed_tests'], 4)
+        self.assertEqual(stats['pending_tests'], 2)
+        self.assertEqual(sum(test['count'] for test in stats['popular_tests']), 6)
+
+    def test_doctor_performance_single_query(self):
+        with self.assertNumQueries(1):
+            stats = self.analytics.get_doctor_performance()
+        self.assertEqual(stats['total_appointments'], 12)
+        self.assertEqual(stats['completed_appointments'], 6)
+        self.assertEqual(stats['total_treatments'], 6)
+
+    def test_treatment_stats_queries(self):
+        with self.assertNumQueries(2):
+            stats = self.analytics.get_treatment_stats()
+        self.assertEqual(stats['total_treatments'], 6)
+        self.assertEqual(stats['prescriptions_count'], 6)
+        self.assertEqual(stats['common_diagnoses'], [{'diagnosis': 'Flu', 'count': 6}])
+
+    def test_monthly_trends_single_query(self):
+        with self.assertNumQueries(1):
+            trends = self.analytics.get_monthly_trends()
+        self.assertEqual(len(trends), 6)
+        self.assertEqual(trends[-1]['month'], timezone.localdate().strftime('%B %Y'))
+        self.assertEqual(sum(month['appointments'] for month in trends), 12)
+        self.assertEqual(sum(month['treatments'] for month in trends), 6)
+
+
+class TimeSeriesTest(TestCase):
+    """
+    Buckets are dense and zero-filled across month and year boundaries
+    """
+
+    def test_month_buckets_cross_year(self):
+        self.assertEqual(
+            bucket_starts('month', 3, end=date(2026, 2, 14)),
+            [date(2025, 12, 1), date(2026, 1, 1), date(2026, 2, 1)],
+        )
+
+    def test_daily_series_zero_filled(self):
+        User.objects.create_user(username='series_user', password='x')
+        with self.assertNumQueries(1):
+            series = time_series(User.objects.all(), 'date_joined', period='day', periods=7)
+        self.assertEqual(len(series), 7)
+        self.assertEqual([bucket['count'] for bucket in series], [0] * 6 + [1])
+
+
+class StatisticsRollupTest(TestCase):
+    """
+    Rollups match the raw tables and pick up changes to past days
+    """
+
+    def setUp(self):
+        self.doctor = User.objects.create_user(username='rollup_doctor', password='x', user_type='doctor')
+        self.patient = User.objects.create_user(username='rollup_patient', password='x', user_type='patient')
+        today = timezone.localdate()
+        self.appointments = [
+            Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=today - timedelta(days=offset),
+                                       time=time(10), status='planned')
+            for offset in (0, 3, 10)
+        ]
+        Treatment.objects.create(appointment=self.appointments[0], diagnosis='Flu')
+
+    def test_overview_matches_raw_tables(self):
+        # First run covers every day since the earliest appointment
+        self.assertEqual(rollup_statistics(), 11)
+        overview = system_overview()
+        self.assertEqual(overview['total_appointments'], 3)
+        self.assertEqual(overview['appointments_this_week'], 2)
+        self.assertEqual(overview['total_treatments'], 1)
+        self.assertEqual(overview['users_by_type']['doctor'], 1)
+        self.assertEqual(overview['users_by_type']['patient'], 1)
+
+        summary = doctor_performance_summary(self.doctor, [('week', 7), ('month', 30)])
+        self.assertEqual(summary['week']['total_appointments'], 2)
+        self.assertEqual(summary['month']['total_appointments'], 3)
+        self.assertEqual(summary['month']['total_treatments'], 1)
+
+    def test_incremental_run_reprocesses_changed_days(self):
+        rollup_statistics()
+        old_appointment = self.appointments[2]
+        old_appointment.status = 'completed'
+        old_appointment.save()
+
+        # Today plus the changed appointment's day
+        self.assertEqual(rollup_statistics(), 2)
+        self.assertEqual(system_overview()['completed_appointments'], 1)
+        metric = DoctorPerformanceMetric.objects.get(doctor=self.doctor, date=old_appointment.date)
+        self.assertEqual(metric.efficiency_score, 100.0)
+
+    def test_moved_and_deleted_appointments_clear_their_old_day(self):
+        rollup_statistics()
+        today = timezone.localdate()
+        moved, deleted = self.appointments[1], self.appointments[2]
+        old_day = moved.date
+        moved.date = today - timedelta(days=1)
+        moved.save()
+        deleted.delete()
+
+        rollup_statistics()
+        rows = dict(SystemStatistics.objects.values_list('date', 'total_appointments'))
+        self.assertEqual(rows[old_day], 0)
+        self.assertEqual(rows[moved.date], 1)
+        self.assertEqual(rows[today - timedelta(days=10)], 0)
+        self.assertEqual(system_overview()['total_appointments'], 2)
+        self.assertFalse(DoctorStatistics.objects.filter(date=old_day, appointment_count__gt=0).exists())
+
+    def test_page_load_without_broker_only_refreshes_today(self):
+        cache.clear()
+        with self.assertLogs('core.statistics', 'WARNING'):
+            ensure_statistics()
+        # History is left to the command or Celery beat
+        self.assertEqual(list(SystemStatistics.objects.values_list('date', flat=True)), [timezone.localdate()])
+        self.assertFalse(StatisticsRollup.objects.exists())
+        # Further loads within the refresh interval do no rollup work
+        with self.assertNumQueries(1):
+            ensure_statistics()
+
+    def test_overrunning_rollup_keeps_the_next_runs_lock(self):
+        cache.clear()
+        lock_key = 'statistics_rollup:lock'
+        self.addCleanup(cache.delete, lock_key)
+        rollup_doctors = statistics._rollup_doctors
+
+        def overrun(days):
+            # ROLLUP_LOCK_TIMEOUT passes mid-run and another run takes the lock
+            cache.delete(lock_key)
+            self.assertTrue(cache.add(lock_key, 'next-run'))
+            rollup_doctors(days)
+
+        with mock.patch('core.statistics._rollup_doctors', side_effect=overrun):
+            self.assertIsNotNone(rollup_statistics())
+        self.assertEqual(cache.get(lock_key), 'next-run')
+        self.assertIsNone(rollup_statistics())
+        self.assertFalse(refresh_today())
+
+
+class DailyActiveUsersTest(TestCase):
+    """
+    Logins land in the day's bitmap once; windows are unions of days
+    """
+
+    def test_login_records_activity_once(self):
+        user = User.objects.create_user(username='dau_user', password='secret-pass')
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        track_user_login(sender=User, request=request, user=user)
+        track_user_login(sender=User, request=request, user=user)
+        row = DailyActiveUsers.objects.get(date=timezone.localdate())
+        self.assertEqual(row.user_count, 1)
+        self.assertFalse(record_activity(user.pk))
+
+    def test_window_counts_distinct_users(self):
+        today = timezone.localdate()
+        for offset, user_ids in ((0, [1, 2]), (1, [2, 3]), (8, [4])):
+            for user_id in user_ids:
+                record_activity(user_id, today - timedelta(days=offset))
+        with self.assertNumQueries(1):
+            self.assertEqual(active_user_count(today - timedelta(days=6), today), 3)
+        self.assertEqual(active_user_count(today - timedelta(days=29), today), 4)
+
+
+class DashboardCacheTest(TestCase):
+    """
+    Cached dashboard sections are rebuilt after the owner's data changes
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create_user(username='cache_doctor', password='x', user_type='doctor')
+        self.patient = User.objects.create_user(username='cache_patient', password='x', user_type='patient')
+
+    def build(self):
+        return {'count': Appointment.objects.filter(patient=self.patient).count()}
+
+    def test_appointment_change_invalidates_patient_section(self):
+        self.assertEqual(get_section(self.patient, 'patient_appointments', self.build)['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(doctor=self.doctor, patient=self.patient,
+                                       date=timezone.localdate(), time=time(9))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_section(self.patient, 'patient_appointments', self.build)['count'], 1)
+        with self.assertNumQueries(0):
+            get_section(self.patient, 'patient_appointments', self.build)
+
+    def test_receptionist_dashboard_renders_cached_lists(self):
+        receptionist = User.objects.create_user(username='cache_receptionist', password='x',
+                                                user_type='receptionist')
+        User.objects.create_user(username='cache_patient_2', password='x', user_type='patient')
+        request = RequestFactory().get(reverse('dashboard'))
+        request.user = receptionist
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        for _ in range(2):  # built, then served from the cache
+            content = dashboard(request).content.decode()
+            self.assertInHTML('<div class="fs-4 fw-bold">2</div>', content)
+
+
+class CohortTest(TestCase):
+    """
+    SQL age bands agree with the exact age and each doctor costs nothing extra
+    """
+
+    def setUp(self):
+        self.today = date(2024, 2, 29)
+        self.doctors = [
+            User.objects.create_user(username=f'cohort_doctor{i}', password='x', user_type='doctor')
+            for i in range(2)
+        ]
+        births = [date(2005, 3, 1), date(2005, 2, 28), date(1963, 3, 1), None]
+        genders = ['F', 'M', 'F', None]
+        for i, (born, gender) in enumerate(zip(births, genders)):
+            patient = User.objects.create_user(username=f'cohort_patient{i}', password='x', user_type='patient',
+                                               date_of_birth=born, gender=gender)
+            for doctor in self.doctors[:1 + i % 2]:
+                # Repeat visits must not count the patient twice
+                for day in (1, 2):
+                    Appointment.objects.create(doctor=doctor, patient=patient, date=date(2024, 1, day), time=time(9))
+            MedicalHistory.objects.create(patient=patient, condition_type='chronic',
+                                          condition_name='Diabetes' if i % 2 else 'diabetes', is_active=True)
+
+    def test_age_boundaries(self):
+        self.assertEqual(age_band(age_on(date(2005, 3, 1), self.today)), '0-18')
+        self.assertEqual(age_band(age_on(date(2005, 2, 28), self.today)), '19-30')
+        self.assertEqual(age_band(age_on(date(1963, 3, 1), self.today)), '46-60')
+        self.assertEqual(age_band(None), 'unknown')
+
+    def test_breakdown_per_doctor(self):
+        ids = [doctor.pk for doctor in self.doctors]
+        with self.assertNumQueries(2):
+            cohorts = doctor_cohorts(ids, today=self.today)
+        first, second = cohorts[ids[0]], cohorts[ids[1]]
+        self.assertEqual(first['total_patients'], 4)
+        self.assertEqual(first['age_bands'], {'0-18': 1, '19-30': 1, '31-45': 0, '46-60': 1, '60+': 0, 'unknown': 1})
+        self.assertEqual(first['genders'], {'M': 1, 'F': 2, 'O': 0, 'unknown': 1})
+        self.assertEqual(first['conditions'], [{'condition': 'diabetes', 'patients': 4, 'share': 100.0}])
+        self.assertEqual(second['total_patients'], 2)
+        self.assertEqual(second['age_bands']['19-30'], 1)
+        self.assertEqual(second['genders']['unknown'], 1)
+
+
+class ReportPipelineTest(TestCase):
+    """
+    Requested reports are written to a file with progress recorded on the row
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.doctor = User.objects.create_user(username='report_doctor', password='x', user_type='doctor')
+        patient = User.objects.create_user(username='report_patient', password='x', user_type='patient',
+                                           first_name='Ada')
+        today = timezone.localdate()
+        for offset in range(3):
+            appointment = Appointment.objects.create(doctor=self.doctor, patient=patient,
+                                                     date=today - timedelta(days=offset), time=time(9))
+        Treatment.objects.create(appointment=appointment, diagnosis='Flu')
+
+    def request(self, file_format):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = request_report(self.doctor, 'doctor_summary', {'doctor_id': self.doctor.pk}, file_format)
+        generate_pending_reports()
+        report.refresh_from_db()
+        return report
+
+    def test_left_pending_without_broker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = request_report(self.doctor, 'doctor_summary', {'doctor_id': self.doctor.pk}, 'csv')
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'pending')
+        self.assertFalse(report.report_file)
+
+        GeneratedReport.objects.filter(pk=report.pk).update(status='running')
+        self.assertEqual(generate_pending_reports(), 0)  # claimed by another worker
+        GeneratedReport.objects.filter(pk=report.pk).update(status='pending')
+        self.assertEqual(generate_pending_reports(), 1)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'completed')
+
+    def test_xlsx_report(self):
+        report = self.request('xlsx')
+        self.assertEqual((report.status, report.progress, report.row_count), ('completed', 100, 3))
+        rows = list(load_workbook(report.report_file.path, read_only=True).active.values)
+        self.assertEqual(rows[0][:3], ('Date', 'Time', 'Patient first name'))
+        self.assertEqual(rows[1][2], 'Ada')
+        self.assertEqual(rows[1][5], 'Flu')
+
+    def test_csv_report(self):
+        report = self.request('csv')
+        with report.report_file.open('rb') as handle:
+            rows = list(csv.reader(io.TextIOWrapper(handle, encoding='utf-8')))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0][4], 'Status')
+
+    def test_status_flags_reports_waiting_for_the_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = request_report(self.doctor, 'doctor_summary', {'doctor_id': self.doctor.pk}, 'csv')
+        request = RequestFactory().get(reverse('core:report-status', args=[report.pk]))
+        request.user = self.doctor
+        self.assertTrue(json.loads(report_status_api(request, report.pk).content)['awaiting_worker'])
+        with self.settings(CELERY_BROKER_URL='redis://broker:6379/0'):
+            self.assertFalse(json.loads(report_status_api(request, report.pk).content)['awaiting_worker'])
+
+    def test_failure_is_recorded(self):
+        with self.assertLogs('core.reports', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                report = request_report(self.doctor, 'patient_health_summary', {'patient_id': self.doctor.pk}, 'csv')
+            generate_pending_reports()
+            report.refresh_from_db()
+            self.assertEqual(report.status, 'failed')
+            self.assertTrue(report.error_message)
+            with self.assertRaises(User.DoesNotExist):
+                generate_report(report.pk)
+
+
+@override_settings(ANALYTICS_SETTINGS=dict(settings.ANALYTICS_SETTINGS, CACHE_EARLY_RECOMPUTE_BETA=0))
+class AnalyticsCacheTest(TestCase):
+    """
+    Expired entries are rebuilt by one worker while the others serve the old value
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def expire(self, key):
+        entry = cache.get(key)
+        entry['expires_at'] = 0
+        cache.set(key, entry)
+
+    def test_miss_then_hit(self):
+        self.assertEqual(get_or_build('test', 'k', self.build), 1)
+        self.assertEqual(get_or_build('test', 'k', self.build), 1)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(cache_stats('test'), {'hits': 1, 'misses': 1, 'stale': 0, 'rebuilds': 1, 'waits': 0})
+
+    def test_stale_value_served_during_rebuild(self):
+        get_or_build('test', 'k', self.build)
+        self.expire('analytics_cache:test:k')
+
+        # Another worker holds the rebuild lock
+        cache.add('analytics_cache:test:k:lock', 1)
+        self.assertEqual(get_or_build('test', 'k', self.build), 1)
+        self.assertEqual(self.builds, 1)
+
+        cache.delete('analytics_cache:test:k:lock')
+        self.assertEqual(get_or_build('test', 'k', self.build), 2)
+        self.assertEqual(get_or_build('test', 'k', self.build), 2)
+        self.assertEqual(cache_stats('test'), {'hits': 1, 'misses': 1, 'stale': 1, 'rebuilds': 2, 'waits': 0})
+
+    def test_expired_lock_is_not_released_by_its_old_owner(self):
+        lock_key = 'analytics_cache:test:k:lock'
+
+        def slow_build():
+            # The lock times out mid-build and a second worker takes it
+            cache.delete(lock_key)
+            self.assertTrue(cache.add(lock_key, 'second-worker'))
+            return self.build()
+
+        get_or_build('test', 'k', slow_build)
+        self.assertEqual(cache.get(lock_key), 'second-worker')
+
+        # A third worker still sees the rebuild in progress and serves the stale value
+        self.expire('analytics_cache:test:k')
+        self.assertEqual(get_or_build('test', 'k', self.build), 1)
+        self.assertEqual(self.builds, 1)
+
+
+@mock.patch('core.db_router.replica_healthy', return_value=True)
+class ReplicaRouterTest(TestCase):
+    """
+    Only reads inside use_replica() reach the replica, and never after a write
+    """
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_outside_scope_use_primary(self, healthy):
+        self.assertEqual(self.router.db_for_read(Appointment), 'default')
+
+    def test_write_pins_scope_to_primary(self, healthy):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Appointment), 'replica')
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Appointment), 'default')
+            self.assertEqual(self.router.db_for_read(Appointment), 'replica')
+            self.router.db_for_write(Appointment)
+            self.assertEqual(self.router.db_for_read(Appointment), 'default')
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Appointment), 'replica')
+
+    def test_unhealthy_replica_falls_back(self, healthy):
+        healthy.return_value = False
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Appointment), 'default')
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationCounterTest(TestCase):
+    """
+    Unread counts follow creates, reads and deletes without counting rows
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='counter_user', password='x', user_type='patient')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def notify(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return CommunicationNotification.objects.create(
+                user=self.user, notification_type='system', title='Hello', message='World', **kwargs
+            )
+
+    def test_processor_served_from_cache(self):
+        self.notify()
+        notifications_processor(self.request)
+        with self.assertNumQueries(0):
+            context = notifications_processor(self.request)
+        self.assertEqual(context['unread_notifications_count'], 1)
+        self.assertEqual(len(context['recent_notifications']), 1)
+
+    def test_counts_follow_changes(self):
+        self.assertEqual(unread_counts(self.user.pk)['communication_notifications'], 0)
+        first = self.notify()
+        self.notify()
+        self.notify(is_read=True)
+        self.assertEqual(unread_counts(self.user.pk)['communication_notifications'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.mark_as_read()
+            first.mark_as_read()
+        self.assertEqual(unread_counts(self.user.pk)['communication_notifications'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CommunicationNotification.objects.filter(is_read=False).delete()
+            Notification.objects.create(recipient=self.user, notification_type='system_maintenance',
+                                        title='Down', message='Tonight')
+        self.assertEqual(unread_counts(self.user.pk), {'notifications': 1, 'communication_notifications': 0})
+
+
+class ThemePreferenceTest(TestCase):
+    """
+    Page renders take the theme from the session, never the database
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='theme_user', password='x', user_type='patient')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = SessionStore()
+        track_user_login(sender=User, request=self.request, user=self.user)
+
+    def test_base_template_queries(self):
+        render_to_string('core/base.html', request=self.request)
+        with self.assertNumQueries(0):
+            render_to_string('core/base.html', request=self.request)
+        self.assertFalse(UserThemePreference.objects.exists())
+
+    def test_row_created_on_edit(self):
+        update_preference(self.request, dark_mode=True)
+        self.assertTrue(UserThemePreference.objects.get(user=self.user).dark_mode)
+        render_to_string('core/base.html', request=self.request)
+        with self.assertNumQueries(0):
+            render_to_string('core/base.html', request=self.request)
+        self.assertTrue(self.request.session['theme_preference']['dark_mode'])
+
+    def test_profile_settings_refreshes_session(self):
+        request = RequestFactory().post(reverse('core:profile-settings'), {
+            'first_name': 'Theo', 'last_name': 'User', 'email': 'theo@example.com', 'theme': 'dark',
+        })
+        request.user = self.user
+        request.session = self.request.session
+        request._messages = FallbackStorage(request)
+        response = ProfileSettingsView.as_view()(request)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(request.session['theme_preference']['theme'], 'dark')
+        self.assertTrue(theme_processor(request)['dark_mode'])
+        self.assertTrue(UserThemePreference.objects.get(user=self.user).dark_mode)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationFanOutTest(TestCase):
+    """
+    One notification to many recipients costs a fixed number of queries
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.doctors = [
+            User.objects.create_user(username=f'fanout_doctor_{i}', password='x', user_type='doctor')
+            for i in range(5)
+        ]
+        User.objects.create_user(username='fanout_patient', password='x', user_type='patient')
+
+    def test_queries_do_not_grow_with_recipients(self):
+        # Seed the counters so the bulk update has rows to bump
+        for doctor in self.doctors:
+            unread_counts(doctor.pk)
+        template = {'notification_type': 'emergency_alert', 'title': 'Alert', 'message': 'Check patient'}
+        # values_list, savepoint pair, then notifications + logs + counters per chunk
+        with self.assertNumQueries(6), self.captureOnCommitCallbacks(execute=True):
+            created = fan_out(User.objects.filter(user_type='doctor'), template, priority='high')
+        self.assertEqual(created, 5)
+        self.assertEqual(Notification.objects.filter(priority='high').count(), 5)
+        self.assertEqual(NotificationLog.objects.filter(delivery_method='web', status='sent').count(), 5)
+        self.assertEqual(unread_counts(self.doctors[0].pk)['notifications'], 1)
+
+        with self.assertNumQueries(12):
+            fan_out(User.objects.filter(user_type='doctor'), template, chunk_size=2)
+        self.assertEqual(Notification.objects.count(), 10)
+
+    def test_template_and_communication_rows(self):
+        template = NotificationTemplate.objects.create(
+            notification_type='doctor_schedule_change',
+            title_template='Dr. {{ doctor }} changed hours',
+            message_template='New hours on {{ day }}',
+        )
+        created = fan_out_communication(
+            User.objects.filter(username__startswith='fanout_doctor'), template,
+            context={'doctor': 'Smith', 'day': 'Monday'}, notification_type='system',
+        )
+        self.assertEqual(created, 5)
+        notification = CommunicationNotification.objects.get(user=self.doctors[0])
+        self.assertEqual((notification.title, notification.message), ('Dr. Smith changed hours', 'New hours on Monday'))
+        self.assertEqual(unread_counts(self.doctors[0].pk)['communication_notifications'], 1)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationPushTest(TestCase):
+    """
+    New notifications reach the user's group on commit and reconnecting
+    clients catch up in one query
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='push_user', password='x', user_type='patient')
+
+    def notify(self, model=CommunicationNotification, **kwargs):
+        if model is Notification:
+            return Notification.objects.create(recipient=self.user, notification_type='system_maintenance',
+                                               title='Down', message='Tonight', **kwargs)
+        return CommunicationNotification.objects.create(user=self.user, notification_type='system',
+                                                        title='Hello', message='World', **kwargs)
+
+    def test_push_on_commit(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(group_name(self.user.pk), channel)
+        unread_counts(self.user.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            notification = self.notify()
+        # Nothing is pushed before the transaction commits
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+
+        events = [async_to_sync(layer.receive)(channel) for _ in range(2)]
+        self.assertEqual({event['type'] for event in events}, {'notification.new', 'notification.unread'})
+        new = next(event for event in events if event['type'] == 'notification.new')
+        self.assertEqual((new['notification']['id'], new['notification']['kind']), (notification.pk, 'communication'))
+
+    def test_fan_out_pushes_one_event_per_recipient(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(group_name(self.user.pk), channel)
+        for i in range(3):
+            User.objects.create_user(username=f'push_patient_{i}', password='x', user_type='patient')
+        patients = User.objects.filter(user_type='patient')
+        for patient in patients:
+            unread_counts(patient.pk)
+
+        template = {'notification_type': 'system', 'title': 'Hello', 'message': 'World'}
+        with mock.patch('core.notification_push.async_to_sync', wraps=async_to_sync) as hops:
+            with self.captureOnCommitCallbacks(execute=True):
+                fan_out_communication(patients, template, chunk_size=2)
+        # One event-loop hop per chunk, not per recipient
+        self.assertEqual(hops.call_count, 2)
+
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event['type'], 'notification.batch')
+        self.assertEqual((event['field'], event['delta']), ('communication_notifications', 1))
+        self.assertEqual([item['kind'] for item in event['notifications']], ['communication'])
+
+    def test_missed_notifications_single_query(self):
+        first = self.notify()
+        self.notify()
+        self.notify(model=Notification)
+        with self.assertNumQueries(1):
+            missed = missed_notifications(self.user.pk, last_notification_id=0, last_communication_id=first.pk)
+        self.assertEqual([item['kind'] for item in missed], ['communication', 'notification'])
+        self.assertEqual(missed[1]['priority'], 'normal')
+
+    def test_consumer_resume_and_push(self):
+        seen = self.notify()
+        missed = self.notify()
+
+        async def scenario():
+            communicator = ApplicationCommunicator(NotificationConsumer.as_asgi(), {
+                'type': 'websocket',
+                'path': '/ws/notifications/',
+                'query_string': f'last_communication_id={seen.pk}&last_notification_id=0'.encode(),
+                'headers': [],
+                'subprotocols': [],
+                'user': self.user,
+            })
+            await communicator.send_input({'type': 'websocket.connect'})
+            self.assertEqual((await communicator.receive_output(5))['type'], 'websocket.accept')
+            sync = json.loads((await communicator.receive_output(5))['text'])
+            self.assertEqual(sync['type'], 'sync')
+            self.assertEqual([item['id'] for item in sync['notifications']], [missed.pk])
+            self.assertEqual(sync['unread_counts']['communication_notifications'], 2)
+
+            await get_channel_layer().group_send(group_name(self.user.pk), {
+                'type': 'notification.unread', 'field': 'communication_notifications', 'delta': -1,
+            })
+            self.assertEqual(json.loads((await communicator.receive_output(5))['text'])['delta'], -1)
+
+            await get_channel_layer().group_send(group_name(self.user.pk), {
+                'type': 'notification.batch', 'notifications': sync['notifications'],
+                'field': 'communication_notifications', 'delta': 1,
+            })
+            self.assertEqual(json.loads((await communicator.receive_output(5))['text'])['type'], 'notification')
+            self.assertEqual(json.loads((await communicator.receive_output(5))['text'])['type'], 'unread_delta')
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(5)
+
+        async_to_sync(scenario)()
+
+
+class BouncingEmailBackend(LocmemEmailBackend):
+    """locmem backend that rejects addresses at bounce.test"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@bounce.test') for address in message.to):
+                raise ConnectionError('550 mailbox unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BatchedMailerTest(TestCase):
+    """
+    Reminder emails go out in batches over one connection, with every
+    outcome recorded on a NotificationLog
+    """
+
+    def setUp(self):
+        self.doctor = User.objects.create_user(username='mail_doctor', password='x', user_type='doctor')
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        for i, domain in enumerate(['example.com', 'example.com', 'bounce.test']):
+            patient = User.objects.create_user(username=f'mail_patient_{i}', password='x', user_type='patient',
+                                               email=f'patient{i}@{domain}')
+            Appointment.objects.create(doctor=self.doctor, patient=patient, date=tomorrow, time=time(9 + i),
+                                       status='planned')
+
+    def email_logs(self, **filters):
+        return NotificationLog.objects.filter(delivery_method='email', **filters)
+
+    def test_reminders_share_one_connection(self):
+        with mock.patch('core.mailer.get_connection', wraps=mail.get_connection) as get_connection:
+            call_command('send_appointment_reminders', stdout=io.StringIO())
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertTrue(all(message.subject.startswith('Laso Healthcare - Appointment Reminder') for message in mail.outbox))
+        self.assertEqual(self.email_logs(status='sent').count(), 3)
+        self.assertEqual(Notification.objects.filter(is_sent_via_email=True).count(), 3)
+        self.assertEqual(CommunicationNotification.objects.count(), 3)
+
+    def test_email_rows_stay_out_of_the_app(self):
+        patient = User.objects.get(username='mail_patient_0')
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(group_name(patient.pk), channel)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('send_appointment_reminders', stdout=io.StringIO())
+
+        self.assertFalse(NotificationLog.objects.filter(delivery_method='web', notification__isnull=False).exists())
+        self.assertEqual(unread_counts(patient.pk), {'notifications': 0, 'communication_notifications': 1})
+        self.assertEqual([item['kind'] for item in missed_notifications(patient.pk)], ['communication'])
+        # Only the in-app reminder is pushed
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual([item['kind'] for item in event['notifications']], ['communication'])
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(layer.receive(channel), 0.1)
+
+    @override_settings(EMAIL_BACKEND='core.tests.BouncingEmailBackend')
+    def test_failures_are_logged_and_retried(self):
+        with self.assertLogs('core.mailer', 'WARNING'):
+            call_command('send_appointment_reminders', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        failed = self.email_logs(status='failed').get()
+        self.assertIn('550', failed.error_message)
+
+        # Sent messages are not sent again; the failed one goes out once it is accepted
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            self.assertEqual(deliver(list(self.email_logs().values_list('pk', flat=True))), [])
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(self.email_logs(status='sent').count(), 3)
+
+    @override_settings(NOTIFICATION_SETTINGS={'EMAIL_RETRY_BACKOFF': 30, 'EMAIL_MAX_RETRIES': 3})
+    def test_retry_backoff(self):
+        self.assertEqual([retry_countdown(retries) for retries in range(4)], [30, 60, 120, None])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationDispatcherTest(TestCase):
+    """
+    Scheduled notifications stay hidden until the dispatcher delivers them,
+    exactly once
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='dispatch_user', password='x', user_type='patient',
+                                             email='dispatch@example.com')
+        self.now = timezone.now()
+
+    def schedule(self, minutes, **extra):
+        return Notification.objects.create(
+            recipient=self.user, notification_type='appointment_reminder', title='Soon', message='Appointment',
+            scheduled_for=self.now + timedelta(minutes=minutes), **extra
+        )
+
+    def test_due_rows_delivered_once(self):
+        self.schedule(-1)
+        later = self.schedule(60)
+        self.assertEqual(unread_counts(self.user.pk)['notifications'], 0)
+        self.assertEqual(missed_notifications(self.user.pk), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(dispatch_due(), 1)
+        self.assertEqual(unread_counts(self.user.pk)['notifications'], 1)
+        self.assertEqual(NotificationLog.objects.filter(delivery_method='web', status='sent').count(), 1)
+        self.assertEqual(dispatch_due(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delivered = claim_due(now=self.now + timedelta(hours=2))
+        self.assertEqual([notification.pk for notification in delivered], [later.pk])
+        self.assertEqual(unread_counts(self.user.pk)['notifications'], 2)
+
+    def test_email_channel(self):
+        self.schedule(-1, extra_data={'channels': ['web', 'email']})
+        dispatch_due()
+        self.assertEqual([message.to for message in mail.outbox], [['dispatch@example.com']])
+        self.assertTrue(Notification.objects.get().is_sent_via_email)
+
+    def test_medication_reminders_reschedule(self):
+        preference = NotificationPreference.objects.create(
+            user=self.user, medication_reminder_enabled=True, medication_reminder_times=['08:00', '20:00', 'noon']
+        )
+        pending = Notification.objects.filter(notification_type='medication_reminder').order_by('scheduled_for')
+        self.assertEqual(pending.count(), 2)
+
+        first = pending.first()
+        delivered = claim_due(now=first.scheduled_for)
+        self.assertEqual([notification.pk for notification in delivered], [first.pk])
+        upcoming = pending.filter(dispatched_at__isnull=True)
+        self.assertEqual(upcoming.count(), 2)
+        self.assertIn(first.scheduled_for + timedelta(days=1), list(upcoming.values_list('scheduled_for', flat=True)))
+
+        preference.medication_reminder_enabled = False
+        preference.save()
+        self.assertFalse(pending.filter(dispatched_at__isnull=True).exists())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationCoalescingTest(TestCase):
+    """
+    Schedule edits in a row leave one notification per patient, or one
+    digest entry for patients on the daily digest
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create_user(username='coalesce_doctor', password='x', user_type='doctor')
+        self.patients = [
+            User.objects.create_user(username=f'coalesce_patient_{i}', password='x', user_type='patient',
+                                     email=f'coalesce{i}@example.com')
+            for i in range(3)
+        ]
+        for patient in self.patients:
+            Appointment.objects.create(doctor=self.doctor, patient=patient, date=date(2024, 1, 1), time=time(9))
+
+    def edit_schedule(self, times=4, first_weekday=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            for weekday in range(first_weekday, first_weekday + times):
+                DoctorAvailability.objects.create(doctor=self.doctor, weekday=weekday,
+                                                  start_time=time(9), end_time=time(12))
+
+    def test_edits_merge_into_one_row(self):
+        self.edit_schedule()
+        rows = CommunicationNotification.objects.filter(user=self.patients[0])
+        self.assertEqual([row.occurrences for row in rows], [4])
+        self.assertIn('Thursday', rows[0].message)
+        self.assertEqual(unread_counts(self.patients[0].pk)['communication_notifications'], 1)
+
+        # Once read, the next change starts a new notification
+        rows[0].mark_as_read()
+        self.edit_schedule(times=1, first_weekday=5)
+        self.assertEqual(CommunicationNotification.objects.filter(user=self.patients[0]).count(), 2)
+
+    def test_window_and_sources_are_respected(self):
+        patients = User.objects.filter(pk=self.patients[0].pk)
+        template = {'notification_type': 'system', 'title': 'Changed', 'message': 'Check'}
+        notify_coalesced(patients, template, source_key='doctor_schedule:1')
+        notify_coalesced(patients, template, source_key='doctor_schedule:2')
+        self.assertEqual(notify_coalesced(patients, template, source_key='doctor_schedule:1', window=0), (1, 0, 0))
+        self.assertEqual(CommunicationNotification.objects.filter(user=self.patients[0]).count(), 3)
+
+    def test_daily_digest(self):
+        NotificationPreference.objects.create(user=self.patients[1], daily_digest=True, digest_time=time(7, 30))
+        self.edit_schedule()
+        self.assertFalse(CommunicationNotification.objects.filter(user=self.patients[1]).exists())
+        digest = Notification.objects.get(recipient=self.patients[1], notification_type='daily_digest')
+        self.assertTrue(digest.awaiting_dispatch)
+        self.assertEqual(timezone.localtime(digest.scheduled_for).time(), time(7, 30))
+        self.assertEqual(digest.extra_data['items'][0]['count'], 4)
+        self.assertIn('(4 updates)', digest.message)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_due(now=digest.scheduled_for)
+        self.assertEqual([message.to for message in mail.outbox], [['coalesce1@example.com']])
+        # The web list and badge read CommunicationNotification; the digest row only carries the email
+        shown = CommunicationNotification.objects.get(user=self.patients[1])
+        self.assertEqual((shown.title, shown.message), (digest.title, digest.message))
+        self.assertEqual(unread_counts(self.patients[1].pk), {'notifications': 0, 'communication_notifications': 1})
+        self.assertEqual([item['kind'] for item in missed_notifications(self.patients[1].pk)], ['communication'])
+        self.assertFalse(NotificationLog.objects.filter(notification=digest, delivery_method='web').exists())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class RetentionTest(TestCase):
+    """
+    Expired rows leave the hot tables through compressed archives and can
+    be restored from them; rows still in use are kept
+    """
+
+    def setUp(self):
+        self.archive_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_root)
+        retention = dict(settings.RETENTION_SETTINGS, ARCHIVE_DIR=self.archive_root, BATCH_SIZE=2)
+        override = override_settings(RETENTION_SETTINGS=retention)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username='retention_user', password='x', user_type='patient')
+        old = timezone.now() - timedelta(days=400)
+        notifications = [
+            Notification.objects.create(recipient=self.user, notification_type='system', title=f'Old {i}',
+                                        message='Archived', is_read=True)
+            for i in range(3)
+        ]
+        self.unread = Notification.objects.create(recipient=self.user, notification_type='system',
+                                                  title='Unread', message='Kept')
+        self.recent = Notification.objects.create(recipient=self.user, notification_type='system',
+                                                  title='Recent', message='Kept', is_read=True)
+        NotificationLog.objects.create(notification=notifications[0], delivery_method='web', status='sent')
+        Notification.objects.exclude(pk=self.recent.pk).update(created_at=old)
+        NotificationLog.objects.update(created_at=old)
+        LoginSession.objects.create(user=self.user, login_time=old, is_active=False)
+        LoginSession.objects.create(user=self.user, login_time=old, is_active=True)
+        self.archived_ids = [notification.pk for notification in notifications]
+
+    def test_archive_and_restore(self):
+        # The notification with a delivery log waits for the log to be archived first
+        self.assertEqual(apply_retention(['notifications'], dry_run=True), {'notifications': 2})
+        with self.assertLogs('core.retention', 'WARNING'):
+            results = apply_retention()
+        self.assertEqual(results['notification_logs'], 1)
+        self.assertEqual(results['notifications'], 3)
+        self.assertEqual(results['login_sessions'], 1)
+        self.assertEqual(results['security_audit_logs'], 0)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {self.unread.pk, self.recent.pk})
+        self.assertEqual(LoginSession.objects.filter(is_active=True).count(), 1)
+
+        files = archive_files(self.archive_root)
+        # Two batches of notifications, one of logs, one of sessions; notifications restore before their logs
+        self.assertEqual(len(files), 4)
+        policies = [path.split('/')[-2] for path in files]
+        self.assertLess(policies.index('notifications'), policies.index('notification_logs'))
+        self.assertTrue(all(path.endswith('.jsonl.gz') for path in files))
+
+        call_command('restore_archive', self.archive_root, stdout=io.StringIO())
+        self.assertTrue(set(self.archived_ids) <= set(Notification.objects.values_list('pk', flat=True)))
+        self.assertEqual(NotificationLog.objects.get().notification_id, self.archived_ids[0])
+        self.assertEqual(LoginSession.objects.count(), 2)
+
+        # Restoring twice leaves existing rows alone
+        call_command('restore_archive', self.archive_root, stdout=io.StringIO())
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_notification_waits_for_its_logs(self):
+        NotificationLog.objects.update(created_at=timezone.now())
+        apply_retention(['notifications'])
+        self.assertTrue(Notification.objects.filter(pk=self.archived_ids[0]).exists())
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class AIResponseCacheTest(TestCase):
+    """
+    Shared entries are only reused between users with the same coarse
+    context and never carry a response naming its user
+    """
+
+    def setUp(self):
+        self.response_cache = AIResponseCache()
+        self.response_cache.cache.clear()
+        self.config = SimpleNamespace(provider='openai', model_name='gpt-test')
+        self.alice = User.objects.create_user(username='cache_alice', password='x', user_type='patient',
+                                              first_name='Alice', last_name='Wonder')
+        self.bob = User.objects.create_user(username='cache_bob', password='x', user_type='patient')
+
+    def store(self, user, context, content='Drink plenty of water.'):
+        fingerprint = self.response_cache.context_fingerprint(user, context)
+        key = self.response_cache.make_key(self.config, 'What helps a cold?', fingerprint)
+        return key, self.response_cache.set(key, fingerprint, user, {'content': content, 'tokens_used': 5})
+
+    def lookup(self, user, context, message='what helps a COLD'):
+        fingerprint = self.response_cache.context_fingerprint(user, context)
+        return self.response_cache.get(self.response_cache.make_key(self.config, message, fingerprint))
+
+    def test_shared_between_matching_contexts(self):
+        context = {'user_type': 'patient', 'age': 34}
+        self.store(self.alice, context)
+        self.assertEqual(self.lookup(self.bob, {'user_type': 'patient', 'age': 37})['content'],
+                         'Drink plenty of water.')
+
+    def test_response_naming_the_user_is_not_shared(self):
+        context = {'user_type': 'patient', 'age': 34}
+        key, stored = self.store(self.alice, context, content='Alice, rest and drink plenty of water.')
+        self.assertFalse(stored)
+        self.assertIsNone(self.response_cache.cache.get(key))
+        self.assertIsNone(self.lookup(self.bob, context))
+
+    def test_other_age_band_or_user_type_misses(self):
+        self.store(self.alice, {'user_type': 'patient', 'age': 34})
+        self.assertIsNone(self.lookup(self.bob, {'user_type': 'patient', 'age': 45}))
+        self.assertIsNone(self.lookup(self.bob, {'user_type': 'patient', 'age': None}))
+        self.assertIsNone(self.lookup(self.bob, {'user_type': 'doctor', 'age': 34}))
+
+    def test_medical_history_partitions_per_user(self):
+        context = {'user_type': 'patient', 'age': 34, 'medical_history': [{'condition': 'asthma'}]}
+        self.store(self.alice, context)
+        self.assertIsNotNone(self.lookup(self.alice, context))
+        self.assertIsNone(self.lookup(self.bob, context))
+
+
+class ProviderThrottleTest(TestCase):
+    """
+    Token bucket refill, concurrency slots and queue timeouts of the
+    per-configuration AI provider throttle
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def throttle(self, rate=0, concurrent=0, queue_timeout=0):
+        config = SimpleNamespace(pk=1, requests_per_minute=rate, max_concurrent_requests=concurrent)
+        return ProviderThrottle(config, queue_timeout=queue_timeout)
+
+    def test_bucket_refills_over_time(self):
+        throttle = self.throttle(rate=60)
+        with mock.patch('core.ai_throttle.time.time', return_value=1000.0):
+            for _ in range(60):
+                self.assertEqual(throttle._take_token(), 0)
+            self.assertAlmostEqual(throttle._take_token(), 1.0)
+        # One token a second at 60 per minute
+        with mock.patch('core.ai_throttle.time.time', return_value=1002.5):
+            self.assertEqual(throttle._take_token(), 0)
+            self.assertEqual(throttle._take_token(), 0)
+            self.assertGreater(throttle._take_token(), 0)
+
+    def test_rate_limit_times_out(self):
+        throttle = self.throttle(rate=1)
+        with throttle.acquire():
+            pass
+        with self.assertRaises(ProviderBusyError) as raised:
+            with throttle.acquire():
+                pass
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+    def test_slot_exhaustion_times_out_and_returns_token(self):
+        throttle = self.throttle(rate=3, concurrent=1)
+        with throttle.acquire():
+            self.assertEqual(throttle.in_flight(), 1)
+            with self.assertRaises(ProviderBusyError):
+                with throttle.acquire():
+                    pass
+        self.assertEqual(throttle.in_flight(), 0)
+        # The timed-out caller gave its token back: two of three remain
+        self.assertAlmostEqual(cache.get(throttle.bucket_key)[0], 2, places=2)
+
+    def test_unlock_keeps_another_workers_lock(self):
+        throttle = self.throttle(rate=60)
+        owner = throttle._lock()
+        # Our lock expired and another worker took it
+        cache.set(throttle.lock_key, 'other-worker')
+        throttle._unlock(owner)
+        self.assertEqual(cache.get(throttle.lock_key), 'other-worker')
+
+
+class InteractionIndexTest(TestCase):
+    """
+    Drug interaction checks against the in-memory index, and who may check
+    a patient's active medications through the prescription API
+    """
+
+    def setUp(self):
+        cache.clear()
+        warfarin = Medication.objects.create(name='Coumadin', active_ingredient='Warfarin')
+        aspirin = Medication.objects.create(name='Aspirin', active_ingredient='Acetylsalicylic acid')
+        Medication.objects.create(name='Paracetamol', active_ingredient='Acetaminophen')
+        MedicationInteraction.objects.create(medication1=warfarin, medication2=aspirin, severity='severe',
+                                             description='Bleeding risk', recommendations='Avoid')
+        self.doctor = User.objects.create_user(username='interaction_doctor', password='x', user_type='doctor')
+        self.other_doctor = User.objects.create_user(username='interaction_other', password='x', user_type='doctor')
+        self.patient = User.objects.create_user(username='interaction_patient', password='x', user_type='patient')
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=date(2024, 1, 1), time=time(9))
+        MedicalHistory.objects.create(patient=self.patient, condition_type='medication',
+                                      condition_name='Warfarin', is_active=True)
+
+    def test_two_drug_check(self):
+        index = get_interaction_index()
+        # Names and active ingredients both resolve, in either order
+        interactions = index.check(['warfarin', 'ASPIRIN', 'Paracetamol'])
+        self.assertEqual(len(interactions), 1)
+        self.assertEqual(interactions[0]['severity'], 'severe')
+        self.assertEqual(index.check(['Acetylsalicylic acid', 'Coumadin'])[0]['description'], 'Bleeding risk')
+        self.assertEqual(index.check(['Aspirin', 'Paracetamol']), [])
+
+    def test_against_current_medications(self):
+        index = get_interaction_index()
+        interactions = index.check(['Aspirin', 'Paracetamol'], against=['Warfarin'])
+        self.assertEqual([(i['medication1'], i['medication2']) for i in interactions], [('Warfarin', 'Aspirin')])
+        # Medications in the new list are not checked against each other
+        self.assertEqual(index.check(['Aspirin', 'Coumadin'], against=['Paracetamol']), [])
+
+    def test_index_reloads_after_changes(self):
+        self.assertEqual(get_interaction_index().check(['Aspirin', 'Paracetamol']), [])
+        MedicationInteraction.objects.create(
+            medication1=Medication.objects.get(name='Aspirin'),
+            medication2=Medication.objects.get(name='Paracetamol'),
+            severity='mild', description='Minor', recommendations='Monitor')
+        self.assertEqual(len(get_interaction_index().check(['Aspirin', 'Paracetamol'])), 1)
+
+    def check_api(self, user, patient_id):
+        prefix = PrescriptionFormSet.get_default_prefix()
+        request = RequestFactory().post('/', {
+            f'{prefix}-TOTAL_FORMS': '1', f'{prefix}-INITIAL_FORMS': '0',
+            f'{prefix}-0-name': 'Aspirin', 'patient_id': str(patient_id),
+        })
+        request.user = user
+        return prescription_interaction_check_api(request)
+
+    def test_api_checks_patient_medications_for_their_doctor(self):
+        response = self.check_api(self.doctor, self.patient.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([i['medication1'] for i in json.loads(response.content)['interactions']], ['Warfarin'])
+
+    def test_api_hides_patient_medications_from_others(self):
+        self.assertEqual(self.check_api(self.other_doctor, self.patient.pk).status_code, 403)
+        self.assertEqual(self.check_api(self.patient, self.patient.pk).status_code, 403)
+        request = RequestFactory().get('/')
+        request.user = self.doctor
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(prescription_interaction_check_api(request).status_code, 405)
+
+
+class ConversationLogBufferTest(TestCase):
+    """
+    Buffered AI conversation records stay readable until written, keep the
+    time they were logged and are written when the buffer closes
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='conversation_user', password='x', user_type='patient')
+        self.buffer = ConversationLogBuffer()
+        # Flushes run in the test thread instead of the background writer
+        patcher = mock.patch.object(self.buffer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def log(self, message, **fields):
+        return self.buffer.log(user=self.user, session_id='s1', message=message, response='ok', **fields)
+
+    def test_records_wait_in_buffer(self):
+        logged_at = timezone.now() - timedelta(minutes=5)
+        self.assertIsNone(self.log('first', created_at=logged_at))
+        self.log('second')
+        self.assertFalse(AIConversation.objects.exists())
+        self.assertEqual([r['message'] for r in self.buffer.pending_for(self.user.pk, 's1')], ['first', 'second'])
+
+        with self.assertNumQueries(2):  # one INSERT, one UPDATE restoring the timestamps
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.pending_for(self.user.pk, 's1'), [])
+        self.assertEqual(AIConversation.objects.get(message='first').created_at, logged_at)
+        self.assertLess(AIConversation.objects.get(message='second').created_at, timezone.now())
+
+    def test_full_batch_wakes_the_writer(self):
+        with override_settings(AI_SETTINGS=dict(settings.AI_SETTINGS, CONVERSATION_LOG_BATCH_SIZE=2)):
+            self.log('one')
+            self.assertFalse(self.buffer._wakeup.is_set())
+            self.log('two')
+            self.assertTrue(self.buffer._wakeup.is_set())
+
+    def test_close_flushes_and_stops_buffering(self):
+        self.log('queued')
+        self.buffer.close()
+        self.assertTrue(AIConversation.objects.filter(message='queued').exists())
+        # After shutdown records are written straight away
+        self.assertIsNotNone(self.log('late'))
+        self.assertEqual(AIConversation.objects.count(), 2)
+
+
+class SymptomTriageTest(TestCase):
+    """
+    Malformed triage requests are answered with 400, never a server error
+    """
+
+    def setUp(self):
+        self.doctor = User.objects.create_user(username='triage_doctor', password='x', user_type='doctor')
+
+    def post(self, body):
+        request = RequestFactory().post(reverse('core:ai_symptom_triage'), body, content_type='application/json')
+        request.user = self.doctor
+        return ai_symptom_triage(request)
+
+    def test_rejects_bodies_that_are_not_objects(self):
+        for body in ('[]', '"x"', '3', 'null', '{'):
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(json.loads(response.content)['success'])
+
+    def test_rejects_complaints_that_are_not_strings(self):
+        response = self.post(json.dumps({'complaints': [1, 2]}))
+        self.assertEqual(response.status_code, 400)
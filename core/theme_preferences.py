@@ -0,0 +1,50 @@
+"""
+Theme Preference Resolution for Laso Healthcare
+The user's theme preference travels in the session, filled at login and on
+every change, so rendering a page never touches UserThemePreference. The
+database row is only created when the user actually edits the preference.
+"""
+from core.models_theme import UserThemePreference
+
+SESSION_KEY = 'theme_preference'
+
+FIELDS = ('dark_mode', 'theme', 'sidebar_mode')
+
+DEFAULTS = {
+    'dark_mode': False,
+    'theme': 'light',
+    'sidebar_mode': 'light',
+}
+
+
+def load_preference(user):
+    """Stored preference of ``user``, or the defaults; never creates a row"""
+    stored = UserThemePreference.objects.filter(user=user).values(*FIELDS).first()
+    return dict(DEFAULTS, **(stored or {}))
+
+
+def remember(request, preference):
+    request.session[SESSION_KEY] = preference
+
+
+def get_preference(request):
+    """
+    The current user's preference from the session; sessions started before
+    it was stored there are filled once from the database
+    """
+    preference = request.session.get(SESSION_KEY)
+    if preference is None:
+        preference = load_preference(request.user)
+        remember(request, preference)
+    return preference
+
+
+def update_preference(request, **changes):
+    """Save changed fields, creating the row on the first edit"""
+    theme_preference, created = UserThemePreference.objects.get_or_create(user=request.user)
+    for field, value in changes.items():
+        setattr(theme_preference, field, value)
+    theme_preference.save()
+    preference = {field: getattr(theme_preference, field) for field in FIELDS}
+    remember(request, preference)
+    return preference
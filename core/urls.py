@@ -12,7 +12,8 @@ from .views_theme import toggle_theme, get_theme_preference
 from .views_dashboard import (
     EnhancedDashboardView, DoctorPerformanceView, SystemReportsView,
     dashboard_analytics_api, patient_health_summary_api, recent_activity,
-    export_analytics, enhanced_vitals_dashboard
+    export_analytics, enhanced_vitals_dashboard, doctor_cohort_api,
+    request_report_api, report_status_api, report_download
 )
 
 app_name = 'core'
@@ -26,8 +27,12 @@ urlpatterns = [
     # Dashboard API endpoints
     path('dashboard/api/analytics/', dashboard_analytics_api, name='dashboard-analytics-api'),
     path('dashboard/api/patient/<int:patient_id>/health-summary/', patient_health_summary_api, name='patient-health-summary-api'),
+    path('dashboard/api/cohorts/', doctor_cohort_api, name='doctor-cohort-api'),
     path('dashboard/api/recent-activity/', recent_activity, name='recent_activity'),
     path('dashboard/api/export-analytics/', export_analytics, name='export_analytics'),
+    path('dashboard/api/reports/', request_report_api, name='report-request'),
+    path('dashboard/api/reports/<int:report_id>/', report_status_api, name='report-status'),
+    path('dashboard/api/reports/<int:report_id>/download/', report_download, name='report-download'),
     
     # Enhanced Vitals Dashboard
     path('vitals/enhanced/', enhanced_vitals_dashboard, name='enhanced-vitals'),
@@ -79,6 +84,7 @@ urlpatterns = [
     # AI Assistant
     path('ai-assistant/', views.ai_assistant, name='ai_assistant'),
     path('ai-chat/', views.ai_chat, name='ai_chat'),
+    path('ai-symptom-triage/', views.ai_symptom_triage, name='ai_symptom_triage'),
     
     # Profile Settings
     path('profile/settings/', views.ProfileSettingsView.as_view(), name='profile-settings'),
@@ -7,6 +7,7 @@ from django.utils import timezone
 from datetime import timedelta
 
 from core.models_communication import CommunicationNotification
+from core.notification_coalescing import notify_coalesced
 from appointments.models_availability import DoctorAvailability, DoctorTimeOff
 from users.models import User
 
@@ -51,7 +52,7 @@ def create_availability_change_notification(doctor, operation_type, day=None, st
     patients = User.objects.filter(
         user_type='patient',
         patient_appointments__doctor=doctor
-    ).distinct()
+    )
     
     # Create notification title and message based on the operation type
     if operation_type == 'added':
@@ -85,15 +86,13 @@ def create_availability_change_notification(doctor, operation_type, day=None, st
     # Create related URL (doctor calendar)
     related_url = reverse('doctor-calendar', kwargs={'doctor_id': doctor.id})
     
-    # Create a notification for each patient
-    for patient in patients:
-        create_notification(
-            user=patient,
-            notification_type='system',
-            title=title,
-            message=message,
-            related_url=related_url
-        )
+    # Notify all patients in bulk; repeated edits update the same notification
+    notify_coalesced(patients, {
+        'notification_type': 'system',
+        'title': title,
+        'message': message,
+        'related_url': related_url,
+    }, source_key=f'doctor_schedule:{doctor.id}')
 
 
 # Signal receivers
@@ -148,9 +147,9 @@ def doctor_timeoff_deleted(sender, instance, **kwargs):
     )
 
 
-def send_appointment_reminder_email(appointment):
+def appointment_reminder_email(appointment):
     """
-    Sends an appointment reminder email
+    Returns the subject and body of an appointment reminder email
     """
     subject = f'Laso Healthcare - Appointment Reminder: {appointment.date.strftime("%d.%m.%Y")}'
     
@@ -170,6 +169,15 @@ Sincerely,
 Laso Healthcare Health System
 """
     
+    return subject, message
+
+
+def send_appointment_reminder_email(appointment):
+    """
+    Sends an appointment reminder email
+    """
+    subject, message = appointment_reminder_email(appointment)
+    
     send_mail(
         subject,
         message,
@@ -6,7 +6,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
 from django.views.generic import CreateView, UpdateView, ListView, DetailView, DeleteView, TemplateView
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q, Avg, Max, Min
+from django.db.models import Q, Avg, Max, Min, Count
 from django.utils import timezone
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -24,6 +24,8 @@ from treatments.models import Treatment, Prescription
 from treatments.models_vitals import VitalSign, VitalSignAlert
 from telemedicine.models import MessageThread, DoctorPatientMessage, TeleMedicineConsultation
 from .analytics import DashboardAnalytics
+from .cohorts import AGE_BANDS, demographics
+from .dashboard_cache import get_section
 
 User = get_user_model()
 
@@ -47,219 +49,57 @@ def dashboard(request):
     
     try:
         if user.is_patient():
-            # Patient dashboard
-            upcoming_appointments = Appointment.objects.filter(
-                patient=user,
-                date__gte=timezone.now().date(),
-                status='planned'
-            ).order_by('date', 'time')
-            
-            recent_treatments = Treatment.objects.filter(
-                appointment__in=Appointment.objects.filter(patient=user)
-            ).order_by('-created_at')[:5]
-            
-            # Vitals data
-            latest_vital = VitalSign.objects.filter(patient=user).first()
-            thirty_days_ago = timezone.now() - timedelta(days=30)
-            recent_vitals = VitalSign.objects.filter(
-                patient=user,
-                recorded_at__gte=thirty_days_ago
-            ).order_by('-recorded_at')[:10]
-            
-            # Calculate vitals statistics
-            vitals_stats = recent_vitals.aggregate(
-                avg_systolic=Avg('systolic_bp'),
-                avg_diastolic=Avg('diastolic_bp'),
-                avg_heart_rate=Avg('heart_rate'),
-                max_systolic=Max('systolic_bp'),
-                min_systolic=Min('systolic_bp'),
-            )
-            
-            # Get active vitals alerts
-            active_alerts = VitalSignAlert.objects.filter(
-                vital_sign__patient=user,
-                status='active'
-            ).order_by('-created_at')
-            
-            # Prepare chart data for vitals
-            chart_data = {
-                'dates': [v.recorded_at.strftime('%Y-%m-%d') for v in recent_vitals],
-                'systolic': [v.systolic_bp for v in recent_vitals],
-                'diastolic': [v.diastolic_bp for v in recent_vitals],
-                'heart_rate': [v.heart_rate for v in recent_vitals],
-            }
-            
-            # Enhanced vitals data for the new design
-            vitals_enhanced_data = {}
-            if latest_vital:
-                vitals_enhanced_data = {
-                    'risk_percentage': latest_vital.get_risk_percentage(),
-                    'health_assessment_message': latest_vital.get_health_assessment_message(),
-                    'risk_trend': latest_vital.get_risk_trend(),
-                    'risk_level': latest_vital.calculate_risk_level(),
-                    'assessment_date': latest_vital.recorded_at.strftime('%B %d, %Y'),
-                }
-            
-            # Messaging data
-            message_threads = MessageThread.objects.filter(
-                patient=user,
-                is_active=True
-            ).select_related('doctor')
-            
-            # Get unread message count
-            total_unread_messages = sum(thread.patient_unread_count for thread in message_threads)
-            
-            # Active consultations
-            active_consultations = TeleMedicineConsultation.objects.filter(
-                appointment__patient=user,
-                status='in_progress'
-            ).count()
-            
-            context.update({
-                'upcoming_appointments': upcoming_appointments,
-                'recent_treatments': recent_treatments,
-                # Vitals data
-                'latest_vital': latest_vital,
-                'recent_vitals': recent_vitals,
-                'vitals_stats': vitals_stats,
-                'active_alerts': active_alerts,
-                'chart_data': chart_data,
-                'vitals_enhanced_data': vitals_enhanced_data,
-                # Messaging data
-                'message_threads': message_threads,
-                'total_unread_messages': total_unread_messages,
-                'active_consultations': active_consultations,
-            })
+            # Patient dashboard, cached per section (see core.dashboard_cache)
+            context.update(get_section(user, 'patient_appointments', lambda: {
+                'upcoming_appointments': list(Appointment.objects.filter(
+                    patient=user,
+                    date__gte=timezone.now().date(),
+                    status='planned'
+                ).select_related('doctor').order_by('date', 'time')),
+            }))
+            context.update(get_section(user, 'patient_treatments', lambda: {
+                'recent_treatments': list(Treatment.objects.filter(
+                    appointment__patient=user
+                ).select_related('appointment__doctor').order_by('-created_at')[:5]),
+            }))
+            context.update(get_section(user, 'patient_vitals', lambda: build_patient_vitals(user)))
+            context.update(get_section(user, 'patient_messages', lambda: build_patient_messages(user)))
+            context.update(get_section(user, 'patient_consultations', lambda: {
+                # Active consultations
+                'active_consultations': TeleMedicineConsultation.objects.filter(
+                    appointment__patient=user,
+                    status='in_progress'
+                ).count(),
+            }))
             return render(request, 'core/patient_dashboard.html', context)
     
         elif user.is_doctor():
-            # Doctor dashboard
-            today_appointments = Appointment.objects.filter(
-                doctor=user,
-                date=timezone.now().date(),
-                status='planned'
-            ).order_by('time')
-            
-            upcoming_appointments = Appointment.objects.filter(
-                doctor=user,
-                date__gt=timezone.now().date(),
-                status='planned'
-            ).order_by('date', 'time')[:5]
-            
-            recent_treatments = Treatment.objects.filter(
-                appointment__in=Appointment.objects.filter(doctor=user)
-            ).order_by('-created_at')[:5]
-            
-            # Total patient count
-            # Get all appointments for this doctor
-            doctor_appointments = Appointment.objects.filter(doctor=user)
-            # Then get all patients from those appointments
-            total_patients = User.objects.filter(
-                user_type='patient',
-                patient_appointments__in=doctor_appointments
-            ).distinct().count()
-            
-            # Total treatment count
-            total_treatments = Treatment.objects.filter(
-                appointment__in=doctor_appointments
-            ).count()
-            
-            # Weekly appointment statistics
-            week_start = timezone.now().date() - timedelta(days=timezone.now().weekday())
-            weekly_appointments = []
-            
-            for i in range(7):
-                day = week_start + timedelta(days=i)
-                count = Appointment.objects.filter(doctor=user, date=day).count()
-                weekly_appointments.append(count)
-            
-            # Patient age demographics
-            from django.db.models import Count, Case, When, IntegerField
-            from datetime import date
-            
-            age_demographics = [0, 0, 0, 0, 0]  # 0-18, 19-30, 31-45, 46-60, 60+
-            
-            # Get all patients who have appointments with this doctor
-            doctor_appointments = Appointment.objects.filter(doctor=user)
-            patients = User.objects.filter(
-                user_type='patient',
-                patient_appointments__in=doctor_appointments,
-                date_of_birth__isnull=False
-            ).distinct()
-            
-            for patient in patients:
-                age = (date.today() - patient.date_of_birth).days // 365
-                if age <= 18:
-                    age_demographics[0] += 1
-                elif age <= 30:
-                    age_demographics[1] += 1
-                elif age <= 45:
-                    age_demographics[2] += 1
-                elif age <= 60:
-                    age_demographics[3] += 1
-                else:
-                    age_demographics[4] += 1
-            
-            # Most common diagnoses
-            from django.db.models import Count
-            doctor_appointments = Appointment.objects.filter(doctor=user)
-            common_diagnoses_data = Treatment.objects.filter(
-                appointment__in=doctor_appointments
-            ).values('diagnosis').annotate(
-                count=Count('diagnosis')
-            ).order_by('-count')[:5]
-            
-            common_diagnoses = []
-            for item in common_diagnoses_data:
-                diagnosis = item['diagnosis']
-                if len(diagnosis) > 20:
-                    diagnosis = diagnosis[:20] + "..."
-                common_diagnoses.append({
-                    'name': diagnosis,
-                    'count': item['count']
-                })
-            
-            context.update({
-                'today_appointments': today_appointments,
-                'upcoming_appointments': upcoming_appointments,
-                'recent_treatments': recent_treatments,
-                'total_patients': total_patients,
-                'total_treatments': total_treatments,
-                'weekly_appointments': weekly_appointments,
-                'age_demographics': age_demographics,
-                'common_diagnoses': common_diagnoses,
-            })
+            # Doctor dashboard, cached per section (see core.dashboard_cache)
+            context.update(get_section(user, 'doctor_appointments', lambda: build_doctor_appointments(user)))
+            context.update(get_section(user, 'doctor_treatments', lambda: build_doctor_treatments(user)))
+            context.update(get_section(user, 'doctor_patients', lambda: build_doctor_patients(user)))
             return render(request, 'core/doctor_dashboard.html', context)
         
         elif user.is_receptionist():
             # Receptionist dashboard
-            today_appointments = Appointment.objects.filter(
-                date=timezone.now().date()
-            ).order_by('time')
-            
-            recent_patients = User.objects.filter(
-                user_type='patient'
-            ).order_by('-date_joined')[:5]
-            
-            context.update({
-                'today_appointments': today_appointments,
-                'recent_patients': recent_patients,
-            })
+            context.update(get_section(user, 'receptionist_overview', lambda: {
+                'today_appointments': list(Appointment.objects.filter(
+                    date=timezone.now().date()
+                ).select_related('patient', 'doctor').order_by('time')),
+                'recent_patients': list(User.objects.filter(
+                    user_type='patient'
+                ).order_by('-date_joined')[:5]),
+            }))
             return render(request, 'core/receptionist_dashboard.html', context)
         
         elif user.is_admin_user() or user.is_superuser:
             # Admin dashboard
-            total_patients = User.objects.filter(user_type='patient').count()
-            total_doctors = User.objects.filter(user_type='doctor').count()
-            total_appointments = Appointment.objects.count()
-            total_treatments = Treatment.objects.count()
-            
-            context.update({
-                'total_patients': total_patients,
-                'total_doctors': total_doctors,
-                'total_appointments': total_appointments,
-                'total_treatments': total_treatments,
-            })
+            context.update(get_section(user, 'admin_totals', lambda: {
+                'total_patients': User.objects.filter(user_type='patient').count(),
+                'total_doctors': User.objects.filter(user_type='doctor').count(),
+                'total_appointments': Appointment.objects.count(),
+                'total_treatments': Treatment.objects.count(),
+            }))
             return render(request, 'core/admin_dashboard.html', context)
         
         # Redirect to general dashboard by default
@@ -291,6 +131,145 @@ def dashboard(request):
         # Final fallback - render a basic dashboard
         return render(request, 'core/dashboard.html', simple_context)
 
+def build_patient_vitals(user):
+    """Vitals section of the patient dashboard"""
+    latest_vital = VitalSign.objects.filter(patient=user).first()
+    thirty_days_ago = timezone.now() - timedelta(days=30)
+    recent_vitals = VitalSign.objects.filter(
+        patient=user,
+        recorded_at__gte=thirty_days_ago
+    ).order_by('-recorded_at')[:10]
+    
+    # Calculate vitals statistics
+    vitals_stats = recent_vitals.aggregate(
+        avg_systolic=Avg('systolic_bp'),
+        avg_diastolic=Avg('diastolic_bp'),
+        avg_heart_rate=Avg('heart_rate'),
+        max_systolic=Max('systolic_bp'),
+        min_systolic=Min('systolic_bp'),
+    )
+    recent_vitals = list(recent_vitals)
+    
+    # Get active vitals alerts
+    active_alerts = list(VitalSignAlert.objects.filter(
+        vital_sign__patient=user,
+        status='active'
+    ).order_by('-created_at'))
+    
+    # Prepare chart data for vitals
+    chart_data = {
+        'dates': [v.recorded_at.strftime('%Y-%m-%d') for v in recent_vitals],
+        'systolic': [v.systolic_bp for v in recent_vitals],
+        'diastolic': [v.diastolic_bp for v in recent_vitals],
+        'heart_rate': [v.heart_rate for v in recent_vitals],
+    }
+    
+    # Enhanced vitals data for the new design
+    vitals_enhanced_data = {}
+    if latest_vital:
+        vitals_enhanced_data = {
+            'risk_percentage': latest_vital.get_risk_percentage(),
+            'health_assessment_message': latest_vital.get_health_assessment_message(),
+            'risk_trend': latest_vital.get_risk_trend(),
+            'risk_level': latest_vital.calculate_risk_level(),
+            'assessment_date': latest_vital.recorded_at.strftime('%B %d, %Y'),
+        }
+    
+    return {
+        'latest_vital': latest_vital,
+        'recent_vitals': recent_vitals,
+        'vitals_stats': vitals_stats,
+        'active_alerts': active_alerts,
+        'chart_data': chart_data,
+        'vitals_enhanced_data': vitals_enhanced_data,
+    }
+
+
+def build_patient_messages(user):
+    """Messaging section of the patient dashboard"""
+    message_threads = list(MessageThread.objects.filter(
+        patient=user,
+        is_active=True
+    ).select_related('doctor'))
+    
+    return {
+        'message_threads': message_threads,
+        # Get unread message count
+        'total_unread_messages': sum(thread.patient_unread_count for thread in message_threads),
+    }
+
+
+def build_doctor_appointments(user):
+    """Appointment section of the doctor dashboard"""
+    today = timezone.now().date()
+    today_appointments = list(Appointment.objects.filter(
+        doctor=user,
+        date=today,
+        status='planned'
+    ).select_related('patient').order_by('time'))
+    
+    upcoming_appointments = list(Appointment.objects.filter(
+        doctor=user,
+        date__gt=today,
+        status='planned'
+    ).select_related('patient').order_by('date', 'time')[:5])
+    
+    # Weekly appointment statistics, one grouped query for the week
+    week_start = today - timedelta(days=today.weekday())
+    per_day = dict(Appointment.objects.filter(
+        doctor=user,
+        date__range=[week_start, week_start + timedelta(days=6)]
+    ).values_list('date').annotate(count=Count('id')).order_by())
+    weekly_appointments = [per_day.get(week_start + timedelta(days=i), 0) for i in range(7)]
+    
+    return {
+        'today_appointments': today_appointments,
+        'upcoming_appointments': upcoming_appointments,
+        'weekly_appointments': weekly_appointments,
+    }
+
+
+def build_doctor_treatments(user):
+    """Treatment section of the doctor dashboard"""
+    doctor_treatments = Treatment.objects.filter(appointment__doctor=user)
+    recent_treatments = list(
+        doctor_treatments.select_related('appointment__patient').order_by('-created_at')[:5]
+    )
+    
+    # Most common diagnoses
+    common_diagnoses_data = doctor_treatments.values('diagnosis').annotate(
+        count=Count('diagnosis')
+    ).order_by('-count')[:5]
+    
+    common_diagnoses = []
+    for item in common_diagnoses_data:
+        diagnosis = item['diagnosis']
+        if len(diagnosis) > 20:
+            diagnosis = diagnosis[:20] + "..."
+        common_diagnoses.append({
+            'name': diagnosis,
+            'count': item['count']
+        })
+    
+    return {
+        'recent_treatments': recent_treatments,
+        'total_treatments': doctor_treatments.count(),
+        'common_diagnoses': common_diagnoses,
+    }
+
+
+def build_doctor_patients(user):
+    """Patient section of the doctor dashboard"""
+    cohort = demographics([user.pk])[user.pk]
+    
+    # Patient age demographics: 0-18, 19-30, 31-45, 46-60, 60+
+    age_demographics = [cohort['age_bands'][label] for label, _, _ in AGE_BANDS]
+    
+    return {
+        'total_patients': cohort['total_patients'],
+        'age_demographics': age_demographics,
+    }
+
 # Patient Registration
 class PatientRegistrationView(CreateView):
     """
@@ -834,6 +813,18 @@ def ai_chat(request):
         # Use the enhanced AI service
         result = ai_service.chat(request.user, message, session_id)
         
+        if result.get('busy'):
+            # Fail fast so clients back off instead of holding a worker
+            response = JsonResponse({
+                'success': False,
+                'busy': True,
+                'response': result['response'],
+                'error': result.get('error'),
+                'retry_after': result['retry_after'],
+            }, status=429)
+            response['Retry-After'] = str(result['retry_after'])
+            return response
+        
         return JsonResponse({
             'success': result['success'],
             'response': result.get('response', ''),
@@ -841,6 +832,7 @@ def ai_chat(request):
             'conversation_id': result.get('conversation_id'),
             'tokens_used': result.get('tokens_used', 0),
             'response_time': result.get('response_time', 0),
+            'cached': result.get('cached', False),
             'error': result.get('error'),
             'timestamp': timezone.now().isoformat()
         })
@@ -852,6 +844,48 @@ def ai_chat(request):
             'response': 'I apologize, but I encountered an error. Please try again or contact support if the issue persists.'
         })
 
+@login_required
+@require_http_methods(["POST"])
+def ai_symptom_triage(request):
+    """
+    Batch symptom triage endpoint for many free-text complaints at once
+    """
+    from .ai_features import SymptomAnalyzer, TreatmentRecommendationEngine
+    
+    if not (request.user.is_doctor() or request.user.is_receptionist()
+            or request.user.is_admin_user() or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Request body must be a JSON object'}, status=400)
+    
+    complaints = data.get('complaints')
+    if not isinstance(complaints, list) or not all(isinstance(c, str) for c in complaints):
+        return JsonResponse({'success': False, 'error': 'complaints must be a list of strings'}, status=400)
+    if len(complaints) > 500:
+        return JsonResponse({'success': False, 'error': 'At most 500 complaints per request'}, status=400)
+    
+    analyses = SymptomAnalyzer().analyze_symptoms_batch(complaints)
+    treatment_engine = TreatmentRecommendationEngine()
+    results = [
+        {
+            'complaint': complaint,
+            'symptom_analysis': analysis or {'found_symptoms': [], 'possible_diseases': [], 'recommendations': []},
+            'recommended_tests': treatment_engine.recommend_lab_tests(complaint),
+        }
+        for complaint, analysis in zip(complaints, analyses)
+    ]
+    
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'timestamp': timezone.now().isoformat()
+    })
+
 class ProfileSettingsView(LoginRequiredMixin, UpdateView):
     """
     Profile settings view for updating user profile and theme preferences.
@@ -864,6 +898,11 @@ class ProfileSettingsView(LoginRequiredMixin, UpdateView):
     def get_object(self):
         return self.request.user
     
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['request'] = self.request
+        return kwargs
+    
     def form_valid(self, form):
         messages.success(self.request, _('Profile settings updated successfully!'))
         return super().form_valid(form)
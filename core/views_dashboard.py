@@ -5,22 +5,33 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db.models import Q, Sum
 
 from .analytics import DashboardAnalytics, ReportGenerator
+from .cohorts import AGE_BANDS, doctor_cohorts
+from .models_statistics import GeneratedReport, SystemStatistics
+from .reports import can_access, request_report, uses_broker
+from .statistics import doctor_performance_summary, system_overview, top_doctors
+from .time_buckets import time_series
 from appointments.models import Appointment
 from treatments.models import Treatment
 from treatments.models_lab import LabTest
 from treatments.models_medical_history import MedicalHistory
 from treatments.models_vitals import VitalSign
 import json
+import os
 
 User = get_user_model()
 
+# Format names accepted from the dashboard -> GeneratedReport.file_format
+EXPORT_FORMAT_ALIASES = {'excel': 'xlsx', 'xlsx': 'xlsx', 'csv': 'csv'}
+
 
 class EnhancedDashboardView(LoginRequiredMixin, TemplateView):
     """
@@ -217,6 +228,35 @@ def patient_health_summary_api(request, patient_id):
     return JsonResponse(serialized_summary)
 
 
+@login_required
+def doctor_cohort_api(request):
+    """
+    Patient cohort breakdown (age bands, gender, chronic conditions) for the
+    dashboard charts. Doctors get their own patients; admins may pass
+    ``?doctor=<id>`` (repeatable) or get every doctor.
+    """
+    user = request.user
+    if user.is_doctor():
+        doctor_ids = [user.pk]
+    elif user.is_admin_user():
+        requested = request.GET.getlist('doctor')
+        doctors = User.objects.filter(user_type='doctor')
+        if requested:
+            try:
+                doctors = doctors.filter(pk__in=[int(pk) for pk in requested])
+            except ValueError:
+                return JsonResponse({'error': 'Invalid doctor id'}, status=400)
+        doctor_ids = list(doctors.values_list('pk', flat=True))
+    else:
+        return JsonResponse({'error': 'Unauthorized access'}, status=403)
+    
+    cohorts = doctor_cohorts(doctor_ids)
+    return JsonResponse({
+        'age_bands': [label for label, _, _ in AGE_BANDS],
+        'doctors': [dict(cohorts[doctor_id], doctor_id=doctor_id) for doctor_id in doctor_ids],
+    })
+
+
 class DoctorPerformanceView(LoginRequiredMixin, TemplateView):
     """
     Doctor performance dashboard
@@ -240,12 +280,8 @@ class DoctorPerformanceView(LoginRequiredMixin, TemplateView):
             ('This Year', 365)
         ]
         
-        performance_data = {}
-        for period_name, days in periods:
-            analytics = DashboardAnalytics(user=self.request.user, date_range_days=days)
-            performance_data[period_name] = analytics.get_doctor_performance()
-        
-        context['performance_data'] = performance_data
+        # Read from the doctor's daily statistics rows
+        context['performance_data'] = doctor_performance_summary(self.request.user, periods)
         context['doctor'] = self.request.user
         
         # Patient satisfaction data (can be added in the future)
@@ -284,22 +320,19 @@ class SystemReportsView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # System-wide statistics
+        # System-wide statistics, from the pre-aggregated tables
+        stats = system_overview()
         context['system_stats'] = {
-            'total_users': User.objects.count(),
-            'total_doctors': User.objects.filter(user_type='doctor').count(),
-            'total_patients': User.objects.filter(user_type='patient').count(),
-            'total_appointments': Appointment.objects.count(),
-            'total_treatments': Treatment.objects.count(),
-            'total_lab_tests': LabTest.objects.count(),
+            'total_users': stats['total_users'],
+            'total_doctors': stats['users_by_type']['doctor'],
+            'total_patients': stats['users_by_type']['patient'],
+            'total_appointments': stats['total_appointments'],
+            'total_treatments': stats['total_treatments'],
+            'total_lab_tests': stats['total_lab_tests'],
         }
         
         # Top active doctors
-        context['top_doctors'] = User.objects.filter(
-            user_type='doctor'
-        ).annotate(
-            appointment_count=Count('doctor_appointments')
-        ).order_by('-appointment_count')[:10]
+        context['top_doctors'] = top_doctors(limit=10)
         
         # Monthly growth data
         context['monthly_growth'] = self.get_monthly_growth_data()
@@ -308,33 +341,19 @@ class SystemReportsView(LoginRequiredMixin, TemplateView):
     
     def get_monthly_growth_data(self):
         """Calculate monthly growth data"""
-        months_data = []
-        
-        for i in range(12):  # Last 12 months
-            month_date = timezone.now().date().replace(day=1) - timedelta(days=i*30)
-            month_start = month_date.replace(day=1)
-            
-            # Calculate end of month
-            if month_start.month == 12:
-                month_end = month_start.replace(year=month_start.year + 1, month=1, day=1) - timedelta(days=1)
-            else:
-                month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
-            
-            new_users = User.objects.filter(
-                date_joined__date__range=[month_start, month_end]
-            ).count()
-            
-            new_appointments = Appointment.objects.filter(
-                created_at__date__range=[month_start, month_end]
-            ).count()
-            
-            months_data.append({
-                'month': month_start.strftime('%B %Y'),
-                'new_users': new_users,
-                'new_appointments': new_appointments
-            })
+        series = time_series(SystemStatistics.objects.all(), 'date', period='month', periods=12, metrics={
+            'new_users': Sum('new_users'),
+            'new_appointments': Sum('new_appointments'),
+        })
         
-        return list(reversed(months_data))
+        return [
+            {
+                'month': bucket['period'].strftime('%B %Y'),
+                'new_users': bucket['new_users'],
+                'new_appointments': bucket['new_appointments']
+            }
+            for bucket in series
+        ]
 
 
 def recent_activity(request):
@@ -380,22 +399,108 @@ def recent_activity(request):
     return JsonResponse({'activities': activities})
 
 
+def _report_payload(report):
+    return {
+        'report_id': report.pk,
+        'name': report.name,
+        'report_type': report.report_type,
+        'format': report.file_format,
+        'status': report.status,
+        'progress': report.progress,
+        'rows': report.row_count,
+        'error': report.error_message,
+        # Pending without a broker: waits for the generate_reports command
+        'awaiting_worker': report.status == 'pending' and not uses_broker(),
+        'status_url': reverse('core:report-status', args=[report.pk]),
+        'download_url': reverse('core:report-download', args=[report.pk]) if report.status == 'completed' else None,
+    }
+
+
+@login_required
+@require_POST
 def export_analytics(request):
     """
-    Export analytics data in different formats (PDF, Excel, CSV)
+    Export analytics data (Excel or CSV) in the background: doctors get their
+    appointment summary, admins the daily system statistics
     """
-    format_type = request.GET.get('format', 'pdf')
+    format_type = EXPORT_FORMAT_ALIASES.get(request.POST.get('format', 'xlsx'))
+    if format_type is None:
+        return JsonResponse({'error': 'Unsupported format'}, status=400)
     
-    # In a real implementation, this would generate and return the appropriate file
-    # For now, we'll just return a response indicating success
-    
-    response_data = {
-        'success': True,
-        'message': f'Analytics exported in {format_type.upper()} format',
-        'format': format_type
-    }
+    try:
+        days = int(request.POST.get('range', 30))
+    except ValueError:
+        days = 30
+    today = timezone.localdate()
+    period = {'start': (today - timedelta(days=days)).isoformat(), 'end': today.isoformat()}
+    
+    if request.user.is_admin_user():
+        report = request_report(request.user, 'system_statistics', period, format_type)
+    elif request.user.is_doctor():
+        report = request_report(request.user, 'doctor_summary', dict(period, doctor_id=request.user.pk), format_type)
+    else:
+        return JsonResponse({'error': 'Unauthorized access'}, status=403)
     
-    return JsonResponse(response_data)
+    return JsonResponse(_report_payload(report), status=202)
+
+
+@login_required
+@require_POST
+def request_report_api(request):
+    """
+    Queue a doctor summary or patient health summary report
+    """
+    user = request.user
+    report_type = request.POST.get('report_type')
+    format_type = EXPORT_FORMAT_ALIASES.get(request.POST.get('format', 'xlsx'))
+    if format_type is None:
+        return JsonResponse({'error': 'Unsupported format'}, status=400)
+    
+    if report_type == 'doctor_summary':
+        doctor_id = request.POST.get('doctor_id') if user.is_admin_user() else user.pk
+        if not (user.is_doctor() or user.is_admin_user()) or not doctor_id:
+            return JsonResponse({'error': 'Unauthorized access'}, status=403)
+        doctor = get_object_or_404(User, pk=doctor_id, user_type='doctor')
+        parameters = {'doctor_id': doctor.pk}
+        try:
+            for key in ('start', 'end'):
+                if request.POST.get(key):
+                    parameters[key] = date.fromisoformat(request.POST[key]).isoformat()
+        except ValueError:
+            return JsonResponse({'error': 'Invalid date'}, status=400)
+    elif report_type == 'patient_health_summary':
+        if not (user.is_doctor() or user.is_admin_user()):
+            return JsonResponse({'error': 'Unauthorized access'}, status=403)
+        patient = get_object_or_404(User, pk=request.POST.get('patient_id') or 0, user_type='patient')
+        parameters = {'patient_id': patient.pk}
+    else:
+        return JsonResponse({'error': 'Unknown report type'}, status=400)
+    
+    report = request_report(user, report_type, parameters, format_type)
+    return JsonResponse(_report_payload(report), status=202)
+
+
+@login_required
+def report_status_api(request, report_id):
+    """
+    Progress of a queued report
+    """
+    report = get_object_or_404(GeneratedReport, pk=report_id)
+    if not can_access(request.user, report):
+        return JsonResponse({'error': 'Unauthorized access'}, status=403)
+    return JsonResponse(_report_payload(report))
+
+
+@login_required
+def report_download(request, report_id):
+    """
+    Download a completed report file
+    """
+    report = get_object_or_404(GeneratedReport, pk=report_id, status='completed')
+    if not can_access(request.user, report) or not report.report_file:
+        raise Http404
+    return FileResponse(report.report_file.open('rb'), as_attachment=True,
+                        filename=os.path.basename(report.report_file.name))
 
 
 @login_required
@@ -9,6 +9,7 @@ from django.core.paginator import Paginator
 from django.db.models import Q
 
 from .models_communication import CommunicationNotification
+from .notification_counters import adjust, unread_counts
 
 class NotificationListView(LoginRequiredMixin, ListView):
     """
@@ -26,10 +27,7 @@ class NotificationListView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # Add additional data as needed
-        context['unread_count'] = CommunicationNotification.objects.filter(
-            user=self.request.user,
-            is_read=False
-        ).count()
+        context['unread_count'] = unread_counts(self.request.user.pk)['communication_notifications']
         return context
 
 @login_required
@@ -55,7 +53,9 @@ def mark_all_notifications_as_read(request):
     """
     View that marks all user notifications as read.
     """
-    CommunicationNotification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    marked = CommunicationNotification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    # update() sends no signals
+    adjust(request.user.pk, 'communication_notifications', -marked)
     
     # JSON response for AJAX request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -26,6 +26,10 @@ try:
 except ImportError:
     websocket_urlpatterns = []
 
+from core.routing import websocket_urlpatterns as notification_websocket_urlpatterns
+
+websocket_urlpatterns = websocket_urlpatterns + notification_websocket_urlpatterns
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
@@ -107,6 +107,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_router.PrimaryPinMiddleware',  # Read-your-writes when a replica is configured
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -157,6 +158,23 @@ else:
         }
     }
 
+# Optional read replica for analytics, reports and batch jobs (core.db_router)
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default=None)
+
+if DATABASE_REPLICA_URL and 'default' in DATABASES:
+    import dj_database_url
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL)
+    # Tests run against the primary's test database
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+DATABASE_REPLICA_SETTINGS = {
+    'MAX_LAG': config('DATABASE_REPLICA_MAX_LAG', default=30, cast=int),  # seconds behind before falling back
+    'LAG_CHECK_INTERVAL': 10,  # seconds between lag checks per process
+    'PIN_SECONDS': 5,  # seconds a browser reads from the primary after it writes
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -486,6 +504,18 @@ AI_SETTINGS = {
     'ML_MODEL_PATH': BASE_DIR / 'ai_models/',
     'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY', ''),
     'HUGGINGFACE_API_KEY': os.getenv('HUGGINGFACE_API_KEY', ''),
+    # Response cache for repeated, non-personal assistant questions
+    'RESPONSE_CACHE_ENABLED': config('AI_RESPONSE_CACHE_ENABLED', default=True, cast=bool),
+    'RESPONSE_CACHE_TTL': config('AI_RESPONSE_CACHE_TTL', default=86400, cast=int),  # seconds
+    'RESPONSE_CACHE_MAX_ENTRIES': config('AI_RESPONSE_CACHE_MAX_ENTRIES', default=5000, cast=int),
+    # Provider throttling (limits themselves are set per AIConfiguration)
+    'THROTTLE_QUEUE_TIMEOUT': config('AI_THROTTLE_QUEUE_TIMEOUT', default=5, cast=float),  # seconds
+    'THROTTLE_SLOT_LEASE': 45,  # seconds, longer than the provider request timeout
+    # Write-behind conversation log
+    'CONVERSATION_LOG_BUFFERED': config('AI_CONVERSATION_LOG_BUFFERED', default=True, cast=bool),
+    'CONVERSATION_LOG_BATCH_SIZE': config('AI_CONVERSATION_LOG_BATCH_SIZE', default=50, cast=int),
+    'CONVERSATION_LOG_FLUSH_INTERVAL': config('AI_CONVERSATION_LOG_FLUSH_INTERVAL', default=2.0, cast=float),  # seconds
+    'CONVERSATION_LOG_MAX_PENDING': 10000,
 }
 
 # Analytics Settings
@@ -493,7 +523,28 @@ ANALYTICS_SETTINGS = {
     'ENABLE_ANALYTICS': True,
     'DATA_RETENTION_DAYS': 365,
     'REAL_TIME_UPDATES': True,
-    'EXPORT_FORMATS': ['pdf', 'excel', 'csv'],
+    'EXPORT_FORMATS': ['xlsx', 'csv'],
+    # Pre-aggregated statistics (core.statistics)
+    'ROLLUP_REFRESH_INTERVAL': config('STATISTICS_ROLLUP_INTERVAL', default=3600, cast=int),  # seconds
+    'ROLLUP_BACKFILL_DAYS': None,  # None rolls up all history on the first run
+    'ROLLUP_ACTIVE_USER_WINDOW': 30,  # days counted as "active users"
+    # Stampede-protected analytics cache (core.analytics_cache)
+    'CACHE_ENABLED': True,
+    'CACHE_TIMEOUT': config('ANALYTICS_CACHE_TIMEOUT', default=300, cast=int),  # seconds an entry is fresh
+    'CACHE_STALE_GRACE': 600,  # seconds a stale entry may still be served during a rebuild
+    'CACHE_LOCK_TIMEOUT': 60,  # seconds before an abandoned rebuild lock expires
+    'CACHE_LOCK_WAIT': 5,  # seconds a cold-cache request waits for another worker's rebuild
+    'CACHE_EARLY_RECOMPUTE_BETA': 1.0,  # 0 disables probabilistic early refresh
+    # Background report exports (core.reports)
+    'REPORT_CHUNK_SIZE': 2000,  # rows fetched per database round trip
+    'REPORT_PROGRESS_INTERVAL': 1000,  # rows between progress updates
+}
+
+# Role dashboard fragment cache (core.dashboard_cache)
+DASHBOARD_CACHE_SETTINGS = {
+    'ENABLED': config('DASHBOARD_CACHE_ENABLED', default=True, cast=bool),
+    # Upper bound on how stale a section can get when no signal fires
+    'MAX_STALENESS': config('DASHBOARD_CACHE_MAX_STALENESS', default=300, cast=int),  # seconds
 }
 
 # Notification Settings
@@ -503,6 +554,31 @@ NOTIFICATION_SETTINGS = {
     'PUSH_NOTIFICATIONS': True,
     'REAL_TIME_NOTIFICATIONS': True,
     'NOTIFICATION_RETENTION_DAYS': 30,
+    'COUNTER_CACHE_TIMEOUT': 3600,  # seconds; unread counts and recent lists are invalidated on change
+    'FANOUT_CHUNK_SIZE': 500,  # rows per bulk_create when one notification goes to many recipients
+    'RESUME_LIMIT': 100,  # most missed notifications replayed to a reconnecting WebSocket client
+    'EMAIL_BATCH_SIZE': 100,  # emails sent over one SMTP connection
+    'EMAIL_MAX_RETRIES': 5,
+    'EMAIL_RETRY_BACKOFF': 60,  # seconds before the first retry, doubled for each further one
+    'DISPATCH_BATCH_SIZE': 200,  # scheduled notifications claimed per transaction
+    'DISPATCH_INTERVAL': 30,  # seconds between dispatcher runs under Celery beat
+    'COALESCE_WINDOW': 900,  # seconds in which repeats from one source update the same notification
+}
+
+# Data retention (core.retention): expired rows are archived to gzip JSONL files, then deleted
+RETENTION_SETTINGS = {
+    'ARCHIVE_DIR': config('RETENTION_ARCHIVE_DIR', default=str(BASE_DIR / 'archives')),
+    'BATCH_SIZE': 1000,  # rows per archive file and per DELETE
+    'INTERVAL': 86400,  # seconds between retention runs under Celery beat
+    # Days kept per policy; 0 disables a policy. Only read notifications and ended sessions expire.
+    'POLICIES': {
+        'notification_logs': NOTIFICATION_SETTINGS['NOTIFICATION_RETENTION_DAYS'],
+        'notifications': NOTIFICATION_SETTINGS['NOTIFICATION_RETENTION_DAYS'],
+        'communication_notifications': NOTIFICATION_SETTINGS['NOTIFICATION_RETENTION_DAYS'],
+        'security_audit_logs': ANALYTICS_SETTINGS['DATA_RETENTION_DAYS'],
+        'login_sessions': 180,
+        'ai_conversations': 365,
+    },
 }
 
 # Security Settings for Production
@@ -544,6 +620,19 @@ else:
         }
     }
 
+# Dedicated alias for cached AI responses. LocMemCache culls least recently
+# used keys past MAX_ENTRIES; on Redis eviction follows the server's maxmemory policy.
+CACHES['ai_responses'] = {
+    **CACHES['default'],
+    'KEY_PREFIX': 'ai_responses',
+    'TIMEOUT': AI_SETTINGS['RESPONSE_CACHE_TTL'],
+}
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    CACHES['ai_responses']['LOCATION'] = 'ai-responses'
+    CACHES['ai_responses']['OPTIONS'] = {
+        'MAX_ENTRIES': AI_SETTINGS['RESPONSE_CACHE_MAX_ENTRIES'],
+    }
+
 # Celery Configuration (only if Redis is available)
 if REDIS_URL:
     CELERY_BROKER_URL = REDIS_URL
@@ -556,6 +645,20 @@ if REDIS_URL:
     
     # Enhanced Celery Beat configuration for stability
     CELERY_BEAT_SCHEDULE_FILENAME = '/tmp/celerybeat-schedule'
+    CELERY_BEAT_SCHEDULE = {
+        'rollup-statistics': {
+            'task': 'core.tasks.rollup_statistics_task',
+            'schedule': float(ANALYTICS_SETTINGS['ROLLUP_REFRESH_INTERVAL']),
+        },
+        'dispatch-notifications': {
+            'task': 'core.tasks.dispatch_notifications_task',
+            'schedule': float(NOTIFICATION_SETTINGS['DISPATCH_INTERVAL']),
+        },
+        'apply-retention': {
+            'task': 'core.tasks.apply_retention_task',
+            'schedule': float(RETENTION_SETTINGS['INTERVAL']),
+        },
+    }
     CELERY_WORKER_HIJACK_ROOT_LOGGER = False
     CELERY_WORKER_LOG_FORMAT = '[%(asctime)s: %(levelname)s/%(processName)s] %(message)s'
     CELERY_WORKER_TASK_LOG_FORMAT = '[%(asctime)s: %(levelname)s/%(processName)s][%(task_name)s(%(task_id)s)] %(message)s'
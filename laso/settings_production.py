@@ -29,6 +29,15 @@ if os.environ.get('REDIS_URL'):
             'OPTIONS': {
                 'CLIENT_CLASS': 'django_redis.client.DefaultClient',
             }
+        },
+        'ai_responses': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'ai_responses',
+            'TIMEOUT': AI_SETTINGS['RESPONSE_CACHE_TTL'],
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
         }
     }
     
@@ -0,0 +1,70 @@
+/**
+ * Real-time notifications for the laso application
+ * Keeps the header badge current over the notifications WebSocket and
+ * resumes from the last seen ids after a reconnect instead of polling.
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    const bell = document.getElementById('notification-bell');
+    if (!bell || !window.WebSocket) {
+        return;
+    }
+
+    const storageKey = 'laso-notification-last-ids';
+    let lastIds = JSON.parse(sessionStorage.getItem(storageKey) || '{"notification": 0, "communication": 0}');
+    let unreadCount = parseInt(bell.dataset.unreadCount || '0', 10);
+    let retryDelay = 1000;
+
+    function renderBadge() {
+        let badge = bell.querySelector('.notification-badge');
+        if (unreadCount > 0) {
+            if (!badge) {
+                badge = document.createElement('span');
+                badge.className = 'notification-badge position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger';
+                bell.appendChild(badge);
+            }
+            badge.textContent = unreadCount;
+        } else if (badge) {
+            badge.remove();
+        }
+    }
+
+    function remember(notification) {
+        if (notification.id > (lastIds[notification.kind] || 0)) {
+            lastIds[notification.kind] = notification.id;
+            sessionStorage.setItem(storageKey, JSON.stringify(lastIds));
+        }
+        document.dispatchEvent(new CustomEvent('laso:notification', {detail: notification}));
+    }
+
+    function connect() {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const query = `?last_notification_id=${lastIds.notification || 0}&last_communication_id=${lastIds.communication || 0}`;
+        const socket = new WebSocket(`${protocol}//${window.location.host}/ws/notifications/${query}`);
+
+        socket.onopen = function() {
+            retryDelay = 1000;
+        };
+
+        socket.onmessage = function(event) {
+            const data = JSON.parse(event.data);
+            if (data.type === 'sync') {
+                data.notifications.forEach(remember);
+                unreadCount = data.unread_counts.communication_notifications;
+                renderBadge();
+            } else if (data.type === 'notification') {
+                remember(data.notification);
+            } else if (data.type === 'unread_delta' && data.field === 'communication_notifications') {
+                unreadCount = Math.max(unreadCount + data.delta, 0);
+                renderBadge();
+            }
+        };
+
+        socket.onclose = function() {
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    }
+
+    connect();
+});
@@ -41,4 +41,4 @@ class MessageThreadAdmin(admin.ModelAdmin):
     list_display = ['doctor', 'patient', 'doctor_unread_count', 'patient_unread_count', 'is_active', 'last_message_at']
     list_filter = ['is_active', 'created_at', 'last_message_at']
     search_fields = ['doctor__username', 'patient__username']
-    readonly_fields = ['created_at', 'last_message_at']
+    readonly_fields = ['created_at', 'last_message', 'last_message_preview', 'last_message_sender', 'last_message_at']
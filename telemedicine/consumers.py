@@ -653,10 +653,8 @@ class DirectMessageConsumer(AsyncWebsocketConsumer):
                 is_urgent=is_urgent
             )
             
-            # Update thread
-            thread.last_message_at = timezone.now()
+            # Update thread (the message itself recorded the last-message snapshot)
             thread.update_unread_count(recipient)
-            thread.save()
             
             return {
                 'id': message.id,
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_last_message(apps, schema_editor):
+    # Historical models have no custom methods, so the snapshot is written here
+    MessageThread = apps.get_model('telemedicine', 'MessageThread')
+    DoctorPatientMessage = apps.get_model('telemedicine', 'DoctorPatientMessage')
+    for thread in MessageThread.objects.all().iterator():
+        message = DoctorPatientMessage.objects.filter(
+            doctor_id=thread.doctor_id, patient_id=thread.patient_id
+        ).order_by('-created_at', '-pk').first()
+        if message is not None:
+            MessageThread.objects.filter(pk=thread.pk).update(
+                last_message=message,
+                last_message_preview=Truncator(message.content).chars(100),
+                last_message_sender_id=message.sender_id,
+                last_message_at=message.created_at,
+            )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telemedicine', '0005_doctorpatientmessage_messagethread'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagethread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='telemedicine.doctorpatientmessage', verbose_name='Last Message'),
+        ),
+        migrations.AddField(
+            model_name='messagethread',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Last Message Preview'),
+        ),
+        migrations.AddField(
+            model_name='messagethread',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Last Message Sender'),
+        ),
+        migrations.AlterField(
+            model_name='messagethread',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Last Message At'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
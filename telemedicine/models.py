@@ -6,6 +6,8 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.utils import timezone
 from django.core.validators import URLValidator
+from django.db.models import Q
+from django.utils.text import Truncator
 from appointments.models import Appointment
 import uuid
 from datetime import datetime
@@ -887,6 +889,12 @@ class DoctorPatientMessage(models.Model):
     def __str__(self):
         return f"{self.sender.get_full_name()} to {self.get_recipient().get_full_name()}: {self.content[:50]}"
     
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        if created:
+            MessageThread.record_message(self)
+    
     def get_recipient(self):
         """Get the recipient of the message"""
         if self.sender == self.doctor:
@@ -901,6 +909,9 @@ class DoctorPatientMessage(models.Model):
             self.save(update_fields=['is_read', 'read_at'])
 
 
+PREVIEW_LENGTH = 100
+
+
 class MessageThread(models.Model):
     """
     Message thread between a doctor and patient
@@ -926,8 +937,33 @@ class MessageThread(models.Model):
         verbose_name=_('Created At')
     )
     
+    # Snapshot of the newest message, so thread lists need no per-thread queries
+    last_message = models.ForeignKey(
+        'DoctorPatientMessage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Last Message')
+    )
+    
+    last_message_preview = models.CharField(
+        max_length=PREVIEW_LENGTH,
+        blank=True,
+        verbose_name=_('Last Message Preview')
+    )
+    
+    last_message_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Last Message Sender')
+    )
+    
     last_message_at = models.DateTimeField(
-        auto_now=True,
+        default=timezone.now,
         verbose_name=_('Last Message At')
     )
     
@@ -958,14 +994,29 @@ class MessageThread(models.Model):
     
     def get_last_message(self):
         """Get the last message in this thread"""
-        return DoctorPatientMessage.objects.filter(
-            doctor=self.doctor,
-            patient=self.patient
-        ).first()
+        return self.last_message
+    
+    @classmethod
+    def record_message(cls, message):
+        """
+        Store a new message as its thread's last message, in one UPDATE that
+        leaves the thread alone if a newer message is already recorded
+        """
+        return cls.objects.filter(
+            Q(last_message__isnull=True) | Q(last_message_id__lt=message.pk),
+            doctor_id=message.doctor_id,
+            patient_id=message.patient_id,
+        ).update(
+            last_message=message,
+            last_message_preview=Truncator(message.content).chars(PREVIEW_LENGTH),
+            last_message_sender_id=message.sender_id,
+            last_message_at=message.created_at,
+        )
     
     def update_unread_count(self, user):
         """Update unread count for a user"""
         if user == self.doctor:
+            field = 'doctor_unread_count'
             self.doctor_unread_count = DoctorPatientMessage.objects.filter(
                 doctor=self.doctor,
                 patient=self.patient,
@@ -973,11 +1024,13 @@ class MessageThread(models.Model):
                 is_read=False
             ).count()
         else:
+            field = 'patient_unread_count'
             self.patient_unread_count = DoctorPatientMessage.objects.filter(
                 doctor=self.doctor,
                 patient=self.patient,
                 sender=self.doctor,
                 is_read=False
             ).count()
-        self.save()
+        # Only the count: a full save would overwrite the last-message snapshot with stale values
+        self.save(update_fields=[field])
 
@@ -1,11 +1,13 @@
 # Run tests with: python manage.py test telemedicine
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
-from .models import VideoSession, TeleMedicineMessage, TeleMedicineSettings
+import json
+from .models import VideoSession, TeleMedicineMessage, TeleMedicineSettings, DoctorPatientMessage, MessageThread
+from .views import get_message_threads, send_direct_message
 
 User = get_user_model()
 
@@ -144,3 +146,56 @@ class TeleconsultationIntegrationTest(TestCase):
         messages = TeleconsultationMessage.objects.filter(session=session)
         self.assertEqual(messages.count(), 1)
         self.assertEqual(messages.first().content, 'Hello doctor')
+
+
+class MessageThreadSnapshotTest(TestCase):
+    """
+    Threads carry their last message, so thread lists take a fixed number
+    of queries however many threads a doctor has
+    """
+
+    def setUp(self):
+        self.doctor = User.objects.create_user(username='snapshot_doctor', password='testpass123',
+                                               user_type='doctor', first_name='Ada', last_name='Lovelace')
+        self.patients = [
+            User.objects.create_user(username=f'snapshot_patient_{i}', password='testpass123', user_type='patient')
+            for i in range(3)
+        ]
+        for patient in self.patients:
+            MessageThread.objects.create(doctor=self.doctor, patient=patient)
+        self.factory = RequestFactory()
+
+    def send(self, patient, content):
+        request = self.factory.post(reverse('telemedicine:send-direct-message'),
+                                    {'recipient_id': patient.pk, 'content': content},
+                                    content_type='application/json')
+        request.user = self.doctor
+        return send_direct_message(request)
+
+    def test_message_updates_snapshot(self):
+        self.send(self.patients[0], 'First')
+        self.send(self.patients[0], 'x' * 300)
+        thread = MessageThread.objects.get(patient=self.patients[0])
+        last = DoctorPatientMessage.objects.filter(patient=self.patients[0]).latest('pk')
+        self.assertEqual(thread.last_message, last)
+        self.assertEqual(len(thread.last_message_preview), 100)
+        self.assertEqual(thread.last_message_sender, self.doctor)
+        self.assertEqual(thread.last_message_at, last.created_at)
+        self.assertEqual(thread.patient_unread_count, 2)
+
+        # An older message saved late does not replace the snapshot
+        MessageThread.record_message(DoctorPatientMessage.objects.earliest('pk'))
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message, last)
+
+    def test_thread_list_query_count(self):
+        for patient in self.patients:
+            self.send(patient, f'Hello {patient.username}')
+        request = self.factory.get(reverse('telemedicine:get-message-threads'))
+        request.user = self.doctor
+        with self.assertNumQueries(1):
+            response = get_message_threads(request)
+        threads = json.loads(response.content)['threads']
+        self.assertEqual(len(threads), 3)
+        self.assertEqual(threads[0]['last_message']['sender_name'], 'Ada Lovelace')
+        self.assertTrue(threads[0]['last_message']['content'].startswith('Hello'))
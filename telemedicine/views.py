@@ -1010,10 +1010,8 @@ def send_direct_message(request):
             is_urgent=is_urgent
         )
         
-        # Update thread
-        thread.last_message_at = timezone.now()
+        # Update thread (the message itself recorded the last-message snapshot)
         thread.update_unread_count(recipient)
-        thread.save()
         
         return JsonResponse({
             'status': 'success',
@@ -1044,13 +1042,13 @@ def get_message_threads(request):
         threads = MessageThread.objects.filter(
             doctor=user,
             is_active=True
-        ).select_related('patient')
+        ).select_related('patient', 'last_message_sender')
         unread_field = 'doctor_unread_count'
     elif user.is_patient():
         threads = MessageThread.objects.filter(
             patient=user,
             is_active=True
-        ).select_related('doctor')
+        ).select_related('doctor', 'last_message_sender')
         unread_field = 'patient_unread_count'
     else:
         return JsonResponse({'error': 'Unauthorized'}, status=403)
@@ -1058,7 +1056,6 @@ def get_message_threads(request):
     threads_data = []
     for thread in threads:
         other_user = thread.patient if user.is_doctor() else thread.doctor
-        last_message = thread.get_last_message()
         
         threads_data.append({
             'id': thread.id,
@@ -1068,10 +1065,10 @@ def get_message_threads(request):
                 'user_type': other_user.user_type,
             },
             'last_message': {
-                'content': last_message.content if last_message else '',
-                'created_at': last_message.created_at.isoformat() if last_message else '',
-                'sender_name': last_message.sender.get_full_name() if last_message else '',
-            } if last_message else None,
+                'content': thread.last_message_preview,
+                'created_at': thread.last_message_at.isoformat(),
+                'sender_name': thread.last_message_sender.get_full_name() if thread.last_message_sender else '',
+            } if thread.last_message_id else None,
             'unread_count': getattr(thread, unread_field),
             'last_message_at': thread.last_message_at.isoformat(),
         })
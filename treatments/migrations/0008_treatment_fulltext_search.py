@@ -0,0 +1,74 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS treatments_treatment_fts USING fts5(
+        diagnosis, notes, content='treatments_treatment', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS treatments_treatment_fts_ai AFTER INSERT ON treatments_treatment BEGIN
+        INSERT INTO treatments_treatment_fts(rowid, diagnosis, notes)
+        VALUES (new.id, new.diagnosis, coalesce(new.notes, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS treatments_treatment_fts_ad AFTER DELETE ON treatments_treatment BEGIN
+        INSERT INTO treatments_treatment_fts(treatments_treatment_fts, rowid, diagnosis, notes)
+        VALUES ('delete', old.id, old.diagnosis, coalesce(old.notes, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS treatments_treatment_fts_au AFTER UPDATE ON treatments_treatment BEGIN
+        INSERT INTO treatments_treatment_fts(treatments_treatment_fts, rowid, diagnosis, notes)
+        VALUES ('delete', old.id, old.diagnosis, coalesce(old.notes, ''));
+        INSERT INTO treatments_treatment_fts(rowid, diagnosis, notes)
+        VALUES (new.id, new.diagnosis, coalesce(new.notes, ''));
+    END
+    """,
+    "INSERT INTO treatments_treatment_fts(treatments_treatment_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS treatments_treatment_fts_ai",
+    "DROP TRIGGER IF EXISTS treatments_treatment_fts_ad",
+    "DROP TRIGGER IF EXISTS treatments_treatment_fts_au",
+    "DROP TABLE IF EXISTS treatments_treatment_fts",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    """
+    GIN index over the tsvector on PostgreSQL, FTS5 shadow table on SQLite
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        from treatments.search import treatment_fulltext_index
+        Treatment = apps.get_model('treatments', 'Treatment')
+        schema_editor.add_index(Treatment, treatment_fulltext_index())
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        from treatments.search import treatment_fulltext_index
+        Treatment = apps.get_model('treatments', 'Treatment')
+        schema_editor.remove_index(Treatment, treatment_fulltext_index())
+    elif vendor == 'sqlite':
+        for statement in SQLITE_REVERSE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treatments', '0007_vitalsign_vitalsignalert_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
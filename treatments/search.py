@@ -0,0 +1,135 @@
+"""
+Full-text treatment search for Laso Healthcare
+Ranked lookup of past treatments by diagnosis and notes: PostgreSQL uses a
+GIN-indexed tsvector, SQLite an FTS5 table kept in sync by triggers (see
+migration 0008), anything else falls back to a scored substring scan
+"""
+
+import logging
+import re
+from typing import Iterable, List, Tuple
+
+from django.db import DatabaseError, connection
+from django.db.models import Q
+
+from .models import Treatment
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'simple'
+SQLITE_FTS_TABLE = 'treatments_treatment_fts'
+FULLTEXT_INDEX_NAME = 'treatment_fulltext_gin'
+
+
+def treatment_search_vector():
+    """
+    Weighted tsvector over diagnosis (A) and notes (B); the GIN index is
+    built on exactly this expression so the planner can use it
+    """
+    from django.contrib.postgres.search import SearchVector
+    return (
+        SearchVector('diagnosis', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('notes', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def treatment_fulltext_index():
+    from django.contrib.postgres.indexes import GinIndex
+    return GinIndex(treatment_search_vector(), name=FULLTEXT_INDEX_NAME)
+
+
+def clean_terms(terms: Iterable[str]) -> List[str]:
+    """
+    Lower-case, de-duplicate and strip query syntax from search terms
+    """
+    cleaned = []
+    for term in terms:
+        term = ' '.join(re.sub(r'[^\w\s-]', ' ', term or '').lower().split())
+        if term and term not in cleaned:
+            cleaned.append(term)
+    return cleaned
+
+
+def _postgresql_search(terms: List[str], limit: int) -> List[Tuple[int, float]]:
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    query = None
+    for term in terms:
+        term_query = SearchQuery(term, search_type='phrase', config=SEARCH_CONFIG)
+        query = term_query if query is None else query | term_query
+
+    vector = treatment_search_vector()
+    rows = Treatment.objects.annotate(
+        search=vector,
+        rank=SearchRank(vector, query),
+    ).filter(search=query).order_by('-rank', '-created_at').values_list('id', 'rank')[:limit]
+    return [(pk, float(rank)) for pk, rank in rows]
+
+
+def _sqlite_search(terms: List[str], limit: int) -> List[Tuple[int, float]]:
+    match = ' OR '.join('"{}"'.format(term.replace('"', '')) for term in terms)
+    with connection.cursor() as cursor:
+        # bm25() is lower for better matches; weight diagnosis over notes
+        cursor.execute(
+            f"SELECT rowid, bm25({SQLITE_FTS_TABLE}, 2.0, 1.0) AS score "
+            f"FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s "
+            f"ORDER BY score LIMIT %s",
+            [match, limit],
+        )
+        return [(pk, -score) for pk, score in cursor.fetchall()]
+
+
+def _fallback_search(terms: List[str], limit: int) -> List[Tuple[int, float]]:
+    condition = Q()
+    for term in terms:
+        condition |= Q(diagnosis__icontains=term) | Q(notes__icontains=term)
+
+    scored = []
+    for pk, diagnosis, notes in Treatment.objects.filter(condition).values_list('id', 'diagnosis', 'notes'):
+        diagnosis, notes = (diagnosis or '').lower(), (notes or '').lower()
+        score = sum(2 * diagnosis.count(term) + notes.count(term) for term in terms)
+        scored.append((pk, float(score)))
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return scored[:limit]
+
+
+def rank_treatments(terms: Iterable[str], limit: int = 5) -> List[Tuple[int, float]]:
+    """
+    Return (treatment id, score) pairs for treatments matching any of the
+    terms, best match first
+    """
+    terms = clean_terms(terms)
+    if not terms or limit <= 0:
+        return []
+
+    vendor = connection.vendor
+    try:
+        if vendor == 'postgresql':
+            return _postgresql_search(terms, limit)
+        if vendor == 'sqlite':
+            return _sqlite_search(terms, limit)
+    except DatabaseError:
+        logger.warning("Full-text treatment search unavailable on %s; using substring scan", vendor)
+    return _fallback_search(terms, limit)
+
+
+def search_treatments(terms: Iterable[str], limit: int = 5) -> List[Treatment]:
+    """
+    Top ``limit`` treatments for the terms, in rank order, with the patient
+    and prescriptions loaded in two additional queries
+    """
+    ranked = rank_treatments(terms, limit)
+    if not ranked:
+        return []
+
+    treatments = Treatment.objects.filter(
+        id__in=[pk for pk, _score in ranked]
+    ).select_related('appointment__patient').prefetch_related('prescriptions').in_bulk()
+
+    results = []
+    for pk, score in ranked:
+        treatment = treatments.get(pk)
+        if treatment is not None:
+            treatment.search_rank = score
+            results.append(treatment)
+    return results
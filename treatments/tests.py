@@ -1,3 +1,68 @@
+from datetime import date, time
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from appointments.models import Appointment
+from .models import Treatment
+from .search import SQLITE_FTS_TABLE, rank_treatments, search_treatments
+
+User = get_user_model()
+
+
+class TreatmentSearchTest(TestCase):
+    """
+    Ranking of past treatments (FTS5 on SQLite, tsvector on PostgreSQL) and
+    the trigger-maintained FTS5 index rows
+    """
+
+    def setUp(self):
+        doctor = User.objects.create_user(username='search_doctor', password='x', user_type='doctor')
+        patient = User.objects.create_user(username='search_patient', password='x', user_type='patient')
+        self.next_day = 1
+
+        def treatment(diagnosis, notes=''):
+            appointment = Appointment.objects.create(doctor=doctor, patient=patient,
+                                                     date=date(2024, 1, self.next_day), time=time(9))
+            self.next_day += 1
+            return Treatment.objects.create(appointment=appointment, diagnosis=diagnosis, notes=notes)
+
+        self.treatment = treatment
+        self.in_diagnosis = treatment('Acute bronchitis', 'Rest and fluids')
+        self.in_notes = treatment('Chest infection', 'Suspected bronchitis, review in a week')
+        self.unrelated = treatment('Migraine', 'Dark room')
+
+    def indexed(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT diagnosis, notes FROM {SQLITE_FTS_TABLE} WHERE rowid = %s", [pk])
+            return cursor.fetchone()
+
+    def test_diagnosis_ranks_above_notes(self):
+        ranked = rank_treatments(['Bronchitis'])
+        self.assertEqual([pk for pk, _score in ranked], [self.in_diagnosis.pk, self.in_notes.pk])
+        self.assertGreater(ranked[0][1], ranked[1][1])
+        # Any term matches; a diagnosis hit still beats a notes hit
+        results = search_treatments(['bronchitis', 'migraine'], limit=5)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[-1].pk, self.in_notes.pk)
+        self.assertEqual(rank_treatments(['"; DROP TABLE --']), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 index table is SQLite only')
+    def test_index_follows_updates_and_deletes(self):
+        self.assertEqual(self.indexed(self.unrelated.pk), ('Migraine', 'Dark room'))
+
+        self.unrelated.diagnosis = 'Tension headache'
+        self.unrelated.save()
+        self.assertEqual(self.indexed(self.unrelated.pk)[0], 'Tension headache')
+        self.assertEqual(rank_treatments(['migraine']), [])
+        self.assertEqual([pk for pk, _ in rank_treatments(['tension'])], [self.unrelated.pk])
+
+        pk = self.in_diagnosis.pk
+        self.in_diagnosis.delete()
+        self.assertIsNone(self.indexed(pk))
+        self.assertEqual([pk for pk, _ in rank_treatments(['bronchitis'])], [self.in_notes.pk])
+
+        added = self.treatment('Bronchitis', 'Bronchitis follow-up')
+        self.assertEqual(rank_treatments(['bronchitis'])[0][0], added.pk)
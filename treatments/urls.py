@@ -9,7 +9,7 @@ from .views_medications import (
     MedicationUpdateView, MedicationDeleteView,
     InteractionListView, InteractionDetailView, InteractionCreateView,
     InteractionUpdateView, InteractionDeleteView,
-    patient_medications, medication_search_api
+    patient_medications, medication_search_api, prescription_interaction_check_api
 )
 from .views_imaging import (
     MedicalImageListView, MedicalImageDetailView, MedicalImageCreateView,
@@ -49,6 +49,7 @@ urlpatterns = [
     # Patient Medications
     path('patients/<int:patient_id>/medications/', patient_medications, name='patient_medications'),
     path('api/medications/search/', medication_search_api, name='medication_search_api'),
+    path('api/prescriptions/check-interactions/', prescription_interaction_check_api, name='prescription_interaction_check_api'),
     
     # Medical Imaging
     path('medical-images/', MedicalImageListView.as_view(), name='medical-image-list'),
@@ -8,6 +8,7 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.core.paginator import Paginator
 from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 
 from .models_medications import Medication, MedicationInteraction
 from .forms_medications import (
@@ -227,6 +228,63 @@ def medication_search_api(request):
     
     return JsonResponse({'results': results})
 
+@login_required
+@require_POST
+def prescription_interaction_check_api(request):
+    """
+    API endpoint that checks a whole prescription formset for drug
+    interactions before it is saved (used by AJAX on the treatment form).
+    """
+    from appointments.models import Appointment
+    from core.forms import PrescriptionFormSet
+    from core.interaction_index import get_interaction_index
+    from treatments.models_medical_history import MedicalHistory
+    
+    # A patient's active medications are only checked for admins and their doctors
+    patient_id = request.POST.get('patient_id')
+    if patient_id:
+        if not patient_id.isdigit():
+            return JsonResponse({'error': 'Invalid patient'}, status=400)
+        user = request.user
+        allowed = user.is_admin_user() or (
+            user.is_doctor()
+            and Appointment.objects.filter(doctor=user, patient_id=patient_id).exists()
+        )
+        if not allowed:
+            return JsonResponse({'error': 'Unauthorized access'}, status=403)
+    
+    formset = PrescriptionFormSet(request.POST)
+    medications = []
+    for form in formset.forms:
+        if not form.has_changed():
+            continue
+        # Dosage/instructions may still be incomplete; only the drug matters here
+        form.is_valid()
+        if form.cleaned_data.get('DELETE'):
+            continue
+        medication = form.cleaned_data.get('medication')
+        name = medication.name if medication else form.cleaned_data.get('name')
+        if name:
+            medications.append(name)
+    
+    index = get_interaction_index()
+    interactions = index.check(medications)
+    
+    # Optionally include the patient's active medications
+    if patient_id and medications:
+        current_medications = list(MedicalHistory.objects.filter(
+            patient_id=patient_id,
+            condition_type='medication',
+            is_active=True
+        ).values_list('condition_name', flat=True))
+        interactions.extend(index.check(medications, against=current_medications))
+    
+    return JsonResponse({
+        'medications': medications,
+        'interactions': interactions,
+        'has_severe': any(i['severity'] == 'severe' for i in interactions),
+    })
+
 # Import in treatments/urls.py
 from .views_medications import (
     MedicationListView, MedicationDetailView, MedicationCreateView, 
@@ -21,7 +21,8 @@ from rest_framework.permissions import IsAuthenticated
 from .models_vitals import VitalSign, VitalSignAlert
 from .forms_vitals import VitalSignForm, VitalSignFilterForm
 from .serializers_vitals import VitalSignSerializer, VitalSignAlertSerializer
-from core.models_notifications import Notification
+from core.models_notifications import NotificationPriority, NotificationType
+from core.notification_fanout import fan_out
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -213,28 +214,21 @@ class VitalSignCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     
     def send_alert_notifications(self, alert):
         """Send notifications to relevant users for alerts"""
-        # Get patient's doctors
+        # Patient's doctors and super admins
         patient = alert.vital_sign.patient
-        doctors = User.objects.filter(
-            user_type='doctor',
-            doctor_appointments__patient=patient
-        ).distinct()
-        
-        # Get super admins
-        super_admins = User.objects.filter(user_type='admin')
-        
-        # Combine recipients
-        recipients = list(doctors) + list(super_admins)
+        recipients = User.objects.filter(
+            Q(user_type='doctor', doctor_appointments__patient=patient) |
+            Q(user_type='admin')
+        )
         
-        for recipient in recipients:
-            Notification.objects.create(
-                user=recipient,
-                title=f'Vital Sign Alert: {patient.get_full_name()}',
-                message=alert.message,
-                notification_type='vital_alert',
-                priority='high' if alert.severity in ['high', 'critical'] else 'medium'
-            )
-            alert.notified_users.add(recipient)
+        fan_out(recipients, {
+            'title': f'Vital Sign Alert: {patient.get_full_name()}',
+            'message': alert.message,
+            'notification_type': NotificationType.EMERGENCY_ALERT,
+            'priority': NotificationPriority.HIGH if alert.severity in ['high', 'critical'] else NotificationPriority.NORMAL,
+            'extra_data': {'patient_id': patient.id, 'vital_sign_alert_id': alert.id},
+        })
+        alert.notified_users.add(*recipients.order_by().values_list('pk', flat=True).distinct())
 
 
 class VitalSignUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):